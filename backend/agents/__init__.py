@@ -1,4 +1,4 @@
 """AI agents for workflow generation and runtime evaluation"""
-from backend.agents.workflow_generator import workflow_generator
+from backend.agents.generator_sessions import generator_sessions
 from backend.agents.condition_evaluator import condition_evaluator
 from backend.agents.loop_controller import loop_controller
@@ -0,0 +1,73 @@
+"""
+Admission Control
+Sheds AI requests up front when the model backend cannot keep up
+
+A request is admitted only while the LLM scheduler has fewer than
+``max_pending`` calls in flight or queued and the estimated queue wait for
+its priority class is below ``max_queue_wait``. Shed requests get a
+Retry-After hint derived from that estimate instead of queuing until the
+process runs out of memory or the client times out.
+"""
+from typing import Any, Dict, Optional
+import logging
+import math
+
+from backend.config.settings import settings
+from backend.agents.llm_scheduler import LLMScheduler, Priority, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Usage:
+        retry_after = admission_controller.check(Priority.INSIGHTS, "practice-ask")
+        if retry_after is not None:
+            ...  # 503 with Retry-After: retry_after
+    """
+
+    def __init__(self, scheduler: LLMScheduler, enabled: bool, max_pending: int, max_queue_wait: float):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.max_queue_wait = max_queue_wait
+        self._admitted: Dict[str, int] = {}
+        self._shed: Dict[str, int] = {}
+
+    def check(self, priority: Priority, endpoint: str) -> Optional[int]:
+        """
+        Decide whether to take on one more LLM request.
+
+        Returns:
+            None to admit, otherwise the number of seconds the client should wait before retrying
+        """
+        if not self.enabled:
+            return None
+
+        pending = self.scheduler.pending
+        wait = self.scheduler.estimate_wait(priority)
+        if pending < self.max_pending and wait < self.max_queue_wait:
+            self._admitted[endpoint] = self._admitted.get(endpoint, 0) + 1
+            return None
+
+        self._shed[endpoint] = self._shed.get(endpoint, 0) + 1
+        logger.warning(f"Shedding {endpoint} request: {pending} LLM calls pending, ~{wait:.1f}s estimated wait")
+        return max(1, math.ceil(wait))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_pending": self.max_pending,
+            "max_queue_wait": self.max_queue_wait,
+            "admitted": dict(self._admitted),
+            "shed": dict(self._shed)
+        }
+
+
+# Global instance
+admission_controller = AdmissionController(
+    llm_scheduler,
+    enabled=settings.admission_control_enabled,
+    max_pending=settings.admission_max_pending,
+    max_queue_wait=settings.admission_max_queue_wait
+)
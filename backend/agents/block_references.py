@@ -0,0 +1,62 @@
+"""
+Block References
+Helpers for @@block-id references and resolving block outputs from workflow_context
+"""
+from typing import Any, Dict, Iterable, List, Optional
+import re
+
+# Pattern matches @@block-name or @@block-id-123 (same as /api/parse-block-references)
+BLOCK_REFERENCE_PATTERN = re.compile(r'@@([a-zA-Z0-9\-_]+)')
+
+# Key under which the engine places referenced block outputs in workflow_context
+BLOCK_OUTPUTS_KEY = "block_outputs"
+
+_MISSING = object()
+
+
+def parse_block_references(*texts: Optional[str]) -> List[str]:
+    """Return referenced block ids in order of first appearance"""
+    seen: Dict[str, None] = {}
+    for text in texts:
+        if text:
+            for block_id in BLOCK_REFERENCE_PATTERN.findall(text):
+                seen.setdefault(block_id, None)
+    return list(seen)
+
+
+def get_block_output(workflow_context: Dict[str, Any], block_id: str) -> Optional[Any]:
+    """
+    Look up a block's output in workflow_context.
+
+    Outputs are read from workflow_context["block_outputs"][block_id] and fall
+    back to a top-level workflow_context[block_id] entry.
+    """
+    outputs = workflow_context.get(BLOCK_OUTPUTS_KEY)
+    if isinstance(outputs, dict) and block_id in outputs:
+        return outputs[block_id]
+    return workflow_context.get(block_id)
+
+
+def get_referenced_outputs(workflow_context: Dict[str, Any], block_ids: Iterable[str]) -> Dict[str, Any]:
+    """Outputs of the given blocks that are present in workflow_context"""
+    results = {}
+    for block_id in block_ids:
+        output = get_block_output(workflow_context, block_id)
+        if output is not None:
+            results[block_id] = output
+    return results
+
+
+def get_path(value: Any, path: Iterable[str], default: Any = None) -> Any:
+    """Follow a dotted field path through nested dicts/lists"""
+    for part in path:
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.lstrip("-").isdigit():
+            index = int(part)
+            value = value[index] if -len(value) <= index < len(value) else _MISSING
+        else:
+            value = _MISSING
+        if value is _MISSING:
+            return default
+    return value
@@ -0,0 +1,421 @@
+"""
+Agent Client Pool
+Keeps warm Claude SDK client sessions alive and leases them to agents
+
+Every call to claude_agent_sdk.query() spawns a fresh CLI subprocess. The pool
+pre-spawns a few ClaudeSDKClient sessions per model, hands them out with a
+lease timeout, clears the conversation between leases and recycles a client
+after a fixed number of uses or when it stops being healthy.
+
+Clients are scoped to the API key they were spawned with (passed through
+ClaudeAgentOptions.env, never os.environ), so requests under different BYOK
+keys run in parallel on separate clients and can never borrow each other's key.
+Idle clients of BYOK sub-pools are disconnected after key_idle_ttl, and empty
+BYOK sub-pools are dropped, so a burst of one-off keys does not leave CLI
+subprocesses running.
+Every query is admitted by the LLM scheduler first (per-key rate limits and
+priority classes), so a queued request never holds a client while it waits.
+"""
+from collections import OrderedDict, deque
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Optional, Tuple
+import asyncio
+import logging
+import time
+import uuid
+
+from claude_agent_sdk import (
+    ClaudeAgentOptions,
+    ClaudeSDKClient,
+    ConversationResetMessage,
+    ResultMessage,
+    query as sdk_query,
+)
+from backend.config.settings import settings
+from backend.config.key_manager import key_manager
+from backend.agents.llm_scheduler import Priority, llm_scheduler
+from backend.agents.resilience import LocalCapacityError, agent_resilience
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(LocalCapacityError):
+    """Raised when no pooled client becomes available within the lease timeout"""
+
+
+@dataclass(frozen=True)
+class ClientProfile:
+    """Options that must match for two requests to share an SDK client"""
+    model: str
+    system_prompt: Optional[str] = None
+    include_partial_messages: bool = False
+
+    def build_options(self, api_key: Optional[str]) -> ClaudeAgentOptions:
+        options = ClaudeAgentOptions(
+            model=self.model,
+            include_partial_messages=self.include_partial_messages
+        )
+        if self.system_prompt:
+            options.system_prompt = self.system_prompt
+        if api_key:
+            options.env = {"ANTHROPIC_API_KEY": api_key}
+        return options
+
+
+class PooledClient:
+    """A connected ClaudeSDKClient plus its bookkeeping"""
+
+    def __init__(self, client: ClaudeSDKClient):
+        self.client = client
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.idle_since = self.created_at
+        self.dirty = False  # Set when a response was not fully consumed
+        self.drained = False  # Set by _query when an early stop was interrupted and drained cleanly
+
+    def is_healthy(self) -> bool:
+        transport = getattr(self.client, "_transport", None)
+        return transport is not None and transport.is_ready()
+
+
+class _ProfilePool:
+    """Clients for a single ClientProfile"""
+
+    def __init__(self, profile: ClientProfile, api_key: Optional[str], max_size: int):
+        self.profile = profile
+        self.api_key = api_key
+        self.key_fingerprint = key_manager.get_key_fingerprint(api_key)
+        self.idle: Deque[PooledClient] = deque()
+        self.slots = asyncio.Semaphore(max_size)
+        self.max_size = max_size
+        self.leased = 0  # Leases not yet released, including releases still resetting the client
+        self.closed = False  # Dropped from the pool: released clients are disconnected, not kept
+        self.spawned = 0
+        self.recycled = 0
+
+    async def spawn(self) -> PooledClient:
+        client = ClaudeSDKClient(options=self.profile.build_options(self.api_key))
+        await client.connect()
+        self.spawned += 1
+        return PooledClient(client)
+
+
+class AgentClientPool:
+    """Pool of warm SDK clients, one sub-pool per (API key, ClientProfile)"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        warm_size: int = 2,
+        max_size: int = 8,
+        max_uses: int = 50,
+        lease_timeout: float = 30.0,
+        reset_timeout: float = 10.0,
+        max_key_pools: int = 64,
+        key_idle_ttl: float = 300.0
+    ):
+        self.enabled = enabled
+        self.warm_size = warm_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.lease_timeout = lease_timeout
+        self.reset_timeout = reset_timeout
+        self.max_key_pools = max_key_pools
+        self.key_idle_ttl = key_idle_ttl
+        self._pools: "OrderedDict[Tuple[str, ClientProfile], _ProfilePool]" = OrderedDict()
+        self._api_key: Optional[str] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self.lease_timeouts = 0
+        self.idle_expirations = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self, profiles: Iterable[ClientProfile]):
+        """Pre-spawn warm_size clients for each profile"""
+        if not self.enabled:
+            return
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_idle_keys())
+        self._api_key = key_manager.get_claude_api_key()
+        if not self._api_key:
+            logger.warning("Agent client pool not warmed: no API key configured")
+            return
+        for profile in profiles:
+            await self.warm(profile)
+
+    async def warm(self, profile: ClientProfile, api_key: Optional[str] = None):
+        """Top the idle clients for a profile up to warm_size"""
+        pool = self._get_pool(profile, api_key or self._api_key)
+        while len(pool.idle) + pool.leased < min(self.warm_size, pool.max_size):
+            try:
+                pool.idle.append(await pool.spawn())
+            except Exception as e:
+                logger.error(f"Failed to pre-spawn SDK client for {profile.model}: {e}")
+                return
+        logger.info(f"Agent client pool warmed: model={profile.model}, idle={len(pool.idle)}")
+
+    async def close(self):
+        """Disconnect every idle client; clients still leased are disconnected on release"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for pool in self._pools.values():
+            pool.closed = True
+            while pool.idle:
+                await self._disconnect(pool.idle.popleft())
+        self._pools.clear()
+
+    def _get_pool(self, profile: ClientProfile, api_key: Optional[str]) -> _ProfilePool:
+        pool_key = (key_manager.get_key_fingerprint(api_key), profile)
+        pool = self._pools.get(pool_key)
+        if pool is None:
+            pool = _ProfilePool(profile, api_key, self.max_size)
+            self._pools[pool_key] = pool
+            self._evict_key_pools()
+        else:
+            self._pools.move_to_end(pool_key)
+        return pool
+
+    def _evict_key_pools(self):
+        """Drop the least recently used idle sub-pools once there are too many keys"""
+        for pool_key in list(self._pools):
+            if len(self._pools) <= self.max_key_pools:
+                return
+            pool = self._pools[pool_key]
+            if pool.leased or pool.api_key == self._api_key:
+                continue
+            self._drop_pool(pool_key, pool)
+
+    async def _sweep_idle_keys(self):
+        while True:
+            await asyncio.sleep(max(self.key_idle_ttl / 4, 1.0))
+            self._expire_idle_keys()
+
+    def _expire_idle_keys(self):
+        """Disconnect BYOK clients idle for longer than key_idle_ttl and drop emptied sub-pools"""
+        cutoff = time.monotonic() - self.key_idle_ttl
+        for pool_key, pool in list(self._pools.items()):
+            if pool.api_key == self._api_key:
+                continue
+            # Released clients are appended, so the longest idle are at the front
+            while pool.idle and pool.idle[0].idle_since < cutoff:
+                self.idle_expirations += 1
+                asyncio.create_task(self._disconnect(pool.idle.popleft()))
+            if not pool.idle and not pool.leased:
+                self._drop_pool(pool_key, pool)
+
+    def _drop_pool(self, pool_key: Tuple[str, ClientProfile], pool: _ProfilePool):
+        del self._pools[pool_key]
+        pool.closed = True
+        while pool.idle:
+            asyncio.create_task(self._disconnect(pool.idle.popleft()))
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def lease(self, profile: ClientProfile, api_key: Optional[str] = None) -> AsyncIterator[PooledClient]:
+        """
+        Lease a client spawned with api_key (default: the server's key) for one request.
+
+        Raises:
+            PoolTimeoutError: If no client frees up within lease_timeout
+        """
+        pool = self._get_pool(profile, api_key or self._api_key)
+        try:
+            await asyncio.wait_for(pool.slots.acquire(), timeout=self.lease_timeout)
+        except asyncio.TimeoutError:
+            self.lease_timeouts += 1
+            raise PoolTimeoutError(f"No SDK client available for {profile.model} within {self.lease_timeout}s")
+
+        pooled = None
+        try:
+            while pool.idle:
+                candidate = pool.idle.popleft()
+                if candidate.is_healthy():
+                    pooled = candidate
+                    break
+                pool.recycled += 1
+                asyncio.create_task(self._disconnect(candidate))
+            if pooled is None:
+                pooled = await pool.spawn()
+        except BaseException:
+            pool.slots.release()
+            raise
+
+        pool.leased += 1
+        pooled.uses += 1
+        pooled.drained = False
+        try:
+            yield pooled
+        except GeneratorExit:
+            # An early stop leaves the client reusable once its response was drained
+            pooled.dirty = pooled.dirty or not pooled.drained
+            raise
+        except BaseException:
+            pooled.dirty = True
+            raise
+        finally:
+            # The lease counts until _release is done, so the sub-pool cannot be dropped under it
+            asyncio.create_task(self._release(pool, pooled))
+
+    async def _release(self, pool: _ProfilePool, pooled: PooledClient):
+        """Return a client to the idle set, or recycle it"""
+        keep = False
+        try:
+            keep = (
+                not pool.closed
+                and not pooled.dirty
+                and pooled.uses < self.max_uses
+                and pooled.is_healthy()
+                and await self._reset_conversation(pooled)
+                and not pool.closed  # Closed during the reset
+            )
+            if keep:
+                pooled.idle_since = time.monotonic()
+                pool.idle.append(pooled)
+            else:
+                pool.recycled += 1
+                await self._disconnect(pooled)
+        finally:
+            pool.leased -= 1
+            pool.slots.release()
+
+        if not keep and not pool.closed and pool.api_key and pool.api_key == self._api_key:
+            # Replace the recycled client so the next lease stays warm
+            await self.warm(pool.profile)
+
+    async def _reset_conversation(self, pooled: PooledClient) -> bool:
+        """Clear the transcript so the next lease starts from an empty conversation"""
+        async def _clear():
+            await pooled.client.query("/clear")
+            async for message in pooled.client.receive_messages():
+                if isinstance(message, (ConversationResetMessage, ResultMessage)):
+                    return
+
+        try:
+            await asyncio.wait_for(_clear(), timeout=self.reset_timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Recycling SDK client after failed reset: {e}")
+            return False
+
+    async def _interrupt(self, pooled: PooledClient) -> bool:
+        """Stop the in-flight response and drain it so the client can be reused"""
+        async def _drain():
+            await pooled.client.interrupt()
+            async for message in pooled.client.receive_response():
+                pass
+
+        try:
+            await asyncio.wait_for(_drain(), timeout=self.reset_timeout)
+            return True
+        except Exception as e:
+            logger.debug(f"Recycling SDK client after failed interrupt: {e}")
+            return False
+
+    async def _disconnect(self, pooled: PooledClient):
+        try:
+            await pooled.client.disconnect()
+        except Exception as e:
+            logger.debug(f"Error disconnecting SDK client: {e}")
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+
+    async def query(
+        self,
+        prompt: str,
+        model: str,
+        system_prompt: Optional[str] = None,
+        include_partial_messages: bool = False,
+        api_key: Optional[str] = None,
+        priority: Priority = Priority.DECISION
+    ) -> AsyncIterator[Any]:
+        """
+        Drop-in replacement for claude_agent_sdk.query() backed by pooled clients.
+
+        Each request runs on a client spawned with its own api_key, so calls
+        with different keys never share a subprocess or touch os.environ.
+
+        Raises:
+            SchedulerTimeoutError: If the scheduler does not admit the request in time
+            PoolTimeoutError: If no pooled client frees up in time (not counted against the model)
+            CircuitOpenError: If recent calls to this model kept failing
+            CallDeadlineError: If the response takes longer than settings.stream_timeout
+        """
+        profile = ClientProfile(model, system_prompt, include_partial_messages)
+        api_key = api_key or self._api_key
+
+        async with llm_scheduler.slot(priority, api_key):
+            # aclosing passes an early stop by the caller on to the lease below
+            stream = agent_resilience.stream(model, lambda: self._query(prompt, profile, api_key))
+            async with aclosing(stream) as messages:
+                async for message in messages:
+                    yield message
+
+    async def _query(self, prompt: str, profile: ClientProfile, api_key: Optional[str]) -> AsyncIterator[Any]:
+        if not self.enabled:
+            async for message in sdk_query(prompt=prompt, options=profile.build_options(api_key)):
+                yield message
+            return
+
+        async with self.lease(profile, api_key) as pooled:
+            completed = False
+            try:
+                await pooled.client.query(prompt, session_id=uuid.uuid4().hex)
+                async for message in pooled.client.receive_response():
+                    yield message
+                completed = True
+            except GeneratorExit:
+                # Caller stopped reading early (e.g. its structured output was already complete)
+                completed = pooled.drained = await self._interrupt(pooled)
+                raise
+            finally:
+                # A caller that stops early leaves unread messages on the client
+                pooled.dirty = pooled.dirty or not completed
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool statistics for health checks"""
+        return {
+            "enabled": self.enabled,
+            "warm_size": self.warm_size,
+            "max_size": self.max_size,
+            "max_uses": self.max_uses,
+            "lease_timeouts": self.lease_timeouts,
+            "key_idle_ttl_seconds": self.key_idle_ttl,
+            "idle_expirations": self.idle_expirations,
+            "profiles": [
+                {
+                    "key": pool.key_fingerprint[:8],
+                    "model": profile.model,
+                    "has_system_prompt": bool(profile.system_prompt),
+                    "idle": len(pool.idle),
+                    "leased": pool.leased,
+                    "spawned": pool.spawned,
+                    "recycled": pool.recycled
+                }
+                for (_, profile), pool in self._pools.items()
+            ]
+        }
+
+
+# Global instance
+client_pool = AgentClientPool(
+    enabled=settings.agent_pool_enabled,
+    warm_size=settings.agent_pool_warm_size,
+    max_size=settings.agent_pool_max_size,
+    max_uses=settings.agent_pool_max_uses,
+    lease_timeout=settings.agent_pool_lease_timeout,
+    max_key_pools=settings.agent_pool_max_keys,
+    key_idle_ttl=settings.agent_pool_key_idle_ttl
+)
@@ -1,51 +1,76 @@
 """
 Condition Evaluator Agent
 """
-from typing import Dict, Any, Optional
-from claude_agent_sdk import query, ClaudeAgentOptions
+from typing import Dict, Any, Callable, Optional
+from datetime import datetime
 from backend.config.key_manager import key_manager
-from backend.models.workflow_context import ConditionEvaluationRequest, ConditionEvaluationResponse
-import json
-import os
+from backend.agents.model_router import evaluator_router
+from backend.agents.rule_compiler import compile_rule, evaluate_rule
+from backend.agents.decision_cache import decision_cache
+from backend.agents.context_slicer import slice_context
+from backend.agents.prompt_encoding import encode_for_prompt
+from backend.models.workflow_context import ConditionEvaluationRequest, ConditionEvaluationResponse, WorkflowInstance
+
+
+def build_condition_prompt(condition_description: str, context: Dict[str, Any], encode: Callable[[Any], str] = encode_for_prompt) -> str:
+    return f"""Evaluate: {condition_description}
+Context:
+{encode(context)}
+Respond JSON: {{"decision": "true|false|escalate", "reasoning": "...", "confidence": 0.9}}"""
 
 
 class ConditionEvaluatorAgent:
     def __init__(self, user_api_key: Optional[str] = None):
         self.user_api_key = user_api_key
 
-    async def evaluate_condition(self, request: ConditionEvaluationRequest, user_api_key: Optional[str] = None) -> ConditionEvaluationResponse:
+    async def evaluate_condition(
+        self,
+        request: ConditionEvaluationRequest,
+        user_api_key: Optional[str] = None,
+        instance: Optional[WorkflowInstance] = None
+    ) -> ConditionEvaluationResponse:
+        # Only the referenced block outputs/fields go into rules, cache keys and the prompt
+        sliced = slice_context(
+            request.workflow_context,
+            [request.condition_description],
+            request.referenced_block_ids,
+            instance=instance
+        )
+
+        # Deterministic fast-path for trivial rules (no LLM call)
+        rule_result = evaluate_rule(request.condition_description, sliced.projected)
+        if rule_result is not None:
+            return ConditionEvaluationResponse(
+                decision="true" if rule_result else "false",
+                reasoning=f"Rule {compile_rule(request.condition_description).expression} evaluated to {rule_result}",
+                confidence=1.0,
+                decided_by="rule"
+            )
+
+        cache_key = decision_cache.make_key("condition", [request.condition_description], sliced.projected)
+        cached = decision_cache.get(cache_key)
+        if cached is not None:
+            return cached.model_copy(update={"decided_by": "cache", "timestamp": datetime.now()})
+
         api_key = key_manager.get_claude_api_key(user_api_key or self.user_api_key)
         if not api_key:
-            return ConditionEvaluationResponse(decision="escalate", reasoning="No API key", confidence=0.0)
+            return ConditionEvaluationResponse(decision="escalate", reasoning="No API key", confidence=0.0, decided_by="agent")
 
         try:
-            os.environ['ANTHROPIC_API_KEY'] = api_key
-            
-            prompt = f"""Evaluate: {request.condition_description}
-Context: {json.dumps(request.workflow_context)}
-Respond JSON: {{"decision": "true|false|escalate", "reasoning": "...", "confidence": 0.9}}"""
+            prompt = build_condition_prompt(request.condition_description, sliced.context)
 
-            response_text = ""
-            async for message in query(prompt=prompt, options=ClaudeAgentOptions(model=key_manager.get_claude_model())):
-                if hasattr(message, 'content') and message.content:
-                    for block in message.content:
-                        if hasattr(block, 'text') and block.text:
-                            response_text += block.text
+            # Fast model first, larger model only on low confidence or parse failure;
+            # hedged because condition evaluations gate workflow progress
+            decision_data, _ = await evaluator_router.route(prompt, ConditionEvaluationResponse, api_key, hedge=True)
+            if decision_data is None:
+                return ConditionEvaluationResponse(decision="escalate", reasoning="Parse failed", confidence=0.0, decided_by="agent")
 
-            decision_data = self._parse_decision(response_text)
-            return ConditionEvaluationResponse(**decision_data)
+            response = ConditionEvaluationResponse(**decision_data, decided_by="agent")
+            if response.decision != "escalate":
+                decision_cache.set(cache_key, response)
+            return response
         except Exception as e:
-            return ConditionEvaluationResponse(decision="escalate", reasoning=str(e), confidence=0.0)
-
-    def _parse_decision(self, text: str) -> Dict[str, Any]:
-        try:
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end > start:
-                return json.loads(text[start:end])
-        except:
-            pass
-        return {"decision": "escalate", "reasoning": "Parse failed", "confidence": 0.0}
+            return ConditionEvaluationResponse(decision="escalate", reasoning=str(e), confidence=0.0, decided_by="agent")
 
 
 condition_evaluator = ConditionEvaluatorAgent()
@@ -0,0 +1,232 @@
+"""
+Context Slicer
+Builds the minimal workflow context an evaluator prompt needs
+
+Resolves @@ references (from the rule text and referenced_block_ids) against
+the workflow instance or the request's workflow_context, projects only the
+referenced fields, and enforces a token budget with deterministic truncation.
+The rest of the context is only dropped when every rule compiles, since only
+then are the rule's references all explicit.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+import logging
+import re
+
+from backend.config.settings import settings
+from backend.agents.block_references import (
+    BLOCK_OUTPUTS_KEY,
+    get_block_output,
+    get_path,
+    parse_block_references,
+)
+from backend.agents.rule_compiler import compile_rule
+from backend.agents.prompt_encoding import encode_for_prompt
+from backend.models.workflow_context import WorkflowInstance
+
+logger = logging.getLogger(__name__)
+
+# @@block_id followed by an optional .field.path
+_FIELD_REFERENCE_PATTERN = re.compile(r'@@([a-zA-Z0-9\-_]+)((?:\.[A-Za-z0-9_\-]+)*)')
+# context.field.path (explicit rule language)
+_CONTEXT_REFERENCE_PATTERN = re.compile(r'\bcontext((?:\.[A-Za-z0-9_\-]+)+)')
+
+# Rough characters-per-token ratio used for budgeting
+CHARS_PER_TOKEN = 4
+
+# Progressively tighter (max string length, max list items, max depth) limits
+_TRUNCATION_LEVELS = [
+    (2000, 50, 8),
+    (500, 20, 6),
+    (200, 10, 4),
+    (80, 5, 3),
+    (40, 3, 2),
+]
+
+_MISSING = object()
+
+
+class ContextSlice(NamedTuple):
+    """Result of slicing a workflow context"""
+    projected: Dict[str, Any]  # Referenced data only, untruncated (for rules and cache keys)
+    context: Dict[str, Any]  # Budget-limited context for the prompt
+    original_chars: int
+    sliced_chars: int
+    truncated: bool
+
+
+class SlicerStats:
+    """Running totals of prompt context sizes before and after slicing"""
+
+    def __init__(self):
+        self.slices = 0
+        self.original_chars = 0
+        self.sliced_chars = 0
+        self.truncated = 0
+
+    def record(self, result: ContextSlice):
+        self.slices += 1
+        self.original_chars += result.original_chars
+        self.sliced_chars += result.sliced_chars
+        self.truncated += int(result.truncated)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "slices": self.slices,
+            "original_chars": self.original_chars,
+            "sliced_chars": self.sliced_chars,
+            "reduction": round(1 - self.sliced_chars / self.original_chars, 4) if self.original_chars else 0.0,
+            "truncated": self.truncated
+        }
+
+
+slicer_stats = SlicerStats()
+
+
+def _encoded_size(value: Any) -> int:
+    """Characters value takes up in a prompt"""
+    return len(encode_for_prompt(value))
+
+
+def _set_path(target: Dict[str, Any], path: List[str], value: Any):
+    for part in path[:-1]:
+        target = target.setdefault(part, {})
+        if not isinstance(target, dict):
+            return
+    target[path[-1]] = value
+
+
+def _collect_field_paths(texts: Iterable[Optional[str]]) -> Dict[str, Optional[Set[str]]]:
+    """Map block id -> referenced field paths (None means the whole output)"""
+    fields: Dict[str, Optional[Set[str]]] = {}
+    for text in texts:
+        if not text:
+            continue
+        for block_id, path in _FIELD_REFERENCE_PATTERN.findall(text):
+            path = path.lstrip(".")
+            if not path:
+                fields[block_id] = None
+            elif block_id not in fields:
+                fields[block_id] = {path}
+            elif fields[block_id] is not None:
+                fields[block_id].add(path)
+    return fields
+
+
+def _project(output: Any, paths: Optional[Set[str]]) -> Any:
+    if paths is None or not isinstance(output, dict):
+        return output
+    projected: Dict[str, Any] = {}
+    for path in sorted(paths):
+        parts = path.split(".")
+        value = get_path(output, parts, default=_MISSING)
+        if value is not _MISSING:
+            _set_path(projected, parts, value)
+    # Fall back to the whole output when none of the fields exist
+    return projected or output
+
+
+def _truncate(value: Any, max_str: int, max_items: int, depth: int) -> Any:
+    """Deterministically shrink a JSON-like value"""
+    if isinstance(value, str):
+        if len(value) > max_str:
+            return value[:max_str] + f"…(+{len(value) - max_str} chars)"
+        return value
+    if isinstance(value, dict):
+        if depth <= 0:
+            return f"{{…{len(value)} keys}}"
+        keys = sorted(value, key=str)
+        result = {key: _truncate(value[key], max_str, max_items, depth - 1) for key in keys[:max_items]}
+        if len(keys) > max_items:
+            result["…"] = f"+{len(keys) - max_items} more keys"
+        return result
+    if isinstance(value, (list, tuple)):
+        if depth <= 0:
+            return f"[…{len(value)} items]"
+        items = [_truncate(item, max_str, max_items, depth - 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"…(+{len(value) - max_items} more items)")
+        return items
+    return value
+
+
+def fit_to_budget(value: Dict[str, Any], token_budget: int) -> Dict[str, Any]:
+    """Return value unchanged if it fits the budget, otherwise the first truncation level that does"""
+    max_chars = token_budget * CHARS_PER_TOKEN
+    if _encoded_size(value) <= max_chars:
+        return value
+    truncated = value
+    for max_str, max_items, depth in _TRUNCATION_LEVELS:
+        truncated = _truncate(value, max_str, max_items, depth)
+        if _encoded_size(truncated) <= max_chars:
+            break
+    return truncated
+
+
+def slice_context(
+    workflow_context: Dict[str, Any],
+    rule_texts: Iterable[Optional[str]],
+    referenced_block_ids: Iterable[str] = (),
+    instance: Optional[WorkflowInstance] = None,
+    token_budget: Optional[int] = None
+) -> ContextSlice:
+    """
+    Slice workflow_context down to what the rules reference.
+
+    Block outputs are resolved from the WorkflowInstance when given, otherwise
+    from workflow_context. When nothing is referenced the whole context is
+    kept, since there is no way to know what the rule depends on. The same
+    goes for the non-block-output context of a rule that does not compile
+    ("@@lab-1.result is abnormal and the patient is over 65"): only the
+    referenced block outputs are projected and the token budget shrinks the
+    rest.
+    """
+    rule_texts = list(rule_texts)
+    referenced_block_ids = list(referenced_block_ids)
+    token_budget = token_budget or settings.evaluator_context_token_budget
+    original_chars = _encoded_size(workflow_context)
+
+    field_paths = _collect_field_paths(rule_texts)
+    for block_id in referenced_block_ids:
+        field_paths.setdefault(block_id, None)  # Referenced without a field: keep the whole output
+    block_ids = list(dict.fromkeys(parse_block_references(*rule_texts) + referenced_block_ids))
+
+    context_paths = sorted({path.lstrip(".") for text in rule_texts if text for path in _CONTEXT_REFERENCE_PATTERN.findall(text)})
+
+    if not block_ids and not context_paths:
+        projected = workflow_context
+    else:
+        outputs = instance.resolve_block_outputs(block_ids) if instance is not None else {}
+        for block_id in block_ids:
+            if block_id not in outputs:
+                output = get_block_output(workflow_context, block_id)
+                if output is not None:
+                    outputs[block_id] = output
+
+        # Compiled rules read nothing but their @@ and context. references
+        explicit = all(compile_rule(text) is not None for text in rule_texts if text and text.strip())
+        projected = {
+            key: value for key, value in workflow_context.items()
+            if key != BLOCK_OUTPUTS_KEY and key not in outputs
+            and not (explicit and isinstance(value, (dict, list)))
+        }
+        for path in context_paths:
+            parts = path.split(".")
+            value = get_path(workflow_context, parts, default=_MISSING)
+            if value is not _MISSING:
+                _set_path(projected, parts, value)
+        projected[BLOCK_OUTPUTS_KEY] = {
+            block_id: _project(output, field_paths.get(block_id))
+            for block_id, output in outputs.items()
+        }
+
+    context = fit_to_budget(projected, token_budget)
+    result = ContextSlice(
+        projected=projected,
+        context=context,
+        original_chars=original_chars,
+        sliced_chars=_encoded_size(context),
+        truncated=context is not projected
+    )
+    slicer_stats.record(result)
+    logger.debug(f"Sliced evaluator context: {result.original_chars} -> {result.sliced_chars} chars (truncated={result.truncated})")
+    return result
@@ -0,0 +1,62 @@
+"""
+Decision Cache
+Caches condition/loop decisions keyed on the rule text and the block outputs it references
+"""
+from typing import Any, Dict, Iterable, Optional
+import hashlib
+import json
+
+from backend.config.settings import settings
+from backend.agents.ttl_cache import LRUTTLCache
+
+
+def canonical_json(value: Any) -> str:
+    """Deterministic JSON encoding (sorted keys, no whitespace)"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class DecisionCache:
+    """
+    LRU+TTL cache in front of the condition evaluator and loop controller.
+
+    The key hashes the rule text plus only the referenced inputs as projected
+    by the context slicer (outputs of request.referenced_block_ids and any
+    @@ids in the rule text), so unrelated context changes do not defeat the
+    cache. Rules without any reference are keyed on the whole workflow_context.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self._cache = LRUTTLCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+    def make_key(self, kind: str, rules: Iterable[Optional[str]], inputs: Dict[str, Any], extra: Any = None) -> str:
+        """
+        Args:
+            kind: "condition" or "loop"
+            rules: Rule texts the decision depends on
+            inputs: Referenced inputs only (ContextSlice.projected)
+            extra: Any other decision input, e.g. the loop iteration
+        """
+        payload = canonical_json([kind, [rule or "" for rule in rules], inputs, extra])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    def set(self, key: str, response: Any):
+        """Cache a decision (callers only pass successful, non-escalate decisions)"""
+        size = len(key) + len(response.model_dump_json())
+        self._cache.set(key, response, size=size)
+
+    def clear(self):
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._cache.get_stats()
+
+
+# Global instance
+decision_cache = DecisionCache(
+    max_entries=settings.decision_cache_max_entries,
+    max_bytes=settings.decision_cache_max_mb * 1024 * 1024,
+    ttl=settings.decision_cache_ttl
+)
@@ -0,0 +1,157 @@
+"""
+Workflow Generator Sessions
+Per-connection WorkflowGeneratorAgent instances so concurrent composer users
+never share conversation history or canvas state
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import time
+
+from backend.config.settings import settings
+from backend.agents.workflow_generator import WorkflowGeneratorAgent
+
+logger = logging.getLogger(__name__)
+
+
+class GeneratorSession:
+    """Conversation history and canvas state owned by one client"""
+
+    def __init__(self, session_id: str, user_api_key: Optional[str] = None):
+        self.session_id = session_id
+        self.agent = WorkflowGeneratorAgent(user_api_key=user_api_key)
+        self.lock = asyncio.Lock()  # Serializes generations within a session
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.size = 0  # estimated_size() when the registry last measured it
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def estimated_size(self) -> int:
+        """Approximate resident size of the session in bytes"""
+        size = sum(len(msg.get("content", "")) for msg in self.agent.conversation_history)
+        size += sum(len(str(block)) for block in self.agent.canvas_tool.blocks_created)
+        return size
+
+
+class GeneratorSessionRegistry:
+    """
+    LRU registry of generator sessions keyed by client id or session token.
+
+    Sessions are evicted when idle for longer than idle_ttl, and the least
+    recently used sessions are evicted once max_sessions or max_memory_bytes
+    is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 500,
+        idle_ttl: float = 1800,
+        max_memory_bytes: int = 64 * 1024 * 1024
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self._sessions: "OrderedDict[str, GeneratorSession]" = OrderedDict()
+        self._memory_bytes = 0  # Running total of session.size
+        self.evictions = 0
+
+    def get(self, session_id: str, user_api_key: Optional[str] = None) -> GeneratorSession:
+        """Get the session for session_id, creating it if needed"""
+        self.evict_expired()
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = GeneratorSession(session_id, user_api_key=user_api_key)
+            self._sessions[session_id] = session
+            logger.info(f"Created generator session {session_id} ({len(self._sessions)} active)")
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.touch()
+        self._measure(session)
+        self._enforce_limits(keep=session_id)
+        return session
+
+    def reset(self, session_id: str):
+        """Clear history and canvas state for a single session"""
+        session = self._sessions.get(session_id)
+        if session:
+            session.agent.reset_conversation()
+            session.touch()
+            self._measure(session)
+
+    def remove(self, session_id: str):
+        """Drop a session immediately"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._memory_bytes -= session.size
+            logger.info(f"Removed generator session {session_id}")
+
+    def trim_history(self, session: GeneratorSession):
+        """Cap a session's conversation history and re-check the memory limit"""
+        history = session.agent.conversation_history
+        if len(history) > settings.max_conversation_history:
+            del history[:len(history) - settings.max_conversation_history]
+        session.touch()
+        self._measure(session)
+        self._enforce_limits(keep=session.session_id)
+
+    def evict_expired(self):
+        """Evict sessions idle for longer than idle_ttl"""
+        cutoff = time.monotonic() - self.idle_ttl
+        # OrderedDict is in LRU order, so expired sessions are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff or session.lock.locked():
+                break
+            self._evict(session_id, "idle")
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        while len(self._sessions) > self.max_sessions and self._evict_lru(keep, "capacity"):
+            pass
+        while self._memory_bytes > self.max_memory_bytes and self._evict_lru(keep, "memory"):
+            pass
+
+    def _evict_lru(self, keep: Optional[str], reason: str) -> bool:
+        for session_id, session in self._sessions.items():
+            if session_id != keep and not session.lock.locked():
+                self._evict(session_id, reason)
+                return True
+        return False
+
+    def _evict(self, session_id: str, reason: str):
+        session = self._sessions.pop(session_id)
+        self._memory_bytes -= session.size
+        self.evictions += 1
+        logger.info(f"Evicted generator session {session_id} ({reason})")
+
+    def _measure(self, session: GeneratorSession):
+        """Re-measure one session after it changed and update the running total"""
+        size = session.estimated_size()
+        self._memory_bytes += size - session.size
+        session.size = size
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Registry statistics for health checks"""
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "estimated_memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "evictions": self.evictions
+        }
+
+
+# Global instance
+generator_sessions = GeneratorSessionRegistry(
+    max_sessions=settings.generator_max_sessions,
+    idle_ttl=settings.generator_session_idle_ttl,
+    max_memory_bytes=settings.generator_sessions_max_memory_mb * 1024 * 1024
+)
@@ -0,0 +1,236 @@
+"""
+Insights Cache
+Bounded, persistent, single-flight cache for practice insights
+
+Results live in an in-memory LRU+TTL cache in front of a local SQLite table,
+so a restart only costs one disk read per dashboard instead of one LLM call.
+The table is pruned to ``max_entries`` rows, least recently used first.
+Concurrent requests for the same key share one in-flight computation rather
+than each calling the model.
+
+Request bodies already seen are remembered by digest, so a dashboard polling
+with an unchanged payload maps straight to its cache key (and ETag) without
+parsing or re-hashing the practice data.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from backend.config.settings import settings
+from backend.agents.ttl_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS practice_insights_cache (
+    cache_key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_practice_insights_cache_accessed ON practice_insights_cache (accessed_at);
+"""
+
+
+class InsightsCache:
+    """
+    Usage:
+        await insights_cache.open()
+        result = await insights_cache.get_or_compute(key, compute)  # compute() -> (value, cacheable)
+    """
+
+    def __init__(self, db_path: str, max_entries: int, max_bytes: int, ttl: float):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = LRUTTLCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        # request body digest -> cache key
+        self._request_keys = LRUTTLCache(max_entries=max_entries, max_bytes=max_entries * 256, ttl=ttl)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.computations = 0
+        self.coalesced = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def open(self):
+        if self._conn is None:
+            await asyncio.to_thread(self._open)
+            logger.info(f"Practice insights cache opened at {self.db_path}")
+
+    async def close(self):
+        if self._conn is not None:
+            await asyncio.to_thread(self._close)
+
+    def _open(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conn.execute("DELETE FROM practice_insights_cache WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+        self._conn = conn
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Memory first, then disk (promoted back into memory for its remaining TTL)"""
+        value = self._memory.get(key)
+        if value is not None or self._conn is None:
+            return value
+        try:
+            row = await asyncio.to_thread(self._read, key)
+        except sqlite3.Error as e:
+            self.disk_errors += 1
+            logger.warning(f"Practice insights cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        text, remaining = row
+        value = json.loads(text)
+        self.disk_hits += 1
+        self._memory.set(key, value, size=len(text), ttl=remaining)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory
+
+    def key_for_request(self, body_digest: str) -> Optional[str]:
+        """Cache key of a request body seen before (see remember_request)"""
+        return self._request_keys.get(body_digest)
+
+    def remember_request(self, body_digest: str, key: str):
+        self._request_keys.set(body_digest, key, size=len(body_digest) + len(key))
+
+    async def set(self, key: str, value: Any):
+        text = json.dumps(value)
+        self._memory.set(key, value, size=len(text))
+        if self._conn is None:
+            return
+        try:
+            await asyncio.to_thread(self._write, key, text)
+        except sqlite3.Error as e:
+            self.disk_errors += 1
+            logger.warning(f"Practice insights cache write failed: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Tuple[Any, bool]]]) -> Any:
+        """
+        Cached value for key, else the result of compute(), shared with concurrent callers for the same key.
+
+        Args:
+            compute: Returns (value, cacheable); uncacheable values (fallbacks) are shared but not stored
+        """
+        flight = self._in_flight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        value = await self.get(key)
+        if value is not None:
+            return value
+        flight = self._in_flight.get(key)  # Started while the disk was read
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        flight = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on the flight; retrieve its exception so it is not logged as unhandled
+        flight.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._in_flight[key] = flight
+        self.computations += 1
+        try:
+            value, cacheable = await compute()
+            if cacheable:
+                await self.set(key, value)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Disk
+    # ------------------------------------------------------------------
+
+    def _read(self, key: str) -> Optional[Tuple[str, float]]:
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM practice_insights_cache WHERE cache_key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE practice_insights_cache SET accessed_at = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+        return row[0], row[1] - now
+
+    def _write(self, key: str, text: str):
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO practice_insights_cache (cache_key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, text, now + self.ttl, now)
+            )
+            self._conn.execute(
+                "DELETE FROM practice_insights_cache WHERE expires_at <= ? OR cache_key IN ("
+                "SELECT cache_key FROM practice_insights_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (now, self.max_entries)
+            )
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._memory.get_stats(),
+            "persistent": self._conn is not None,
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "known_requests": len(self._request_keys),
+            "known_request_hits": self._request_keys.hits
+        }
+
+
+# Global instance
+insights_cache = InsightsCache(
+    db_path=settings.practice_insights_cache_db_path,
+    max_entries=settings.practice_insights_cache_max_entries,
+    max_bytes=settings.practice_insights_cache_max_mb * 1024 * 1024,
+    ttl=settings.practice_insights_cache_ttl
+)
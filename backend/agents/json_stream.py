@@ -0,0 +1,235 @@
+"""
+Incremental JSON Parser
+Resumable JSON scanner that keeps its state between streamed text chunks.
+
+Each character is scanned exactly once, so parsing a streamed document is O(n)
+regardless of how many chunks it arrives in. Elements of watched arrays (for
+example ``blocks`` and ``connections`` in WORKFLOW_JSON) are emitted as soon as
+they close, before the enclosing object is complete.
+"""
+import json
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+JSONPath = Tuple[str, ...]
+
+_WHITESPACE = " \t\r\n"
+
+
+class JSONStreamEvent(NamedTuple):
+    """Event produced by IncrementalJSONParser.feed"""
+    kind: str  # "element" or "complete"
+    path: JSONPath  # Path of the watched array ("element") or () for the root
+    value: Any
+
+
+class _Frame:
+    """One open container on the parser stack"""
+    __slots__ = ("kind", "path", "key", "expect_key", "capture")
+
+    def __init__(self, kind: str, path: JSONPath, capture: Optional[List[str]] = None):
+        self.kind = kind  # "{" or "["
+        self.path = path  # Path of this container from the root
+        self.key: Optional[str] = None  # Current member key (objects only)
+        self.expect_key = kind == "{"
+        self.capture = capture  # Characters of the element being captured (watched arrays only)
+
+
+class IncrementalJSONParser:
+    """
+    Resumable JSON scanner.
+
+    The scanner only tracks structure (containers, strings, member keys); values
+    are decoded with json.loads once per emitted element and once for the root,
+    which keeps the total cost linear in the size of the document. Text before
+    the first '{' or '[' is ignored and text after the root closes is exposed as
+    ``remainder``.
+
+    Usage:
+        parser = IncrementalJSONParser(element_paths=[("blocks",), ("connections",)])
+        for chunk in chunks:
+            for event in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self, element_paths: Iterable[JSONPath] = ()):
+        self.element_paths = {tuple(path) for path in element_paths}
+        self.done = False
+        self.value: Any = None
+        self.remainder = ""
+
+        self._root: List[str] = []
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._key_chars: List[str] = []
+
+    @property
+    def started(self) -> bool:
+        """Whether the root value has started"""
+        return bool(self._root)
+
+    @property
+    def raw(self) -> str:
+        """Raw text of the root value scanned so far"""
+        return "".join(self._root)
+
+    def feed(self, text: str) -> List[JSONStreamEvent]:
+        """
+        Scan the next chunk of text.
+
+        Returns:
+            Events for every watched array element (and the root) that closed in this chunk
+
+        Raises:
+            json.JSONDecodeError: If a closed element or the root is not valid JSON
+        """
+        events: List[JSONStreamEvent] = []
+
+        if self.done:
+            self.remainder += text
+            return events
+
+        i = 0
+        n = len(text)
+
+        if not self._root:
+            starts = [pos for pos in (text.find("{"), text.find("[")) if pos != -1]
+            if not starts:
+                return events
+            i = min(starts)
+
+        while i < n:
+            if self._in_string:
+                i = self._scan_string(text, i)
+                continue
+
+            ch = text[i]
+
+            if ch == '"':
+                frame = self._stack[-1] if self._stack else None
+                self._string_is_key = frame is not None and frame.kind == "{" and frame.expect_key
+                self._key_chars = []
+                self._begin_element_if_needed(ch)
+                self._in_string = True
+                self._append(ch)
+                i += 1
+                continue
+
+            if ch in "{[":
+                self._open(ch)
+            elif ch in "}]":
+                self._close(ch, events)
+                if self.done:
+                    self.remainder = text[i + 1:]
+                    return events
+            elif ch == ",":
+                self._end_scalar_element(events)
+                frame = self._stack[-1]
+                if frame.kind == "{":
+                    frame.expect_key = True
+                self._append(ch)
+            elif ch == ":":
+                self._stack[-1].expect_key = False
+                self._append(ch)
+            else:
+                self._begin_element_if_needed(ch)
+                self._append(ch)
+
+            i += 1
+
+        return events
+
+    # ------------------------------------------------------------------
+    # Scanning helpers
+    # ------------------------------------------------------------------
+
+    def _scan_string(self, text: str, i: int) -> int:
+        """Consume string characters, jumping straight to the next quote or backslash"""
+        n = len(text)
+        while i < n:
+            if self._escape:
+                self._escape = False
+                self._append(text[i], key=True)
+                i += 1
+                continue
+
+            quote = text.find('"', i)
+            backslash = text.find("\\", i)
+            stop = min(pos for pos in (quote, backslash, n) if pos != -1)
+
+            if stop > i:
+                self._append(text[i:stop], key=True)
+            if stop == n:
+                return n
+
+            self._append(text[stop], key=text[stop] == "\\")
+            if text[stop] == "\\":
+                self._escape = True
+                i = stop + 1
+                continue
+
+            # Closing quote
+            self._in_string = False
+            if self._string_is_key:
+                self._stack[-1].key = json.loads('"' + "".join(self._key_chars) + '"')
+            return stop + 1
+        return n
+
+    def _append(self, chars: str, key: bool = False):
+        """Record scanned characters on the root buffer and any active captures"""
+        self._root.append(chars)
+        for frame in self._stack:
+            if frame.capture is not None:
+                frame.capture.append(chars)
+        if key and self._in_string and self._string_is_key:
+            self._key_chars.append(chars)
+
+    def _child_path(self) -> JSONPath:
+        frame = self._stack[-1]
+        if frame.kind == "{":
+            return frame.path + (frame.key or "",)
+        return frame.path
+
+    def _begin_element_if_needed(self, ch: str):
+        """Start capturing a scalar element of a watched array"""
+        if ch in _WHITESPACE or not self._stack:
+            return
+        frame = self._stack[-1]
+        if frame.kind == "[" and frame.path in self.element_paths and frame.capture is None:
+            frame.capture = []
+
+    def _open(self, ch: str):
+        if self._stack:
+            self._begin_element_if_needed(ch)
+            path = self._child_path()
+        else:
+            path = ()
+        self._append(ch)
+        self._stack.append(_Frame(ch, path))
+
+    def _close(self, ch: str, events: List[JSONStreamEvent]):
+        self._end_scalar_element(events)
+        self._append(ch)
+        self._stack.pop()
+
+        if not self._stack:
+            self.done = True
+            self.value = json.loads(self.raw)
+            events.append(JSONStreamEvent("complete", (), self.value))
+            return
+
+        parent = self._stack[-1]
+        if parent.kind == "[" and parent.capture is not None:
+            events.append(JSONStreamEvent("element", parent.path, json.loads("".join(parent.capture))))
+            parent.capture = None
+
+    def _end_scalar_element(self, events: List[JSONStreamEvent]):
+        """Emit a captured scalar element when its array reaches ',' or ']'"""
+        frame = self._stack[-1] if self._stack else None
+        if frame is None or frame.kind != "[" or frame.capture is None:
+            return
+        raw = "".join(frame.capture).strip()
+        frame.capture = None
+        if raw:
+            events.append(JSONStreamEvent("element", frame.path, json.loads(raw)))
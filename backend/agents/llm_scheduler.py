@@ -0,0 +1,309 @@
+"""
+LLM Scheduler
+Central admission point for every agent call, honoring key_manager.get_usage_limits()
+
+Each API key gets a token bucket refilled at max_requests_per_minute, so a
+burst on one key waits locally instead of hitting upstream 429s. Waiting
+requests are granted by priority class (interactive chat generation, then
+runtime decisions, then practice insights) and, within a class, round-robin
+across tenants, so one tenant's backlog cannot starve the others. A global
+cap bounds the number of calls in flight.
+"""
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+import asyncio
+import logging
+import time
+
+from backend.config.settings import settings
+from backend.config.key_manager import key_manager
+
+logger = logging.getLogger(__name__)
+
+# Full buckets are dropped past this many keys (a full bucket is the same as a new one)
+_MAX_IDLE_BUCKETS = 1024
+
+# Weight of the newest call in the moving average of slot hold times
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class Priority(IntEnum):
+    """Scheduling classes, most urgent first"""
+    INTERACTIVE = 0  # Chat workflow generation: a user is watching the stream
+    DECISION = 1  # Condition/loop evaluations of running workflows
+    INSIGHTS = 2  # Practice insights and questions
+
+
+class SchedulerTimeoutError(Exception):
+    """Raised when a request waits longer than the scheduler's max_wait"""
+
+
+class TokenBucket:
+    """Requests-per-minute bucket; rate 0 means unlimited"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now: float) -> bool:
+        if not self.rate:
+            return True
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return not self.rate or self.tokens >= self.capacity
+
+    def seconds_until_token(self, now: float) -> float:
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "tenant", "bucket_key", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: Priority, tenant: str, bucket_key: str):
+        self.future = future
+        self.priority = priority
+        self.tenant = tenant
+        self.bucket_key = bucket_key
+        self.enqueued_at = time.monotonic()
+
+
+class _ClassStats:
+    """Counters for one priority class"""
+
+    def __init__(self):
+        self.granted = 0
+        self.timeouts = 0
+        self.throttled = 0  # Granted only after waiting for a bucket token or a free slot
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "granted": self.granted,
+            "throttled": self.throttled,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.granted * 1000, 1) if self.granted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1)
+        }
+
+
+class LLMScheduler:
+    """
+    Priority, per-key rate limited admission for agent calls.
+
+    Usage:
+        async with llm_scheduler.slot(Priority.DECISION, api_key):
+            ...  # one upstream request
+    """
+
+    def __init__(self, enabled: bool, max_concurrency: int, burst: int, max_wait: float):
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.burst = burst
+        self.max_wait = max_wait
+        self._buckets: Dict[str, TokenBucket] = {}
+        # priority -> tenant -> waiters; tenants rotate to the end when served (round-robin)
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[_Waiter]]"] = {priority: OrderedDict() for priority in Priority}
+        self._in_flight = 0
+        self._in_flight_by_tenant: Dict[str, int] = {}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._stats: Dict[Priority, _ClassStats] = {priority: _ClassStats() for priority in Priority}
+        self._service_time: Optional[float] = None  # Moving average of seconds a slot is held
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, api_key: Optional[str], tenant: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Wait for a bucket token and a free slot, then hold the slot for the duration of the block.
+
+        Args:
+            tenant: Fair-share group; defaults to the API key's fingerprint
+
+        Raises:
+            SchedulerTimeoutError: If the request is not admitted within max_wait
+        """
+        if not self.enabled:
+            yield
+            return
+
+        bucket_key = key_manager.get_key_fingerprint(api_key)
+        tenant = tenant or bucket_key
+        await self._acquire(priority, tenant, bucket_key)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            self._service_time = held if self._service_time is None else (
+                _SERVICE_TIME_ALPHA * held + (1 - _SERVICE_TIME_ALPHA) * self._service_time
+            )
+            self._release(tenant)
+
+    async def _acquire(self, priority: Priority, tenant: str, bucket_key: str):
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, tenant, bucket_key)
+        self._queues[priority].setdefault(tenant, deque()).append(waiter)
+        self._pump()
+        if waiter.future.done():
+            return
+
+        stats = self._stats[priority]
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted while being cancelled: hand the slot back
+                self._release(tenant)
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+                self._pump()
+            if isinstance(e, asyncio.TimeoutError):
+                stats.timeouts += 1
+                raise SchedulerTimeoutError(f"LLM request ({priority.name.lower()}) not admitted within {self.max_wait}s")
+            raise
+        stats.throttled += 1
+
+    def _release(self, tenant: str):
+        self._in_flight -= 1
+        remaining = self._in_flight_by_tenant[tenant] - 1
+        if remaining:
+            self._in_flight_by_tenant[tenant] = remaining
+        else:
+            del self._in_flight_by_tenant[tenant]
+        self._pump()
+
+    def _remove(self, waiter: _Waiter):
+        tenants = self._queues[waiter.priority]
+        waiters = tenants.get(waiter.tenant)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del tenants[waiter.tenant]
+
+    def _bucket(self, bucket_key: str) -> TokenBucket:
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_IDLE_BUCKETS:
+                now = time.monotonic()
+                self._buckets = {key: kept for key, kept in self._buckets.items() if not kept.is_full(now)}
+            limits = key_manager.get_usage_limits()
+            per_minute = limits.get("max_requests_per_minute", 0) if limits.get("enable_rate_limiting", True) else 0
+            bucket = TokenBucket(per_minute or 0, self.burst)
+            self._buckets[bucket_key] = bucket
+        return bucket
+
+    def _pump(self):
+        """Grant waiters while slots are free: strict priority, round-robin across tenants within a class"""
+        now = time.monotonic()
+        next_token: Optional[float] = None
+        while self._in_flight < self.max_concurrency:
+            head = None
+            next_token = None
+            for priority in Priority:
+                tenants = self._queues[priority]
+                for tenant, waiters in tenants.items():
+                    bucket = self._bucket(waiters[0].bucket_key)
+                    if bucket.try_take(now):
+                        head = waiters.popleft()
+                        break
+                    delay = bucket.seconds_until_token(now)
+                    next_token = delay if next_token is None else min(next_token, delay)
+                if head is not None:
+                    tenants.move_to_end(head.tenant)
+                    if not tenants[head.tenant]:
+                        del tenants[head.tenant]
+                    break
+            if head is None:
+                break
+            # Restart from the most urgent class after every grant
+            self._grant(head, now)
+        else:
+            return  # No free slot: a finishing request pumps again
+
+        if next_token is not None and self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().call_later(next_token, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._pump()
+
+    def _grant(self, waiter: _Waiter, now: float):
+        self._in_flight += 1
+        self._in_flight_by_tenant[waiter.tenant] = self._in_flight_by_tenant.get(waiter.tenant, 0) + 1
+        waited = now - waiter.enqueued_at
+        stats = self._stats[waiter.priority]
+        stats.granted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        waiter.future.set_result(None)
+
+    # ------------------------------------------------------------------
+    # Load
+    # ------------------------------------------------------------------
+
+    @property
+    def pending(self) -> int:
+        """Calls in flight plus calls queued"""
+        return self._in_flight + sum(len(waiters) for tenants in self._queues.values() for waiters in tenants.values())
+
+    def estimate_wait(self, priority: Priority) -> float:
+        """Rough seconds a new request of this class would queue (0 until a call has completed)"""
+        ahead = sum(len(waiters) for queued in Priority if queued <= priority for waiters in self._queues[queued].values())
+        if self._service_time is None or (not ahead and self._in_flight < self.max_concurrency):
+            return 0.0
+        return (ahead + 1) / self.max_concurrency * self._service_time
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        limits = key_manager.get_usage_limits()
+        return {
+            "enabled": self.enabled,
+            "rate_limiting": bool(limits.get("enable_rate_limiting", True)),
+            "max_requests_per_minute": limits.get("max_requests_per_minute"),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "tenants_in_flight": len(self._in_flight_by_tenant),
+            "avg_service_ms": round(self._service_time * 1000, 1) if self._service_time is not None else None,
+            "queue_depth": {
+                priority.name.lower(): sum(len(waiters) for waiters in self._queues[priority].values())
+                for priority in Priority
+            },
+            "by_priority": {priority.name.lower(): self._stats[priority].get_stats() for priority in Priority}
+        }
+
+
+# Global instance
+llm_scheduler = LLMScheduler(
+    enabled=settings.llm_scheduler_enabled,
+    max_concurrency=settings.llm_scheduler_max_concurrency,
+    burst=settings.llm_scheduler_burst,
+    max_wait=settings.llm_scheduler_max_wait
+)
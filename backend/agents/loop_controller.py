@@ -1,53 +1,99 @@
 """
 Loop Controller Agent
 """
-from typing import Dict, Any, Optional
-from claude_agent_sdk import query, ClaudeAgentOptions
+from typing import Dict, Any, Callable, Optional
+from datetime import datetime
 from backend.config.key_manager import key_manager
-from backend.models.workflow_context import LoopEvaluationRequest, LoopEvaluationResponse
-import json
-import os
+from backend.agents.model_router import evaluator_router
+from backend.agents.rule_compiler import evaluate_rule
+from backend.agents.decision_cache import decision_cache
+from backend.agents.context_slicer import slice_context
+from backend.agents.prompt_encoding import encode_for_prompt
+from backend.models.workflow_context import LoopEvaluationRequest, LoopEvaluationResponse, WorkflowInstance
+
+
+def build_loop_prompt(
+    request: LoopEvaluationRequest,
+    context: Dict[str, Any],
+    encode: Callable[[Any], str] = encode_for_prompt
+) -> str:
+    return f"""Loop iteration {request.iteration_count}
+Continue: {request.continue_rule}
+Break: {request.break_rule}
+Context:
+{encode(context)}
+Respond JSON: {{"action": "continue|break|escalate", "reasoning": "...", "confidence": 0.9}}"""
 
 
 class LoopControllerAgent:
     def __init__(self, user_api_key: Optional[str] = None):
         self.user_api_key = user_api_key
 
-    async def evaluate_loop(self, request: LoopEvaluationRequest, user_api_key: Optional[str] = None) -> LoopEvaluationResponse:
+    async def evaluate_loop(
+        self,
+        request: LoopEvaluationRequest,
+        user_api_key: Optional[str] = None,
+        instance: Optional[WorkflowInstance] = None
+    ) -> LoopEvaluationResponse:
+        rules = [request.continue_rule, request.break_rule, request.escalation_rule]
+
+        # Only the referenced block outputs/fields go into rules, cache keys and the prompt
+        sliced = slice_context(request.workflow_context, rules, request.referenced_block_ids, instance=instance)
+
+        # Deterministic fast-path for trivial rules (no LLM call)
+        rule_response = self._evaluate_rules(request, sliced.projected)
+        if rule_response is not None:
+            return rule_response
+
+        cache_key = decision_cache.make_key("loop", rules, sliced.projected, extra=request.iteration_count)
+        cached = decision_cache.get(cache_key)
+        if cached is not None:
+            return cached.model_copy(update={"decided_by": "cache", "timestamp": datetime.now()})
+
         api_key = key_manager.get_claude_api_key(user_api_key or self.user_api_key)
         if not api_key:
-            return LoopEvaluationResponse(action="escalate", reasoning="No API key", confidence=0.0)
+            return LoopEvaluationResponse(action="escalate", reasoning="No API key", confidence=0.0, decided_by="agent")
 
         try:
-            os.environ['ANTHROPIC_API_KEY'] = api_key
-            
-            prompt = f"""Loop iteration {request.iteration_count}
-Continue: {request.continue_rule}
-Break: {request.break_rule}
-Context: {json.dumps(request.workflow_context)}
-Respond JSON: {{"action": "continue|break|escalate", "reasoning": "...", "confidence": 0.9}}"""
+            prompt = build_loop_prompt(request, sliced.context)
 
-            response_text = ""
-            async for message in query(prompt=prompt, options=ClaudeAgentOptions(model=key_manager.get_claude_model())):
-                if hasattr(message, 'content') and message.content:
-                    for block in message.content:
-                        if hasattr(block, 'text') and block.text:
-                            response_text += block.text
+            # Fast model first, larger model only on low confidence or parse failure
+            action_data, _ = await evaluator_router.route(prompt, LoopEvaluationResponse, api_key)
+            if action_data is None:
+                return LoopEvaluationResponse(action="break", reasoning="Parse failed", confidence=0.0, decided_by="agent")
 
-            action_data = self._parse_action(response_text)
-            return LoopEvaluationResponse(**action_data)
+            response = LoopEvaluationResponse(**action_data, decided_by="agent")
+            if response.action != "escalate":
+                decision_cache.set(cache_key, response)
+            return response
         except Exception as e:
-            return LoopEvaluationResponse(action="break", reasoning=str(e), confidence=0.0)
+            return LoopEvaluationResponse(action="break", reasoning=str(e), confidence=0.0, decided_by="agent")
 
-    def _parse_action(self, text: str) -> Dict[str, Any]:
-        try:
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end > start:
-                return json.loads(text[start:end])
-        except:
-            pass
-        return {"action": "break", "reasoning": "Parse failed", "confidence": 0.0}
+    def _evaluate_rules(self, request: LoopEvaluationRequest, context: Dict[str, Any]) -> Optional[LoopEvaluationResponse]:
+        """Decide the loop action from compiled rules, or None if the agent must decide"""
+        iteration = request.iteration_count
+
+        if request.escalation_rule:
+            escalate = evaluate_rule(request.escalation_rule, context, iteration)
+            if escalate is None:
+                return None
+            if escalate:
+                return self._rule_response("escalate", "Escalation rule matched")
+
+        # A blank break rule means the loop only ends when the continue rule stops holding
+        should_break = evaluate_rule(request.break_rule, context, iteration) if request.break_rule.strip() else False
+        if should_break:
+            return self._rule_response("break", "Break rule matched")
+
+        should_continue = evaluate_rule(request.continue_rule, context, iteration)
+        if should_continue and should_break is False:
+            return self._rule_response("continue", "Continue rule matched and break rule did not")
+        if should_continue is False:
+            return self._rule_response("break", "Continue rule no longer holds")
+        return None
+
+    def _rule_response(self, action: str, reasoning: str) -> LoopEvaluationResponse:
+        return LoopEvaluationResponse(action=action, reasoning=reasoning, confidence=1.0, decided_by="rule")
 
 
 loop_controller = LoopControllerAgent()
@@ -0,0 +1,216 @@
+"""
+Model Router
+Tiered model routing with confidence-based escalation for runtime decisions
+
+Condition and loop evaluations first go to a fast, cheap model. The larger
+configured model is only asked when the fast answer fails to parse or its
+confidence is below settings.evaluator_escalation_confidence. Per-tier
+latency, escalation rate and estimated cost are recorded for tuning.
+"""
+from contextlib import aclosing
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+import asyncio
+import logging
+import time
+
+from pydantic import BaseModel
+
+from backend.config.settings import settings
+from backend.config.key_manager import key_manager
+from backend.agents.client_pool import client_pool
+from backend.agents.resilience import CircuitOpenError, agent_resilience
+from backend.agents.structured_output import StructuredOutputExtractor
+
+logger = logging.getLogger(__name__)
+
+# USD per million (input, output) tokens, matched by model-name prefix
+MODEL_PRICING = {
+    "claude-haiku": (1.0, 5.0),
+    "claude-sonnet": (3.0, 15.0),
+    "claude-opus": (15.0, 75.0),
+}
+
+CHARS_PER_TOKEN = 4
+
+
+class ModelResponse(NamedTuple):
+    """Text, structured data and usage collected from one agent query"""
+    text: str
+    data: Optional[Dict[str, Any]]
+    input_tokens: int
+    output_tokens: int
+    early_stop: bool  # Stream was abandoned once the structured output was complete
+    repaired: bool
+
+
+async def collect_response(messages, extractor: StructuredOutputExtractor) -> ModelResponse:
+    """Feed an agent message stream into extractor, stopping as soon as it has a valid object"""
+    usage: Dict[str, Any] = {}
+    early_stop = False
+    async with aclosing(messages):
+        async for message in messages:
+            if hasattr(message, 'content') and message.content:
+                for block in message.content:
+                    if hasattr(block, 'text') and block.text and extractor.feed(block.text) is not None:
+                        early_stop = True
+            if isinstance(getattr(message, 'usage', None), dict):
+                usage = message.usage
+            if early_stop:
+                break
+    data = extractor.result if early_stop else extractor.finish()
+    return ModelResponse(
+        text=extractor.text,
+        data=data,
+        input_tokens=int(usage.get("input_tokens", 0) or 0),
+        output_tokens=int(usage.get("output_tokens", 0) or 0),
+        early_stop=early_stop,
+        repaired=extractor.repaired
+    )
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    for prefix, (input_price, output_price) in MODEL_PRICING.items():
+        if model.startswith(prefix):
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+class TierStats:
+    """Counters for one routing tier"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.call_failures = 0  # Circuit open or deadline exceeded
+        self.parse_failures = 0
+        self.low_confidence = 0
+        self.early_stops = 0
+        self.repaired = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "call_failures": self.call_failures,
+            "parse_failures": self.parse_failures,
+            "low_confidence": self.low_confidence,
+            "early_stops": self.early_stops,
+            "repaired": self.repaired,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "estimated_cost_usd": round(self.cost_usd, 6)
+        }
+
+
+class EvaluatorModelRouter:
+    """Routes evaluator prompts through fast -> strong model tiers"""
+
+    def __init__(self):
+        self._stats: Dict[str, TierStats] = {}
+        self.requests = 0
+        self.escalations = 0
+
+    def get_tiers(self) -> List[Tuple[str, str]]:
+        """(tier name, model) pairs in the order they are tried"""
+        strong_model = key_manager.get_claude_model()
+        fast_model = settings.evaluator_fast_model
+        if not settings.evaluator_routing_enabled or not fast_model or fast_model == strong_model:
+            return [("strong", strong_model)]
+        return [("fast", fast_model), ("strong", strong_model)]
+
+    async def route(
+        self,
+        prompt: str,
+        response_model: Type[BaseModel],
+        api_key: str,
+        hedge: bool = False
+    ) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        Run prompt through the tiers until an answer is confident enough.
+
+        A tier whose circuit is open or whose call times out escalates like a
+        parse failure; the last tier re-raises. With hedge, a tier call slower
+        than its recent p95 is duplicated (see AgentResilience.call).
+
+        Returns:
+            (fields validated against response_model, or None if every tier
+            failed to produce one; model that answered)
+        """
+        self.requests += 1
+        tiers = self.get_tiers()
+        threshold = settings.evaluator_escalation_confidence
+        data: Optional[Dict[str, Any]] = None
+        model = tiers[-1][1]
+
+        for index, (tier, model) in enumerate(tiers):
+            stats = self._stats.setdefault(tier, TierStats(tier))
+            is_last = index == len(tiers) - 1
+            started = time.monotonic()
+
+            def attempt(model: str = model):
+                # A fresh extractor per attempt, since a hedge runs two at once
+                extractor = StructuredOutputExtractor(response_model)
+                return collect_response(client_pool.query(prompt, model=model, api_key=api_key), extractor)
+
+            try:
+                response = await agent_resilience.call(f"evaluator:{tier}", attempt, hedge=hedge)
+            except (CircuitOpenError, asyncio.TimeoutError) as e:
+                stats.call_failures += 1
+                if is_last:
+                    raise
+                self.escalations += 1
+                logger.warning(f"Escalating evaluation from {tier} tier ({model}): {e}")
+                continue
+            latency = time.monotonic() - started
+
+            input_tokens = response.input_tokens or len(prompt) // CHARS_PER_TOKEN
+            output_tokens = response.output_tokens or len(response.text) // CHARS_PER_TOKEN
+            stats.calls += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost_usd += estimate_cost(model, input_tokens, output_tokens)
+            stats.early_stops += int(response.early_stop)
+            stats.repaired += int(response.repaired)
+
+            data = response.data
+            if data is None:
+                stats.parse_failures += 1
+            elif _confidence(data) < threshold:
+                stats.low_confidence += 1
+            else:
+                return data, model
+
+            if not is_last:
+                self.escalations += 1
+                logger.info(f"Escalating evaluation from {tier} tier ({model}): {'parse failure' if data is None else 'low confidence'}")
+
+        return data, model
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "tiers": [{"tier": tier, "model": model} for tier, model in self.get_tiers()],
+            "escalation_confidence": settings.evaluator_escalation_confidence,
+            "requests": self.requests,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / self.requests, 4) if self.requests else 0.0,
+            "by_tier": {name: stats.get_stats() for name, stats in self._stats.items()}
+        }
+
+
+def _confidence(data: Dict[str, Any]) -> float:
+    try:
+        return float(data.get("confidence"))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# Global instance
+evaluator_router = EvaluatorModelRouter()
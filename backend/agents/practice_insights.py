@@ -3,13 +3,43 @@ Practice Insights Agent
 Generates AI-powered insights from practice operational data and answers questions about practice metrics
 """
 
-from typing import Dict, Any, List, Optional
-from claude_agent_sdk import query, ClaudeAgentOptions
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
+import asyncio
 import json
-import os
 import hashlib
-import time
 from backend.config.key_manager import key_manager
+from backend.agents.client_pool import client_pool
+from backend.agents.llm_scheduler import Priority
+from backend.agents.insights_cache import insights_cache
+from backend.agents.practice_metrics import build_insight_tiles, compute_practice_metrics, summarize_metrics
+from backend.agents.practice_questions import normalize_question, practice_question_router
+from backend.agents.prompt_encoding import encode_for_prompt
+
+
+def build_summary_prompt(metrics: Dict[str, Any], encode: Callable[[Any], str] = encode_for_prompt) -> str:
+    return f"""You are a healthcare practice operations analyst. Write an executive summary of the following practice metrics. All numbers are already computed; do not recalculate them.
+
+Practice Metrics:
+{encode(metrics)}
+
+Rules:
+- Exactly 5 sentences (less than 120 words) covering performance overview, revenue/growth, operational efficiency, patient satisfaction, and future outlook
+- Quote the numbers above as given
+- Return ONLY the summary text, no JSON, headings or markdown
+"""
+
+
+def build_question_prompt(question: str, metrics: Dict[str, Any], encode: Callable[[Any], str] = encode_for_prompt) -> str:
+    return f"""You are a healthcare practice operations analyst. Answer the following question based on the practice data provided.
+
+Practice Data:
+{encode(metrics)}
+
+Question: {question}
+
+Provide a clear, concise answer with specific numbers from the data. If the question cannot be answered with the available data, politely explain what data would be needed.
+
+Keep your answer to 2-4 sentences and be specific."""
 
 
 class PracticeInsightsAgent:
@@ -17,323 +47,236 @@ class PracticeInsightsAgent:
 
     def __init__(self, user_api_key: Optional[str] = None):
         self.user_api_key = user_api_key
-        self.cache = {}  # Simple in-memory cache: {data_hash: (insights, timestamp)}
-        self.cache_duration = 604800  # 1 week in seconds (7 * 24 * 60 * 60)
+        self.cache = insights_cache  # Bounded LRU+TTL, persisted to disk, single-flight
 
     def _get_data_hash(self, practice_data: Dict[str, Any]) -> str:
         """Generate hash of practice data for caching"""
         data_str = json.dumps(practice_data, sort_keys=True)
-        return hashlib.md5(data_str.encode()).hexdigest()
-
-    def _is_cache_valid(self, timestamp: float) -> bool:
-        """Check if cached data is still valid"""
-        return (time.time() - timestamp) < self.cache_duration
-
-    async def generate_insights(self, practice_data: Dict[str, Any], user_api_key: Optional[str] = None) -> Dict[str, Any]:
+        return hashlib.sha256(data_str.encode()).hexdigest()
+
+    def _fallback_insights(self, metrics: Dict[str, Any], include_outlook: bool = False) -> Dict[str, Any]:
+        """Deterministic summary and insights computed straight from the practice metrics"""
+        return {
+            "summary": summarize_metrics(metrics, include_outlook=include_outlook),
+            "insights": build_insight_tiles(metrics)
+        }
+
+    async def generate_insights(
+        self,
+        practice_data: Dict[str, Any],
+        user_api_key: Optional[str] = None,
+        use_llm: bool = True
+    ) -> Dict[str, Any]:
         """
         Generate AI insights from practice operational data (with caching)
 
+        The insight tiles are computed locally (see practice_metrics); the model
+        only writes the narrative summary over the computed numbers.
+
         Args:
-            practice_data: Dictionary containing current/previous period metrics
+            practice_data: Current/previous period totals and/or raw appointment, visit and revenue records
             user_api_key: Optional user API key
+            use_llm: False serves cached insights or the deterministic fallback without calling the model
 
         Returns:
             Dictionary with 'summary' (string) and 'insights' (list of dicts)
         """
+        result, _ = await self.generate_cacheable_insights(practice_data, user_api_key, use_llm)
+        return result
+
+    async def generate_cacheable_insights(
+        self,
+        practice_data: Dict[str, Any],
+        user_api_key: Optional[str] = None,
+        use_llm: bool = True
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        generate_insights() plus the cache key the result is stored under
+
+        Returns:
+            (insights, cache key or None for an uncached fallback); the key
+            identifies the response, e.g. as an HTTP ETag
+        """
+        metrics = compute_practice_metrics(practice_data)
 
-        # Check cache first
-        data_hash = self._get_data_hash(practice_data)
-        if data_hash in self.cache:
-            cached_data, timestamp = self.cache[data_hash]
-            if self._is_cache_valid(timestamp):
-                print(f"[CACHE HIT] Returning cached insights")
-                return cached_data
+        # Check cache first (keyed on the computed numbers, not the raw records)
+        data_hash = self._get_data_hash(metrics)
+        cached = await self.cache.get(data_hash)
+        if cached is not None:
+            print(f"[CACHE HIT] Returning cached insights")
+            return cached, data_hash
 
         api_key = key_manager.get_claude_api_key(user_api_key or self.user_api_key)
 
         # If no API key, return fallback insights immediately
         if not api_key:
             print("[INFO] No API key found, returning fallback insights")
-            curr = practice_data.get('current_period', {})
-            prev = practice_data.get('previous_period', {})
-            comp = practice_data.get('period_comparison', {})
-
-            rev_change = curr.get('total_revenue', 0) - prev.get('total_revenue', 0)
-            pat_change = curr.get('total_patients', 0) - prev.get('total_patients', 0)
-
-            # Generate summary
-            summary = f"Your practice is showing strong growth with revenue up {comp.get('revenue_change', 0):.1f}% and {pat_change} new patients. Patient engagement has increased to {curr.get('patient_engagement', 0)}%, while wait times have improved by {abs(comp.get('wait_time_change', 0)):.1f}%. Provider utilization is at {curr.get('provider_utilization', 0)}% with {curr.get('appointments_completed', 0)} completed appointments. No-show rate has decreased to {curr.get('no_show_rate', 0):.1f}%, indicating better patient commitment."
-
-            insights = [
-                {
-                    "type": "positive" if comp.get('revenue_change', 0) > 0 else "negative",
-                    "title": "Revenue",
-                    "value": f"+{comp.get('revenue_change', 0):.1f}%",
-                    "change": f"+${rev_change/1000:.1f}K",
-                    "trend": "up" if comp.get('revenue_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('total_patients_change', 0) > 0 else "negative",
-                    "title": "Patients",
-                    "value": f"+{comp.get('total_patients_change', 0):.1f}%",
-                    "change": f"+{pat_change}",
-                    "trend": "up" if comp.get('total_patients_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('wait_time_change', 0) < 0 else "warning",
-                    "title": "Wait Time",
-                    "value": f"{comp.get('wait_time_change', 0):.1f}%",
-                    "change": f"{curr.get('average_wait_time', 0)}min",
-                    "trend": "down" if comp.get('wait_time_change', 0) < 0 else "up"
-                },
-                {
-                    "type": "positive" if comp.get('engagement_change', 0) > 0 else "warning",
-                    "title": "Engagement",
-                    "value": f"{curr.get('patient_engagement', 0)}%",
-                    "change": f"+{comp.get('engagement_change', 0):.1f}%",
-                    "trend": "up" if comp.get('engagement_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('no_show_change', 0) < 0 else "warning",
-                    "title": "No-Shows",
-                    "value": f"{curr.get('no_show_rate', 0):.1f}%",
-                    "change": f"{comp.get('no_show_change', 0):.1f}%",
-                    "trend": "down" if comp.get('no_show_change', 0) < 0 else "up"
-                },
-                {
-                    "type": "positive",
-                    "title": "Completed",
-                    "value": f"{curr.get('appointments_completed', 0)}",
-                    "change": f"+{curr.get('appointments_completed', 0) - prev.get('appointments_completed', 0)}",
-                    "trend": "up"
-                },
-                {
-                    "type": "positive" if comp.get('new_patients_change', 0) > 0 else "warning",
-                    "title": "New Patients",
-                    "value": f"+{comp.get('new_patients_change', 0):.1f}%",
-                    "change": f"{curr.get('new_patients', 0)}",
-                    "trend": "up" if comp.get('new_patients_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('utilization_change', 0) > 0 else "warning",
-                    "title": "Utilization",
-                    "value": f"{curr.get('provider_utilization', 0)}%",
-                    "change": f"+{comp.get('utilization_change', 0):.1f}%",
-                    "trend": "up" if comp.get('utilization_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive",
-                    "title": "Scheduled",
-                    "value": f"{curr.get('appointments_scheduled', 0)}",
-                    "change": f"+{curr.get('appointments_scheduled', 0) - prev.get('appointments_scheduled', 0)}",
-                    "trend": "up"
-                },
-                {
-                    "type": "warning",
-                    "title": "Cancelled",
-                    "value": f"{curr.get('appointments_cancelled', 0)}",
-                    "change": f"+{curr.get('appointments_cancelled', 0) - prev.get('appointments_cancelled', 0)}",
-                    "trend": "up"
-                }
-            ]
-
-            return {
-                "summary": summary,
-                "insights": insights
-            }
-
-        prompt = f"""You are a healthcare practice operations analyst. Analyze the following practice data and generate a summary and exactly 10 diverse insights.
+            return self._fallback_insights(metrics), None
+
+        # Model backend is shedding load: answer from the data instead of queuing
+        if not use_llm:
+            print("[INFO] Model backend busy, returning fallback insights")
+            return {**self._fallback_insights(metrics), "degraded": True}, None
+
+        # Concurrent loads of the same data share one model call
+        result = await self.cache.get_or_compute(data_hash, lambda: self._generate(metrics, api_key))
+        return result, data_hash if data_hash in self.cache else None
+
+    async def stream_insights(
+        self,
+        practice_data: Dict[str, Any],
+        user_api_key: Optional[str] = None,
+        use_llm: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream insights as events, for /api/practice-insights/stream
 
-Practice Data:
-{json.dumps(practice_data, indent=2)}
-
-Return a JSON object with this EXACT format:
-{{
-  "summary": "3-sentence executive summary (less than 100 words) covering overall performance, key wins, areas of concern, and forward-looking projection. Each sentence should be substantial and informative.",
-  "insights": [
-    {{
-      "type": "positive|negative|warning",
-      "title": "Revenue" (1-2 words only),
-      "value": "+8.9%" (the main metric - NEVER use "N/A"),
-      "change": "+$7.3K" (use K for thousands, optional),
-      "trend": "up" (up|down|stable)
-    }}
-  ]
-}}
+        Yields, in order:
+            {"event": "insights", "data": {"insights": [...]}}   computed locally, immediately
+            {"event": "summary_delta", "data": {"text": "..."}}  summary text as the model writes it
+            {"event": "summary", "data": {"summary": "...", "cached": bool, "degraded": bool}}
 
-Rules:
-- Summary: Exactly 5 sentences covering performance overview, revenue/growth, operational efficiency, patient satisfaction, and future outlook
-- EXACTLY 10 different insights covering different metrics
-- value must ALWAYS be a real number (never "N/A" or null)
-- Use K for thousands (e.g., "$7.3K" not "$7,270")
-- Mix of: revenue, patients, appointments, wait time, utilization, engagement, services
-- Use positive for improvements, negative for declines, warning for concerns
-- trend must be: "up", "down", or "stable"
-
-Return ONLY the JSON object, no additional text.
-"""
+        A cached result replays at once; a load that joins another request's
+        in-flight generation gets its summary without deltas.
+        """
+        metrics = compute_practice_metrics(practice_data)
+        yield {"event": "insights", "data": {"insights": build_insight_tiles(metrics)}}
 
-        try:
-            os.environ['ANTHROPIC_API_KEY'] = api_key
+        data_hash = self._get_data_hash(metrics)
+        cached = await self.cache.get(data_hash)
+        if cached is not None:
+            yield {"event": "summary", "data": {"summary": cached["summary"], "cached": True, "degraded": False}}
+            return
+
+        api_key = key_manager.get_claude_api_key(user_api_key or self.user_api_key)
+        if not api_key or not use_llm:
+            summary = summarize_metrics(metrics)
+            yield {"event": "summary", "data": {"summary": summary, "cached": False, "degraded": bool(api_key)}}
+            return
+
+        deltas: asyncio.Queue = asyncio.Queue()
+        # Not cancelled if the client disconnects: the result still fills the cache for other loads
+        generation = asyncio.ensure_future(
+            self.cache.get_or_compute(data_hash, lambda: self._generate(metrics, api_key, on_text=deltas.put_nowait))
+        )
+        while not generation.done():
+            next_delta = asyncio.ensure_future(deltas.get())
+            await asyncio.wait({next_delta, generation}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_delta.done():
+                next_delta.cancel()
+                break
+            yield {"event": "summary_delta", "data": {"text": next_delta.result()}}
+        while not deltas.empty():
+            yield {"event": "summary_delta", "data": {"text": deltas.get_nowait()}}
+
+        result = await generation
+        yield {"event": "summary", "data": {"summary": result["summary"], "cached": False, "degraded": False}}
+
+    async def _generate(
+        self,
+        metrics: Dict[str, Any],
+        api_key: str,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Ask the model for the summary; returns (insights, cacheable)
+
+        on_text receives summary text as it streams in (not called for the fallback).
+        """
+        prompt = build_summary_prompt(metrics)
 
+        try:
             response_text = ""
-            async for message in query(prompt=prompt, options=ClaudeAgentOptions(model=key_manager.get_claude_model())):
+            streamed = False
+            async for message in client_pool.query(
+                prompt,
+                model=key_manager.get_claude_model(),
+                include_partial_messages=on_text is not None,
+                api_key=api_key,
+                priority=Priority.INSIGHTS
+            ):
+                # Partial text deltas (include_partial_messages) go straight to on_text
+                event = getattr(message, 'event', None)
+                if isinstance(event, dict) and event.get('type') == 'content_block_delta':
+                    text = event.get('delta', {}).get('text')
+                    if text and on_text:
+                        streamed = True
+                        on_text(text)
+                    continue
                 if hasattr(message, 'content') and message.content:
                     for block in message.content:
                         if hasattr(block, 'text') and block.text:
                             response_text += block.text
+                            if on_text and not streamed:
+                                on_text(block.text)
 
-            # Remove markdown code blocks if present
-            content = response_text.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-
-            result = json.loads(content)
-
-            # Cache the result
-            self.cache[data_hash] = (result, time.time())
-            print(f"[CACHE SET] Cached insights for {data_hash}")
-
-            return result
+            summary = response_text.strip()
+            if not summary:
+                raise ValueError("Empty summary")
+            return {"summary": summary, "insights": build_insight_tiles(metrics)}, True
 
         except Exception as e:
             print(f"[ERROR] Failed to generate insights: {e}")
             # Return fallback insights based on actual data
-            curr = practice_data.get('current_period', {})
-            prev = practice_data.get('previous_period', {})
-            comp = practice_data.get('period_comparison', {})
-
-            rev_change = curr.get('total_revenue', 0) - prev.get('total_revenue', 0)
-            pat_change = curr.get('total_patients', 0) - prev.get('total_patients', 0)
-
-            summary = f"Your practice is showing strong growth with revenue up {comp.get('revenue_change', 0):.1f}% and {pat_change} new patients. Patient engagement has increased to {curr.get('patient_engagement', 0)}%, while wait times have improved by {abs(comp.get('wait_time_change', 0)):.1f}%. Provider utilization is at {curr.get('provider_utilization', 0)}% with {curr.get('appointments_completed', 0)} completed appointments. No-show rate has decreased to {curr.get('no_show_rate', 0):.1f}%, indicating better patient commitment. Continue focusing on patient engagement and operational efficiency for sustained growth."
-
-            insights = [
-                {
-                    "type": "positive" if comp.get('revenue_change', 0) > 0 else "negative",
-                    "title": "Revenue",
-                    "value": f"+{comp.get('revenue_change', 0):.1f}%",
-                    "change": f"+${rev_change/1000:.1f}K",
-                    "trend": "up" if comp.get('revenue_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('total_patients_change', 0) > 0 else "negative",
-                    "title": "Patients",
-                    "value": f"+{comp.get('total_patients_change', 0):.1f}%",
-                    "change": f"+{pat_change}",
-                    "trend": "up" if comp.get('total_patients_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('wait_time_change', 0) < 0 else "warning",
-                    "title": "Wait Time",
-                    "value": f"{comp.get('wait_time_change', 0):.1f}%",
-                    "change": f"{curr.get('average_wait_time', 0)}min",
-                    "trend": "down" if comp.get('wait_time_change', 0) < 0 else "up"
-                },
-                {
-                    "type": "positive" if comp.get('engagement_change', 0) > 0 else "warning",
-                    "title": "Engagement",
-                    "value": f"{curr.get('patient_engagement', 0)}%",
-                    "change": f"+{comp.get('engagement_change', 0):.1f}%",
-                    "trend": "up" if comp.get('engagement_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('no_show_change', 0) < 0 else "warning",
-                    "title": "No-Shows",
-                    "value": f"{curr.get('no_show_rate', 0):.1f}%",
-                    "change": f"{comp.get('no_show_change', 0):.1f}%",
-                    "trend": "down" if comp.get('no_show_change', 0) < 0 else "up"
-                },
-                {
-                    "type": "positive",
-                    "title": "Completed",
-                    "value": f"{curr.get('appointments_completed', 0)}",
-                    "change": f"+{curr.get('appointments_completed', 0) - prev.get('appointments_completed', 0)}",
-                    "trend": "up"
-                },
-                {
-                    "type": "positive" if comp.get('new_patients_change', 0) > 0 else "warning",
-                    "title": "New Patients",
-                    "value": f"+{comp.get('new_patients_change', 0):.1f}%",
-                    "change": f"{curr.get('new_patients', 0)}",
-                    "trend": "up" if comp.get('new_patients_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive" if comp.get('utilization_change', 0) > 0 else "warning",
-                    "title": "Utilization",
-                    "value": f"{curr.get('provider_utilization', 0)}%",
-                    "change": f"+{comp.get('utilization_change', 0):.1f}%",
-                    "trend": "up" if comp.get('utilization_change', 0) > 0 else "down"
-                },
-                {
-                    "type": "positive",
-                    "title": "Scheduled",
-                    "value": f"{curr.get('appointments_scheduled', 0)}",
-                    "change": f"+{curr.get('appointments_scheduled', 0) - prev.get('appointments_scheduled', 0)}",
-                    "trend": "up"
-                },
-                {
-                    "type": "warning",
-                    "title": "Cancelled",
-                    "value": f"{curr.get('appointments_cancelled', 0)}",
-                    "change": f"+{curr.get('appointments_cancelled', 0) - prev.get('appointments_cancelled', 0)}",
-                    "trend": "up"
-                }
-            ]
-
-            return {
-                "summary": summary,
-                "insights": insights
-            }
-
-    async def answer_question(self, question: str, practice_data: Dict[str, Any], user_api_key: Optional[str] = None) -> str:
+            return self._fallback_insights(metrics, include_outlook=True), False
+
+    def answer_locally(self, question: str, practice_data: Dict[str, Any]) -> Optional[str]:
+        """Templated answer to a metric lookup (value, change, ranking, top-N), or None if the model is needed"""
+        return practice_question_router.answer(question, compute_practice_metrics(practice_data))
+
+    async def answer_question(
+        self,
+        question: str,
+        practice_data: Dict[str, Any],
+        user_api_key: Optional[str] = None,
+        try_local: bool = True
+    ) -> str:
         """
         Answer a specific question about practice data
 
+        Metric lookups are answered locally (see answer_locally); only
+        open-ended questions go to the model, cached per (question, data).
+
         Args:
             question: User question
             practice_data: Dictionary containing practice metrics
             user_api_key: Optional user API key
+            try_local: False when the caller already tried answer_locally
 
         Returns:
-            AI-generated answer
+            Templated or AI-generated answer
         """
+        metrics = compute_practice_metrics(practice_data)
+        if try_local:
+            answer = practice_question_router.answer(question, metrics)
+            if answer is not None:
+                return answer
 
         api_key = key_manager.get_claude_api_key(user_api_key or self.user_api_key)
         if not api_key:
             return "Please configure your Claude API key to use the AI assistant."
 
-        prompt = f"""You are a healthcare practice operations analyst. Answer the following question based on the practice data provided.
+        cache_key = self._get_data_hash({"question": normalize_question(question), "data": self._get_data_hash(metrics)})
+        return await self.cache.get_or_compute(cache_key, lambda: self._ask(question, metrics, api_key))
 
-Practice Data:
-{json.dumps(practice_data, indent=2)}
-
-Question: {question}
-
-Provide a clear, concise answer with specific numbers from the data. If the question cannot be answered with the available data, politely explain what data would be needed.
-
-Keep your answer to 2-4 sentences and be specific."""
+    async def _ask(self, question: str, metrics: Dict[str, Any], api_key: str) -> Tuple[str, bool]:
+        """Ask the model; returns (answer, cacheable)"""
+        prompt = build_question_prompt(question, metrics)
 
         try:
-            os.environ['ANTHROPIC_API_KEY'] = api_key
-
             response_text = ""
-            async for message in query(prompt=prompt, options=ClaudeAgentOptions(model=key_manager.get_claude_model())):
+            async for message in client_pool.query(prompt, model=key_manager.get_claude_model(), api_key=api_key, priority=Priority.INSIGHTS):
                 if hasattr(message, 'content') and message.content:
                     for block in message.content:
                         if hasattr(block, 'text') and block.text:
                             response_text += block.text
 
-            return response_text.strip()
+            answer = response_text.strip()
+            return answer, bool(answer)
 
         except Exception as e:
             print(f"[ERROR] Failed to answer question: {e}")
-            return "I'm having trouble analyzing the data right now. Please try again."
+            return "I'm having trouble analyzing the data right now. Please try again.", False
 
 
 # Singleton instance
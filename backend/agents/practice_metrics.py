@@ -0,0 +1,420 @@
+"""
+Practice Metrics
+Deterministic practice KPIs computed locally from raw records
+
+The dashboard may send raw records instead of (or alongside) precomputed
+period totals:
+
+    "appointments": [{"start": "2025-10-06T09:30", "status": "completed|scheduled|cancelled|no_show",
+                      "patient_id": "...", "provider": "...", "service": "...", "new_patient": false}]
+    "visits":       [{"checked_in": "2025-10-06T09:42", "patient_id": "...", "provider": "...",
+                      "wait_minutes": 12, "satisfaction": 4.8}]
+    "revenue":      [{"date": "2025-10-06", "amount": 180.0, "service": "...", "provider": "..."}]
+    "periods":      {"current": {"start": "2025-10-01", "end": "2025-10-31"},
+                     "previous": {"start": "2025-09-01", "end": "2025-09-30"}}  (optional, inclusive dates)
+
+Each record list is loaded into NumPy arrays once and every aggregate is a
+vectorized reduction (boolean masks, bincount over np.unique codes). Totals
+the records cannot express (engagement, utilization) are taken from the
+client's current_period/previous_period. period_comparison is always derived
+here from the two periods' totals, never trusted from the client.
+
+Input that cannot be read (a non-numeric amount, a period start that is not a
+date) raises PracticeDataError naming the offending field; missing or
+malformed timestamps on individual records are skipped instead.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+RECORD_KEYS = ("appointments", "visits", "revenue", "periods")
+
+DEFAULT_PERIOD_DAYS = 30
+TOP_SERVICES = 3
+PEAK_WINDOWS = 2
+PEAK_WINDOW_HOURS = 2
+
+# period_comparison key -> period total it compares
+COMPARISONS = {
+    "total_patients_change": "total_patients",
+    "new_patients_change": "new_patients",
+    "revenue_change": "total_revenue",
+    "engagement_change": "patient_engagement",
+    "wait_time_change": "average_wait_time",
+    "utilization_change": "provider_utilization",
+    "no_show_change": "no_show_rate",
+    "appointments_scheduled_change": "appointments_scheduled",
+    "appointments_completed_change": "appointments_completed",
+    "appointments_cancelled_change": "appointments_cancelled",
+}
+
+
+class PracticeDataError(ValueError):
+    """Raised when practice data sent by the client cannot be read"""
+
+
+class _Tile(NamedTuple):
+    title: str
+    metric: str
+    higher_is_better: bool
+    decline_type: str  # Tile type when the metric moves the wrong way
+    value: str  # How the headline is formatted (see _format)
+    change: str
+
+
+# The ten dashboard tiles, in display order
+TILES = (
+    _Tile("Revenue", "total_revenue", True, "negative", "pct_change", "money_delta"),
+    _Tile("Patients", "total_patients", True, "negative", "pct_change", "delta"),
+    _Tile("Wait Time", "average_wait_time", False, "warning", "pct_change", "minutes"),
+    _Tile("Engagement", "patient_engagement", True, "warning", "percent", "pct_change"),
+    _Tile("No-Shows", "no_show_rate", False, "warning", "percent", "pct_change"),
+    _Tile("Completed", "appointments_completed", True, "warning", "count", "delta"),
+    _Tile("New Patients", "new_patients", True, "warning", "pct_change", "count"),
+    _Tile("Utilization", "provider_utilization", True, "warning", "percent", "pct_change"),
+    _Tile("Scheduled", "appointments_scheduled", True, "warning", "count", "delta"),
+    _Tile("Cancelled", "appointments_cancelled", False, "warning", "count", "delta"),
+)
+
+
+# ----------------------------------------------------------------------
+# Record loading
+# ----------------------------------------------------------------------
+
+def _time(value: str) -> np.datetime64:
+    try:
+        return np.datetime64(value, "m")
+    except ValueError:
+        return np.datetime64("NaT", "m")
+
+
+def _times(records: List[Dict[str, Any]], field: str) -> np.ndarray:
+    """Local wall-clock minutes; a trailing offset or "Z" is ignored, missing or malformed values are NaT"""
+    values = [str(record.get(field) or "NaT")[:16] for record in records]
+    try:
+        return np.array(values, dtype="datetime64[m]")
+    except ValueError:
+        return np.array([_time(value) for value in values], dtype="datetime64[m]")
+
+
+def _strings(records: List[Dict[str, Any]], field: str) -> np.ndarray:
+    return np.array([str(record.get(field) or "") for record in records], dtype=str)
+
+
+def _floats(records: List[Dict[str, Any]], field: str, source: str) -> np.ndarray:
+    values = [np.nan if record.get(field) is None else record.get(field) for record in records]
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    for index, value in enumerate(values):
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            raise PracticeDataError(f"{source}[{index}].{field} must be a number, got {value!r}") from None
+    raise PracticeDataError(f"{source}[].{field} must be a number")
+
+
+def _record_list(practice_data: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+    records = practice_data.get(key) or []
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise PracticeDataError(f"{key} must be a list of objects")
+    return records
+
+
+def _reported_totals(practice_data: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """The client's own totals for a period; the ones compared across periods must be numbers"""
+    totals = practice_data.get(key) or {}
+    if not isinstance(totals, dict):
+        raise PracticeDataError(f"{key} must be an object")
+    for metric in COMPARISONS.values():
+        value = totals.get(metric)
+        try:
+            float(value or 0)
+        except (TypeError, ValueError):
+            raise PracticeDataError(f"{key}.{metric} must be a number, got {value!r}") from None
+    return dict(totals)
+
+
+class _Records:
+    """Column arrays of the raw record lists"""
+
+    def __init__(self, practice_data: Dict[str, Any]):
+        appointments = _record_list(practice_data, "appointments")
+        visits = _record_list(practice_data, "visits")
+        revenue = _record_list(practice_data, "revenue")
+
+        self.appointment_time = _times(appointments, "start")
+        self.status = np.char.lower(_strings(appointments, "status"))
+        self.patient = _strings(appointments, "patient_id")
+        self.provider = _strings(appointments, "provider")
+        self.service = _strings(appointments, "service")
+        self.new_patient = np.array([bool(record.get("new_patient")) for record in appointments], dtype=bool)
+
+        self.visit_time = _times(visits, "checked_in")
+        self.visit_provider = _strings(visits, "provider")
+        self.wait = _floats(visits, "wait_minutes", "visits")
+        self.satisfaction = _floats(visits, "satisfaction", "visits")
+
+        self.revenue_time = _times(revenue, "date")
+        self.amount = np.nan_to_num(_floats(revenue, "amount", "revenue"))
+        self.revenue_service = _strings(revenue, "service")
+
+        self.empty = not (appointments or visits or revenue)
+
+    def latest(self) -> Optional[np.datetime64]:
+        times = np.concatenate([self.appointment_time, self.visit_time, self.revenue_time])
+        times = times[~np.isnat(times)]
+        return times.max() if times.size else None
+
+
+def _day(value: Any, field: str) -> np.datetime64:
+    try:
+        return np.datetime64(str(value)[:10], "D").astype("datetime64[m]")
+    except ValueError:
+        raise PracticeDataError(f"{field} must be a date (YYYY-MM-DD), got {value!r}") from None
+
+
+def _period_spec(spec: Any, name: str) -> Dict[str, Any]:
+    if not isinstance(spec, dict):
+        raise PracticeDataError(f"{name} must be an object")
+    return spec
+
+
+def _periods(practice_data: Dict[str, Any], records: _Records) -> Tuple[Tuple[np.datetime64, np.datetime64], ...]:
+    """[start, end) of the current and previous period"""
+    spec = _period_spec(practice_data.get("periods") or {}, "periods")
+    one_day = np.timedelta64(1, "D")
+    current = _period_spec(spec.get("current") or {}, "periods.current")
+    if current.get("start") and current.get("end"):
+        start = _day(current["start"], "periods.current.start")
+        end = _day(current["end"], "periods.current.end") + one_day
+    else:
+        latest = records.latest()
+        end = (latest.astype("datetime64[D]") + one_day).astype("datetime64[m]")
+        start = end - np.timedelta64(DEFAULT_PERIOD_DAYS, "D")
+
+    previous = _period_spec(spec.get("previous") or {}, "periods.previous")
+    if previous.get("start") and previous.get("end"):
+        previous_range = (
+            _day(previous["start"], "periods.previous.start"),
+            _day(previous["end"], "periods.previous.end") + one_day
+        )
+    else:
+        previous_range = (start - (end - start), start)
+    return (start, end), previous_range
+
+
+def _within(times: np.ndarray, period: Tuple[np.datetime64, np.datetime64]) -> np.ndarray:
+    return (times >= period[0]) & (times < period[1])
+
+
+# ----------------------------------------------------------------------
+# Aggregations
+# ----------------------------------------------------------------------
+
+def _period_totals(records: _Records, period: Tuple[np.datetime64, np.datetime64]) -> Dict[str, Any]:
+    booked = _within(records.appointment_time, period)
+    completed = booked & (records.status == "completed")
+    scheduled = int(booked.sum())
+    totals: Dict[str, Any] = {}
+    if records.appointment_time.size:
+        totals.update(
+            total_patients=int(np.unique(records.patient[completed]).size),
+            new_patients=int(np.unique(records.patient[booked & records.new_patient]).size),
+            appointments_scheduled=scheduled,
+            appointments_completed=int(completed.sum()),
+            appointments_cancelled=int((booked & (records.status == "cancelled")).sum()),
+            no_show_rate=round(float((booked & (records.status == "no_show")).sum()) / scheduled * 100, 1) if scheduled else 0.0
+        )
+    if records.revenue_time.size:
+        totals["total_revenue"] = round(float(records.amount[_within(records.revenue_time, period)].sum()), 2)
+    waits = records.wait[_within(records.visit_time, period)]
+    waits = waits[~np.isnan(waits)]
+    if waits.size:
+        totals["average_wait_time"] = round(float(waits.mean()), 1)
+    return totals
+
+
+def _grouped(keys: np.ndarray, names: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-name count (or weight sum) of keys; names must be sorted and contain every key"""
+    return np.bincount(np.searchsorted(names, keys), weights=weights, minlength=names.size)
+
+
+def _top_services(records: _Records, period: Tuple[np.datetime64, np.datetime64]) -> List[Dict[str, Any]]:
+    completed = _within(records.appointment_time, period) & (records.status == "completed")
+    billed = _within(records.revenue_time, period)
+    services = records.service[completed]
+    revenue_services = records.revenue_service[billed]
+    names = np.unique(np.concatenate([services, revenue_services]))
+    names = names[names != ""]
+    if not names.size:
+        return []
+    services = services[np.isin(services, names)]
+    amounts = records.amount[billed][np.isin(revenue_services, names)]
+    revenue_services = revenue_services[np.isin(revenue_services, names)]
+    counts = _grouped(services, names)
+    revenue = _grouped(revenue_services, names, amounts)
+    order = np.lexsort((-counts, -revenue))[:TOP_SERVICES]
+    return [
+        {"name": str(names[i]), "count": int(counts[i]), "revenue": round(float(revenue[i]), 2)}
+        for i in order
+    ]
+
+
+def _clock(hour: int) -> str:
+    return f"{hour % 12 or 12}:00 {'AM' if hour % 24 < 12 else 'PM'}"
+
+
+def _peak_hours(records: _Records, period: Tuple[np.datetime64, np.datetime64]) -> List[str]:
+    attended = _within(records.appointment_time, period) & (records.status != "cancelled")
+    times = records.appointment_time[attended]
+    if not times.size:
+        return []
+    hours = ((times - times.astype("datetime64[D]")) // np.timedelta64(1, "h")).astype(int)
+    per_hour = np.bincount(hours, minlength=24)
+    # Bookings per window starting at each hour, windows staying within the day
+    windows = np.convolve(per_hour, np.ones(PEAK_WINDOW_HOURS, dtype=int), mode="valid")
+    peaks: List[int] = []
+    for start in np.argsort(-windows, kind="stable"):
+        if len(peaks) == PEAK_WINDOWS or not windows[start]:
+            break
+        if all(abs(int(start) - chosen) >= PEAK_WINDOW_HOURS for chosen in peaks):
+            peaks.append(int(start))
+    return [f"{_clock(start)} - {_clock(start + PEAK_WINDOW_HOURS)}" for start in sorted(peaks)]
+
+
+def _provider_performance(records: _Records, period: Tuple[np.datetime64, np.datetime64]) -> List[Dict[str, Any]]:
+    completed = _within(records.appointment_time, period) & (records.status == "completed")
+    rated = _within(records.visit_time, period) & ~np.isnan(records.satisfaction)
+    providers = records.provider[completed]
+    rated_providers = records.visit_provider[rated]
+    names = np.unique(np.concatenate([providers, rated_providers]))
+    names = names[names != ""]
+    if not names.size:
+        return []
+    appointments = _grouped(providers[providers != ""], names)
+    keep = rated_providers != ""
+    ratings = _grouped(rated_providers[keep], names)
+    rating_sums = _grouped(rated_providers[keep], names, records.satisfaction[rated][keep])
+    order = np.argsort(-appointments, kind="stable")
+    return [
+        {
+            "name": str(names[i]),
+            "appointments": int(appointments[i]),
+            "satisfaction": round(float(rating_sums[i] / ratings[i]), 1) if ratings[i] else None
+        }
+        for i in order
+    ]
+
+
+def _percent_changes(current: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, float]:
+    keys = [key for key, metric in COMPARISONS.items() if metric in current and metric in previous]
+    if not keys:
+        return {}
+    now = np.array([float(current[COMPARISONS[key]] or 0) for key in keys])
+    before = np.array([float(previous[COMPARISONS[key]] or 0) for key in keys])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = np.where(before != 0, (now - before) / np.abs(before) * 100, 0.0)
+    return {key: round(float(change), 1) for key, change in zip(keys, changes)}
+
+
+def compute_practice_metrics(practice_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Practice data with every derivable number computed locally.
+
+    Returns:
+        practice_data without the raw records, with current_period, previous_period,
+        period_comparison and (when records were sent) top_services, peak_hours
+        and provider_performance
+
+    Raises:
+        PracticeDataError: If a record list, period or total cannot be read
+    """
+    if not isinstance(practice_data, dict):
+        raise PracticeDataError("practice_data must be an object")
+    metrics = {key: value for key, value in practice_data.items() if key not in RECORD_KEYS}
+    current = _reported_totals(practice_data, "current_period")
+    previous = _reported_totals(practice_data, "previous_period")
+
+    records = _Records(practice_data)
+    if not records.empty and records.latest() is not None:
+        current_period, previous_period = _periods(practice_data, records)
+        current.update(_period_totals(records, current_period))
+        previous.update(_period_totals(records, previous_period))
+        metrics["top_services"] = _top_services(records, current_period)
+        metrics["peak_hours"] = _peak_hours(records, current_period)
+        metrics["provider_performance"] = _provider_performance(records, current_period)
+
+    metrics["current_period"] = current
+    metrics["previous_period"] = previous
+    metrics["period_comparison"] = _percent_changes(current, previous)
+    return metrics
+
+
+# ----------------------------------------------------------------------
+# Presentation
+# ----------------------------------------------------------------------
+
+def _number(value: float) -> str:
+    return f"{round(float(value), 1):g}"
+
+
+def _format(kind: str, value: float, delta: float, change: float) -> str:
+    if kind == "pct_change":
+        return f"{change:+.1f}%"
+    if kind == "money_delta":
+        return f"{'-' if delta < 0 else '+'}${abs(delta) / 1000:.1f}K"
+    if kind == "delta":
+        return f"{delta:+g}"
+    if kind == "minutes":
+        return f"{_number(value)}min"
+    if kind == "percent":
+        return f"{_number(value)}%"
+    return _number(value)
+
+
+def build_insight_tiles(metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The dashboard's insight tiles, straight from compute_practice_metrics() output"""
+    current = metrics.get("current_period", {})
+    previous = metrics.get("previous_period", {})
+    comparison = metrics.get("period_comparison", {})
+    changes = {metric: key for key, metric in COMPARISONS.items()}
+
+    tiles = []
+    for tile in TILES:
+        value = float(current.get(tile.metric, 0) or 0)
+        delta = value - float(previous.get(tile.metric, value) or 0)
+        change = float(comparison.get(changes[tile.metric], 0) or 0)
+        trend = "up" if delta > 0 else "down" if delta < 0 else "stable"
+        improved = delta > 0 if tile.higher_is_better else delta < 0
+        tiles.append({
+            "type": "positive" if improved or trend == "stable" else tile.decline_type,
+            "title": tile.title,
+            "value": _format(tile.value, value, delta, change),
+            "change": _format(tile.change, value, delta, change),
+            "trend": trend
+        })
+    return tiles
+
+
+def summarize_metrics(metrics: Dict[str, Any], include_outlook: bool = False) -> str:
+    """Plain summary used when the model is unavailable"""
+    current = metrics.get("current_period", {})
+    comparison = metrics.get("period_comparison", {})
+    revenue_change = comparison.get("revenue_change", 0)
+    patients_change = comparison.get("total_patients_change", 0)
+    wait_change = comparison.get("wait_time_change", 0)
+
+    summary = (
+        f"Revenue is {'up' if revenue_change >= 0 else 'down'} {abs(revenue_change):.1f}% and patient volume "
+        f"{'grew' if patients_change >= 0 else 'fell'} {abs(patients_change):.1f}% to {current.get('total_patients', 0)} patients. "
+        f"Patient engagement is at {_number(current.get('patient_engagement', 0))}%, and wait times have "
+        f"{'improved' if wait_change <= 0 else 'worsened'} by {abs(wait_change):.1f}%. "
+        f"Provider utilization is at {_number(current.get('provider_utilization', 0))}% with "
+        f"{current.get('appointments_completed', 0)} completed appointments and a "
+        f"{_number(current.get('no_show_rate', 0))}% no-show rate."
+    )
+    if include_outlook:
+        summary += " Continue focusing on patient engagement and operational efficiency for sustained growth."
+    return summary
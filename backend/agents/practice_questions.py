@@ -0,0 +1,269 @@
+"""
+Practice Question Router
+Answers common metric questions about practice data locally
+
+Lookups such as "what was our no-show rate", "how did revenue change" or
+"top 3 services" are matched against the practice metrics schema (see
+practice_metrics) and answered from templates without a model call.
+A question is only answered locally when every word in it is accounted for:
+exactly one metric (or one ranking) plus intent words such as "what was our"
+or "compared with the previous period". A second metric, a negation, a named
+service or provider, or any period other than the current or previous one
+leaves words over, and the question goes to the agent, as does anything
+open-ended ("why", "how can we", "recommend").
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern
+import re
+
+from backend.agents.practice_metrics import TOP_SERVICES
+
+_OPEN_ENDED = re.compile(
+    r"\b(why|how (can|could|should|do|does|might|would|to)|should|recommend\w*|suggest\w*|strateg\w*|"
+    r"explain\w*|advice|advise|what if|predict\w*|forecast\w*|plan|ideas?)\b"
+)
+_CHANGE = re.compile(
+    r"\b(change[sd]?|grow|grew|growth|increase[sd]?|decrease[sd]?|trend\w*|compare[sd]?|comparison|vs\.?|versus|"
+    r"improve[sd]?|drop(ped)?|decline[sd]?|went (up|down)|go(ne)? (up|down)|up or down|difference)\b"
+)
+_CURRENT = re.compile(r"\b((current|this) period|currently|current|(right )?now)\b")
+_PREVIOUS = re.compile(r"\b(last|previous|prior) period\b")
+_RANKING = re.compile(r"\b(top|best|most|highest|lowest|least|worst|busiest|leading|rank\w*|which|popular|biggest)\b")
+_LOWEST = re.compile(r"\b(lowest|least|worst|bottom)\b")
+_TOP_N = re.compile(r"\b(?:top|best|first) (\d+|two|three|four|five)\b")
+_SERVICES = re.compile(r"\b(services?|procedures?|visit types?)\b")
+_PROVIDERS = re.compile(r"\b(providers?|doctors?|physicians?|clinicians?|dr)\b")
+_PLURAL = re.compile(r"\b(services|procedures|providers|doctors|physicians|clinicians)\b")
+_PEAK_HOURS = re.compile(r"\b(peak (hours?|times?)|busiest (hours?|times?|part of the day))\b")
+_BY_REVENUE = re.compile(r"\b(revenue|income|earn\w*|money)\b")
+_BY_COUNT = re.compile(r"\b(popular|common|count|volume|booked|performed|appointments|visits)\b")
+_BY_SATISFACTION = re.compile(r"\b(satisf\w*|rating|rated|reviews?)\b")
+
+_NUMBER_WORDS = {"two": 2, "three": 3, "four": 4, "five": 5}
+
+# Words that carry no meaning of their own once the metric and period are known.
+# Anything else left in a question (a name, a date, "not", "per", "percent") needs the agent
+_INTENT_WORDS = frozenset(
+    "what what's s is was were are be been has have had did do does how many much our my we us the a an of "
+    "for in on at to from with by and or it its there me tell show give get see total overall number count "
+    "amount figure than since".split()
+)
+_RANKING_WORDS = frozenset("one ones performing performer performers generated generates made makes brought brings".split())
+
+
+class _Metric(NamedTuple):
+    pattern: Pattern
+    key: str
+    label: str
+    unit: str  # money | percent | minutes | count
+
+
+# Most specific first: "new patients" before "patients", "no-shows" before "appointments"
+_METRICS = (
+    _Metric(re.compile(r"\bnew patients?\b"), "new_patients", "The new-patient count", "count"),
+    _Metric(re.compile(r"\bno[- ]?shows?( appointments?| rate)?\b"), "no_show_rate", "The no-show rate", "percent"),
+    _Metric(re.compile(r"\b((average|avg|mean) )?wait(ing)?( times?)?\b"), "average_wait_time", "The average wait time", "minutes"),
+    _Metric(re.compile(r"\b(provider )?utili[sz]ation( rate)?\b"), "provider_utilization", "Provider utilization", "percent"),
+    _Metric(re.compile(r"\b(patient )?engage\w*( rate| score)?\b"), "patient_engagement", "Patient engagement", "percent"),
+    _Metric(re.compile(r"\b(revenue|income|earnings|sales|collections)\b"), "total_revenue", "Revenue", "money"),
+    _Metric(
+        re.compile(r"\b((appointments?|visits?) (were |got )?)?cancel\w*( appointments?| visits?)?\b"),
+        "appointments_cancelled", "The cancelled-appointment count", "count"
+    ),
+    _Metric(
+        re.compile(r"\b((appointments?|visits?) (were |got )?)?completed( appointments?| visits?)?\b"),
+        "appointments_completed", "The completed-appointment count", "count"
+    ),
+    _Metric(re.compile(r"\b(appointments?|bookings?|scheduled)\b"), "appointments_scheduled", "The scheduled-appointment count", "count"),
+    _Metric(re.compile(r"\bpatients?\b"), "total_patients", "The patient count", "count"),
+)
+
+# metric -> period_comparison key
+_CHANGE_KEYS = {
+    "total_patients": "total_patients_change",
+    "new_patients": "new_patients_change",
+    "total_revenue": "revenue_change",
+    "patient_engagement": "engagement_change",
+    "average_wait_time": "wait_time_change",
+    "provider_utilization": "utilization_change",
+    "no_show_rate": "no_show_change",
+    "appointments_scheduled": "appointments_scheduled_change",
+    "appointments_completed": "appointments_completed_change",
+    "appointments_cancelled": "appointments_cancelled_change",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, single-spaced, without trailing punctuation"""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def _accounted(text: str, patterns: List[Pattern], extra_words: frozenset = frozenset()) -> bool:
+    """True when nothing but intent words is left once the matched terms are taken out"""
+    for pattern in patterns:
+        text = pattern.sub(" ", text)
+    return all(word in _INTENT_WORDS or word in extra_words for word in re.findall(r"[a-z0-9']+", text))
+
+
+def _format(value: Any, unit: str) -> str:
+    value = float(value)
+    if unit == "money":
+        return f"${value:,.0f}"
+    if unit == "percent":
+        return f"{value:g}%"
+    if unit == "minutes":
+        return f"{value:g} minutes"
+    return f"{value:,.0f}"
+
+
+def _listing(items: List[str]) -> str:
+    if len(items) <= 2:
+        return " and ".join(items)
+    return ", ".join(items[:-1]) + f", and {items[-1]}"
+
+
+class PracticeQuestionRouter:
+    """
+    Usage:
+        answer = practice_question_router.answer(question, compute_practice_metrics(practice_data))
+        if answer is None:
+            ...  # ask the agent
+    """
+
+    def __init__(self):
+        self.local_answers = 0
+        self.agent_questions = 0
+
+    def answer(self, question: str, metrics: Dict[str, Any]) -> Optional[str]:
+        """Templated answer from metrics, or None when the question needs the agent"""
+        text = normalize_question(question)
+        answer = None if _OPEN_ENDED.search(text) else self._route(text, metrics)
+        if answer is None:
+            self.agent_questions += 1
+        else:
+            self.local_answers += 1
+        return answer
+
+    def _route(self, text: str, metrics: Dict[str, Any]) -> Optional[str]:
+        if _PEAK_HOURS.search(text):
+            if not _accounted(text, [_PEAK_HOURS, _CURRENT], frozenset({"when"})):
+                return None
+            return self._peak_hours(metrics)
+        if _RANKING.search(text) and _SERVICES.search(text):
+            return self._services(text, metrics)
+        if _RANKING.search(text) and _PROVIDERS.search(text):
+            return self._providers(text, metrics)
+
+        found = []
+        for metric in _METRICS:
+            if metric.pattern.search(text):
+                found.append(metric)
+                text = metric.pattern.sub(" ", text)
+        if len(found) != 1 or not _accounted(text, [_CHANGE, _PREVIOUS, _CURRENT]):
+            return None  # No metric, a second one, or words such as "not", a name or a date left over
+        metric = found[0]
+        current = metrics.get("current_period", {}).get(metric.key)
+        previous = metrics.get("previous_period", {}).get(metric.key)
+        change = metrics.get("period_comparison", {}).get(_CHANGE_KEYS[metric.key])
+
+        if _CHANGE.search(text):
+            if current is None or previous is None or change is None:
+                return None
+            direction = "went up" if change > 0 else "went down" if change < 0 else "was unchanged"
+            amount = f" {abs(change):.1f}%" if change else ""
+            return (
+                f"{metric.label} {direction}{amount} compared with the previous period, "
+                f"from {_format(previous, metric.unit)} to {_format(current, metric.unit)}."
+            )
+        if _PREVIOUS.search(text):
+            if previous is None:
+                return None
+            return f"{metric.label} in the previous period was {_format(previous, metric.unit)}."
+        if current is None:
+            return None
+        answer = f"{metric.label} for the current period is {_format(current, metric.unit)}."
+        if previous is not None and change:
+            answer += f" That is {'up' if change > 0 else 'down'} {abs(change):.1f}% from {_format(previous, metric.unit)} in the previous period."
+        return answer
+
+    @staticmethod
+    def _top_n(text: str, default: int) -> int:
+        match = _TOP_N.search(text)
+        if match is None:
+            return default
+        value = match.group(1)
+        return int(value) if value.isdigit() else _NUMBER_WORDS[value]
+
+    def _services(self, text: str, metrics: Dict[str, Any]) -> Optional[str]:
+        if not _accounted(text, [_TOP_N, _RANKING, _SERVICES, _BY_REVENUE, _BY_COUNT, _CURRENT], _RANKING_WORDS):
+            return None
+        services = [service for service in metrics.get("top_services") or [] if service.get("name")]
+        if not services:
+            return None
+        by_count = bool(_BY_COUNT.search(text)) and not _BY_REVENUE.search(text)
+        field = "count" if by_count else "revenue"
+        if any(service.get(field) is None for service in services):
+            return None
+        lowest = bool(_LOWEST.search(text))
+        limit = self._top_n(text, 3 if _PLURAL.search(text) else 1)
+        # top_services holds only the TOP_SERVICES highest earners: the rest of the
+        # practice's services could rank below them or above them by visits
+        if len(services) >= TOP_SERVICES and (lowest or by_count or limit > len(services)):
+            return None
+        ranked = sorted(services, key=lambda service: service[field], reverse=not lowest)[:limit]
+        details = [
+            f"{service['name']} ({service['count']} visits)" if by_count
+            else f"{service['name']} ({_format(service['revenue'], 'money')})"
+            for service in ranked
+        ]
+        if lowest:
+            measure = "the fewest visits" if by_count else "the least revenue"
+            if len(details) == 1:
+                return f"The service with {measure} is {details[0]}."
+            return f"The {len(details)} services with {measure} are {_listing(details)}."
+        measure = "visits" if by_count else "revenue"
+        if len(details) == 1:
+            return f"The top service by {measure} is {details[0]}."
+        return f"The top {len(details)} services by {measure} are {_listing(details)}."
+
+    def _providers(self, text: str, metrics: Dict[str, Any]) -> Optional[str]:
+        if not _accounted(text, [_TOP_N, _RANKING, _PROVIDERS, _BY_COUNT, _BY_SATISFACTION, _CURRENT], _RANKING_WORDS):
+            return None  # Includes revenue: provider_performance has no per-provider revenue
+        providers = [provider for provider in metrics.get("provider_performance") or [] if provider.get("name")]
+        by_satisfaction = bool(_BY_SATISFACTION.search(text))
+        field = "satisfaction" if by_satisfaction else "appointments"
+        providers = [provider for provider in providers if provider.get(field) is not None]
+        if not providers:
+            return None
+        ranked = sorted(providers, key=lambda provider: provider[field], reverse=not _LOWEST.search(text))
+        ranked = ranked[:self._top_n(text, 3 if _PLURAL.search(text) else 1)]
+        details = [
+            f"{provider['name']} ({provider['satisfaction']:g} satisfaction)" if by_satisfaction
+            else f"{provider['name']} ({provider['appointments']} appointments)"
+            for provider in ranked
+        ]
+        if by_satisfaction:
+            measure = "lowest-rated" if _LOWEST.search(text) else "highest-rated"
+        else:
+            measure = "least busy" if _LOWEST.search(text) else "busiest"
+        if len(details) == 1:
+            return f"The {measure} provider is {details[0]}."
+        return f"The {measure} providers are {_listing(details)}."
+
+    @staticmethod
+    def _peak_hours(metrics: Dict[str, Any]) -> Optional[str]:
+        peaks = [str(window) for window in metrics.get("peak_hours") or []]
+        if not peaks:
+            return None
+        return f"Peak hours are {_listing(peaks)}."
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.local_answers + self.agent_questions
+        return {
+            "local_answers": self.local_answers,
+            "agent_questions": self.agent_questions,
+            "local_rate": round(self.local_answers / total, 4) if total else 0.0
+        }
+
+
+# Global instance
+practice_question_router = PracticeQuestionRouter()
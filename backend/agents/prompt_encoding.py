@@ -0,0 +1,138 @@
+"""
+Prompt Encoding
+Compact, token-efficient rendering of structured data for agent prompts
+
+Pretty-printed JSON spends most of its tokens on indentation, quotes and
+keys repeated in every list element. encode_for_prompt() renders the same
+data as indented "key: value" lines with unquoted keys and scalars, drops
+null and empty fields, and turns homogeneous lists of objects into a table
+with the keys stated once:
+
+    current_period:
+      total_patients: 248
+      total_revenue: 89420
+    top_services[2]{name,count,revenue}:
+      Annual Checkup,45,22500
+      Lab Tests,62,18600
+    peak_hours[2]: 9:00 AM - 11:00 AM | 2:00 PM - 4:00 PM
+
+Strings are JSON-quoted only where they would otherwise be ambiguous.
+"""
+from typing import Any, Callable, Dict, List
+import json
+import re
+
+# Unquoted strings must not look like another type or contain a separator
+_NEEDS_QUOTES = re.compile(r'^\s|\s$|[,|\n"{}\[\]]|^(true|false|null|-?\d+(\.\d+)?([eE][+-]?\d+)?)$|^$')
+_KEY_NEEDS_QUOTES = re.compile(r'^\s|\s$|[:,\n"{}\[\]]|^$')
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|\n[ \t]*| {2,}|[^\sA-Za-z\d]")
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, (str, list, tuple, dict)) and not value)
+
+
+def prune(value: Any) -> Any:
+    """value without null or empty fields (0 and false are kept)"""
+    if isinstance(value, dict):
+        pruned = {key: prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if not _is_empty(item)}
+    if isinstance(value, (list, tuple)):
+        return [item for item in (prune(item) for item in value) if not _is_empty(item)]
+    return value
+
+
+def minify_json(value: Any) -> str:
+    """Pruned JSON without whitespace"""
+    return json.dumps(prune(value), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)  # Lossless: never rounded
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+    text = str(value)
+    if _NEEDS_QUOTES.search(text):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+def _key(key: Any) -> str:
+    key = str(key)
+    return json.dumps(key, ensure_ascii=False) if _KEY_NEEDS_QUOTES.search(key) else key
+
+
+def _table_columns(items: List[Any]) -> List[str]:
+    """Column names when items are objects with scalar values sharing most keys, else []"""
+    if len(items) < 2 or not all(isinstance(item, dict) and item for item in items):
+        return []
+    columns: List[str] = []
+    for item in items:
+        for key, value in item.items():
+            if isinstance(value, (dict, list, tuple)):
+                return []
+            if key not in columns:
+                columns.append(key)
+    # Sparse rows would be mostly empty cells; keep them as nested objects
+    filled = sum(len(item) for item in items)
+    return columns if filled * 2 >= len(columns) * len(items) else []
+
+
+def _lines(key: str, value: Any, indent: str, out: List[str]):
+    if isinstance(value, dict):
+        out.append(f"{indent}{key}:")
+        for child_key, child in value.items():
+            _lines(_key(child_key), child, indent + "  ", out)
+        return
+    if isinstance(value, (list, tuple)):
+        columns = _table_columns(list(value))
+        if columns:
+            out.append(f"{indent}{key}[{len(value)}]{{{','.join(_key(column) for column in columns)}}}:")
+            for item in value:
+                out.append(indent + "  " + ",".join(
+                    _scalar(item[column]) if column in item else "" for column in columns
+                ))
+        elif all(not isinstance(item, (dict, list, tuple)) for item in value):
+            out.append(f"{indent}{key}[{len(value)}]: " + " | ".join(_scalar(item) for item in value))
+        else:
+            out.append(f"{indent}{key}[{len(value)}]:")
+            for index, item in enumerate(value):
+                _lines(str(index), item, indent + "  ", out)
+        return
+    out.append(f"{indent}{key}: {_scalar(value)}")
+
+
+def encode_for_prompt(value: Any) -> str:
+    """Compact text rendering of value for a prompt (see module docstring)"""
+    value = prune(value)
+    if not isinstance(value, dict):
+        return minify_json(value)
+    out: List[str] = []
+    for key, item in value.items():
+        _lines(_key(key), item, "", out)
+    return "\n".join(out)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough BPE token count without a tokenizer: one per word, per group of up
+    to three digits, per punctuation character and per line break with its
+    indentation. Good for comparing encodings of the same data, not for billing.
+    """
+    return len(_TOKEN_PIECES.findall(text))
+
+
+# Encodings compared by backend.benchmarks.prompt_encoding
+ENCODINGS: Dict[str, Callable[[Any], str]] = {
+    "json-indent": lambda value: json.dumps(value, indent=2, default=str),
+    "json": lambda value: json.dumps(value, default=str),
+    "json-minified": minify_json,
+    "compact": encode_for_prompt,
+}
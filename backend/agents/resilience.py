@@ -0,0 +1,304 @@
+"""
+Resilience
+Deadlines, circuit breakers and hedged requests around agent calls
+
+Every agent stream gets an overall deadline (settings.stream_timeout) so a
+hung SDK session cannot hold its request forever. Each model has a circuit
+breaker that opens after consecutive failures, where a timeout or a first
+message slower than slow_call_seconds counts as a failure; cancelled calls and
+calls that never reached the model (LocalCapacityError) count as nothing.
+While it is open calls fail fast. After open_seconds a single probe call is let through.
+
+Latency-critical calls (condition evaluations) can be hedged: when the first
+attempt has not finished after the p95 latency of earlier calls, a duplicate
+is started and whichever finishes first wins; the other is cancelled.
+"""
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import asyncio
+import logging
+import time
+
+from backend.config.settings import settings
+from backend.agents.llm_scheduler import llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while its circuit breaker is open"""
+
+
+class CallDeadlineError(asyncio.TimeoutError):
+    """Raised when an agent call exceeds its deadline"""
+
+
+class LocalCapacityError(Exception):
+    """Base for errors raised before a call reaches the model because local capacity ran out"""
+
+
+class LatencyTracker:
+    """Latencies of the most recent calls, for percentile estimates"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one model"""
+
+    def __init__(self, name: str, failure_threshold: int, slow_call_seconds: float, open_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+        self.slow_calls = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {self.name}; retrying after {self.open_seconds:g}s")
+
+    def record(self, success: bool, first_message_latency: Optional[float] = None):
+        if success and first_message_latency is not None and first_message_latency > self.slow_call_seconds:
+            self.slow_calls += 1
+            success = False
+        if success:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+            return
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._trip()
+
+    def release(self):
+        """A call ended without an outcome (cancelled, or out of local capacity): count nothing, let another probe through"""
+        self._probing = False
+
+    def _trip(self):
+        if self.state != OPEN:
+            self.trips += 1
+            logger.warning(f"Circuit breaker for {self.name} opened after {self.consecutive_failures} failed or slow calls")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "slow_calls": self.slow_calls
+        }
+
+
+class AgentResilience:
+    """
+    Shared wrapper for agent calls.
+
+    Usage:
+        async for message in agent_resilience.stream(model, lambda: sdk_stream(...)):
+            ...
+        result = await agent_resilience.call("condition:" + model, lambda: collect(...), hedge=True)
+    """
+
+    def __init__(
+        self,
+        deadline: float,
+        failure_threshold: int,
+        slow_call_seconds: float,
+        open_seconds: float,
+        hedge_enabled: bool,
+        hedge_percentile: float,
+        hedge_min_samples: int,
+        hedge_min_delay: float
+    ):
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+        self.deadline_exceeded = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model, self.failure_threshold, self.slow_call_seconds, self.open_seconds)
+            self._breakers[model] = breaker
+        return breaker
+
+    # ------------------------------------------------------------------
+    # Streams
+    # ------------------------------------------------------------------
+
+    async def stream(
+        self,
+        model: str,
+        open_stream: Callable[[], AsyncIterator[T]],
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[T]:
+        """
+        Yield from open_stream() under the model's breaker and an overall deadline.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            CallDeadlineError: If the stream has not finished within deadline seconds
+        """
+        breaker = self.breaker(model)
+        breaker.before_call()
+        deadline = deadline or self.deadline
+        started = time.monotonic()
+        first_message: Optional[float] = None
+        success = False
+        no_outcome = False
+        messages = open_stream()
+        try:
+            while True:
+                remaining = deadline - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    message = await asyncio.wait_for(messages.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                if first_message is None:
+                    first_message = time.monotonic() - started
+                yield message
+            success = True
+        except GeneratorExit:
+            success = True  # The caller stopped reading; the model answered
+            raise
+        except asyncio.CancelledError:
+            # Hedge loser, disconnected client or closed socket: says nothing about the model
+            no_outcome = True
+            raise
+        except LocalCapacityError:
+            # E.g. no pooled client free: the model was never asked
+            no_outcome = True
+            raise
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise CallDeadlineError(f"Agent call to {model} exceeded its {deadline:g}s deadline")
+        finally:
+            if no_outcome:
+                breaker.release()
+            else:
+                breaker.record(success, first_message)
+            await messages.aclose()
+
+    # ------------------------------------------------------------------
+    # Hedged calls
+    # ------------------------------------------------------------------
+
+    async def call(self, name: str, attempt: Callable[[], Awaitable[T]], hedge: bool = False) -> T:
+        """
+        Run attempt(), starting one duplicate if it is slower than the p95 of earlier calls named name.
+
+        attempt must be safe to run twice concurrently (each call builds its own request).
+        """
+        latency = self._latency.setdefault(name, LatencyTracker())
+        started = time.monotonic()
+        delay = self._hedge_delay(latency) if hedge else None
+        if delay is None:
+            result = await attempt()
+            latency.record(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(attempt())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and llm_scheduler.pending < llm_scheduler.max_concurrency:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(attempt()))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                task = next(iter(done))
+                tasks.discard(task)
+                if task.exception() is None or not tasks:
+                    if task is not primary:
+                        self.hedge_wins += 1
+                    result = task.result()
+                    latency.record(time.monotonic() - started)
+                    return result
+                # One attempt failed: wait for the other
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _hedge_delay(self, latency: LatencyTracker) -> Optional[float]:
+        if not self.hedge_enabled or len(latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, latency.percentile(self.hedge_percentile))
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "deadline_seconds": self.deadline,
+            "deadline_exceeded": self.deadline_exceeded,
+            "breakers": {model: breaker.get_stats() for model, breaker in self._breakers.items()},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": {
+                name: round(delay * 1000, 1)
+                for name, tracker in self._latency.items()
+                if (delay := self._hedge_delay(tracker)) is not None
+            }
+        }
+
+
+# Global instance
+agent_resilience = AgentResilience(
+    deadline=settings.stream_timeout,
+    failure_threshold=settings.circuit_breaker_failure_threshold,
+    slow_call_seconds=settings.circuit_breaker_slow_call_seconds,
+    open_seconds=settings.circuit_breaker_open_seconds,
+    hedge_enabled=settings.hedge_condition_evaluations,
+    hedge_percentile=settings.hedge_percentile,
+    hedge_min_samples=settings.hedge_min_samples,
+    hedge_min_delay=settings.hedge_min_delay
+)
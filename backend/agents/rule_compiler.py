@@ -0,0 +1,418 @@
+"""
+Rule Compiler
+Deterministic fast-path for structurally trivial condition and loop rules
+
+Recognizes simple natural-language rules ("@@block_1 status is completed",
+"iteration count >= 3") and an explicit rule language, and compiles them once
+into cached Python predicates over workflow_context and referenced block
+outputs. Anything the compiler does not understand returns None so the caller
+falls through to the LLM agent.
+
+Explicit form:
+    rule: @@order_1.status == "payment_complete" and iteration < 3
+
+Operands:  @@block_id.field.path, context.field.path, iteration,
+           numbers, "strings", true/false/null
+Operators: == != > >= < <= contains, exists, and or not, parentheses
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import ast
+import re
+
+from backend.agents.block_references import get_block_output, get_path
+from backend.models.healthcare_objects import (
+    CalendarEventStatus,
+    DocumentFormStatus,
+    EncounterNoteStatus,
+    InternalNoteStatus,
+    OrderStatus,
+    PatientProfileStatus,
+    ReportStatus,
+    TaskStatus,
+)
+from backend.models.workflow_context import ExecutionStatus
+
+RULE_PREFIX = "rule:"
+
+_UNRESOLVED = object()
+
+
+class RuleCompileError(ValueError):
+    """Raised when a rule cannot be compiled"""
+
+
+class UnresolvedReference(LookupError):
+    """Raised at evaluation time when a referenced value is not available"""
+
+
+Predicate = Callable[[Dict[str, Any], int], Any]
+
+# Values a natural-language rule may compare against a block's status without naming the field
+_STATUS_WORDS = frozenset(
+    member.value
+    for statuses in (
+        ExecutionStatus, PatientProfileStatus, OrderStatus, ReportStatus, EncounterNoteStatus,
+        DocumentFormStatus, CalendarEventStatus, TaskStatus, InternalNoteStatus
+    )
+    for member in statuses
+)
+
+_TRUE_WORDS = frozenset({"true", "yes"})
+_FALSE_WORDS = frozenset({"false", "no"})
+
+
+class CompiledRule:
+    """A rule compiled to a predicate over (workflow_context, iteration)"""
+
+    __slots__ = ("source", "expression", "_predicate")
+
+    def __init__(self, source: str, expression: str, predicate: Predicate):
+        self.source = source
+        self.expression = expression
+        self._predicate = predicate
+
+    def evaluate(self, workflow_context: Dict[str, Any], iteration: int = 0) -> bool:
+        """
+        Evaluate the rule.
+
+        Raises:
+            UnresolvedReference: If a referenced block output or field is missing
+        """
+        return bool(self._predicate(workflow_context, iteration))
+
+    def __repr__(self) -> str:
+        return f"CompiledRule({self.expression!r})"
+
+
+# ----------------------------------------------------------------------
+# Tokenizer
+# ----------------------------------------------------------------------
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<ref>@@[A-Za-z0-9\-_]+(?:\.[A-Za-z0-9_\-]+)*)
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op>==|!=|>=|<=|>|<|\(|\))
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z0-9_\-]+)*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"and", "or", "not", "contains", "exists", "true", "false", "null"}
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN_PATTERN.match(text, pos)
+        if not match or match.end() == pos:
+            raise RuleCompileError(f"Unexpected input at {text[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.lower() in _KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+# ----------------------------------------------------------------------
+# Parser (recursive descent, produces closures)
+# ----------------------------------------------------------------------
+
+def _resolve_ref(ref: str) -> Predicate:
+    block_id, *path = ref[2:].split(".")
+
+    def resolve(ctx: Dict[str, Any], iteration: int) -> Any:
+        output = get_block_output(ctx, block_id)
+        if output is None:
+            raise UnresolvedReference(f"No output for @@{block_id}")
+        value = get_path(output, path, default=_UNRESOLVED) if path else output
+        if value is _UNRESOLVED:
+            raise UnresolvedReference(f"@@{block_id} has no field {'.'.join(path)}")
+        return value
+    return resolve
+
+
+def _resolve_name(name: str) -> Predicate:
+    head, *path = name.split(".")
+    if head == "iteration" and not path:
+        return lambda ctx, iteration: iteration
+    if head != "context":
+        raise RuleCompileError(f"Unknown identifier {name!r}")
+
+    def resolve(ctx: Dict[str, Any], iteration: int) -> Any:
+        value = get_path(ctx, path, default=_UNRESOLVED)
+        if value is _UNRESOLVED:
+            raise UnresolvedReference(f"Context has no field {'.'.join(path)}")
+        return value
+    return resolve
+
+
+def _as_bool(value: str) -> Any:
+    lowered = value.strip().lower()
+    if lowered in _TRUE_WORDS:
+        return True
+    if lowered in _FALSE_WORDS:
+        return False
+    return value
+
+
+def _coerce_pair(left: Any, right: Any) -> Tuple[Any, Any]:
+    """Compare numbers numerically, yes/no/true/false strings as booleans and strings case-insensitively"""
+    if isinstance(left, bool) and isinstance(right, str):
+        return left, _as_bool(right)
+    if isinstance(right, bool) and isinstance(left, str):
+        return _as_bool(left), right
+    if isinstance(left, str) and isinstance(right, (int, float)) and not isinstance(right, bool):
+        try:
+            return float(left), right
+        except ValueError:
+            return left, right
+    if isinstance(right, str) and isinstance(left, (int, float)) and not isinstance(left, bool):
+        try:
+            return left, float(right)
+        except ValueError:
+            return left, right
+    if isinstance(left, str) and isinstance(right, str):
+        return left.strip().lower(), right.strip().lower()
+    return left, right
+
+
+def _compare(op: str, left: Predicate, right: Predicate) -> Predicate:
+    def compare(ctx: Dict[str, Any], iteration: int) -> bool:
+        a, b = _coerce_pair(left(ctx, iteration), right(ctx, iteration))
+        if op == "==":
+            return a == b
+        if op == "!=":
+            return a != b
+        if op == "contains":
+            if isinstance(a, str):
+                return str(b).lower() in a.lower()
+            return b in a if isinstance(a, (list, dict)) else False
+        try:
+            if op == ">":
+                return a > b
+            if op == ">=":
+                return a >= b
+            if op == "<":
+                return a < b
+            return a <= b
+        except TypeError:
+            raise UnresolvedReference(f"Cannot compare {a!r} {op} {b!r}")
+    return compare
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise RuleCompileError("Unexpected end of rule")
+        self.pos += 1
+        return token
+
+    def accept(self, kind: str, value: Optional[str] = None) -> bool:
+        token = self.peek()
+        if token and token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self) -> Predicate:
+        predicate = self.parse_or()
+        if self.peek() is not None:
+            raise RuleCompileError(f"Unexpected token {self.peek()[1]!r}")
+        return predicate
+
+    def parse_or(self) -> Predicate:
+        left = self.parse_and()
+        while self.accept("keyword", "or"):
+            right = self.parse_and()
+            left = (lambda a, b: lambda ctx, it: a(ctx, it) or b(ctx, it))(left, right)
+        return left
+
+    def parse_and(self) -> Predicate:
+        left = self.parse_not()
+        while self.accept("keyword", "and"):
+            right = self.parse_not()
+            left = (lambda a, b: lambda ctx, it: a(ctx, it) and b(ctx, it))(left, right)
+        return left
+
+    def parse_not(self) -> Predicate:
+        if self.accept("keyword", "not"):
+            inner = self.parse_not()
+            return lambda ctx, it: not inner(ctx, it)
+        return self.parse_comparison()
+
+    def parse_comparison(self) -> Predicate:
+        if self.accept("op", "("):
+            inner = self.parse_or()
+            if not self.accept("op", ")"):
+                raise RuleCompileError("Missing ')'")
+            return inner
+
+        left = self.parse_operand()
+        if self.accept("keyword", "exists"):
+            def exists(ctx: Dict[str, Any], iteration: int) -> bool:
+                try:
+                    return left(ctx, iteration) is not None
+                except UnresolvedReference:
+                    return False
+            return exists
+
+        token = self.peek()
+        if token and (token[0] == "op" and token[1] not in "()" or token == ("keyword", "contains")):
+            self.pos += 1
+            return _compare(token[1], left, self.parse_operand())
+        return left
+
+    def parse_operand(self) -> Predicate:
+        kind, value = self.take()
+        if kind == "ref":
+            return _resolve_ref(value)
+        if kind == "name":
+            return _resolve_name(value)
+        if kind == "number":
+            number = float(value) if "." in value else int(value)
+            return lambda ctx, it: number
+        if kind == "string":
+            try:
+                text = ast.literal_eval(value)
+            except (SyntaxError, ValueError):
+                raise RuleCompileError(f"Invalid string literal {value}")
+            return lambda ctx, it: text
+        if kind == "keyword" and value in ("true", "false", "null"):
+            literal = {"true": True, "false": False, "null": None}[value]
+            return lambda ctx, it: literal
+        raise RuleCompileError(f"Unexpected token {value!r}")
+
+
+# ----------------------------------------------------------------------
+# Natural-language recognizers
+# ----------------------------------------------------------------------
+
+_VALUE = r"(?P<value>\"[^\"]*\"|'[^']*'|-?\d+(?:\.\d+)?|[A-Za-z0-9_\-]+)"
+_REF = r"(?P<ref>@@[A-Za-z0-9\-_]+)(?:\.(?P<path>[A-Za-z0-9_\-.]+)|'s (?P<field1>[a-z_]+)| (?P<field2>status|state|result|count|score|value|response))?"
+
+_NUMERIC_OPS = {
+    "greater than or equal to": ">=", "less than or equal to": "<=",
+    "greater than": ">", "more than": ">", "over": ">", "above": ">",
+    "less than": "<", "fewer than": "<", "under": "<", "below": "<",
+    "at least": ">=", "at most": "<=",
+    ">=": ">=", "<=": "<=", ">": ">", "<": "<",
+}
+_NUMERIC_OP = "(?P<op>" + "|".join(re.escape(op) for op in sorted(_NUMERIC_OPS, key=len, reverse=True)) + ")"
+
+_EQUALITY_OPS = {
+    "is not": "!=", "isn't": "!=", "does not equal": "!=", "!=": "!=",
+    "is": "==", "equals": "==", "==": "==", "=": "==",
+}
+_EQUALITY_OP = "(?P<op>" + "|".join(re.escape(op) for op in sorted(_EQUALITY_OPS, key=len, reverse=True)) + ")"
+
+_ITERATION = r"(?:the )?(?:iteration(?: count| number)?|loop count|attempt(?: count)?|attempts)"
+
+_NL_PATTERNS = [
+    # "@@block_1.score is greater than 7"
+    (re.compile(rf"^{_REF} (?:is )?{_NUMERIC_OP} (?P<value>-?\d+(?:\.\d+)?)$", re.I), _NUMERIC_OPS),
+    # "@@block_1 status is completed"
+    (re.compile(rf"^{_REF} {_EQUALITY_OP} {_VALUE}$", re.I), _EQUALITY_OPS),
+    # "iteration count is at least 3"
+    (re.compile(rf"^(?P<iteration>{_ITERATION}) (?:is )?{_NUMERIC_OP} (?P<value>\d+)$", re.I), _NUMERIC_OPS),
+    (re.compile(rf"^(?P<iteration>{_ITERATION}) {_EQUALITY_OP} (?P<value>\d+)$", re.I), _EQUALITY_OPS),
+]
+
+_AFTER_N_ITERATIONS = re.compile(r"^after (?P<value>\d+) (?:iterations|attempts|tries|loops)$", re.I)
+_BARE_STATUS = re.compile(r"^(?P<ref>@@[A-Za-z0-9\-_]+) (?:has )?(?:is )?(?P<value>completed|failed|escalated|waiting|running|pending)$", re.I)
+
+_LEADING_WORDS = re.compile(r"^(?:if|when|while|until|unless|continue if|break if|exit if|exit when|stop if|stop when)\s+", re.I)
+
+
+def _literal(value: str) -> str:
+    if value[0] in "\"'" or re.fullmatch(r"-?\d+(?:\.\d+)?", value):
+        return value
+    lowered = value.lower()
+    if lowered in ("true", "yes"):
+        return "true"
+    if lowered in ("false", "no"):
+        return "false"
+    return '"' + value + '"'
+
+
+def _translate_natural_language(text: str) -> Optional[str]:
+    """Translate a recognized natural-language rule into the explicit rule language"""
+    text = _LEADING_WORDS.sub("", text.strip().rstrip(".").strip())
+
+    match = _AFTER_N_ITERATIONS.match(text)
+    if match:
+        return f"iteration >= {match.group('value')}"
+
+    match = _BARE_STATUS.match(text)
+    if match:
+        return f"{match.group('ref')}.status == \"{match.group('value').lower()}\""
+
+    for pattern, ops in _NL_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        op = ops[match.group("op").lower()]
+        value = _literal(match.group("value"))
+        groups = match.groupdict()
+        if groups.get("iteration"):
+            return f"iteration {op} {value}"
+        field = groups.get("path") or groups.get("field1") or groups.get("field2")
+        if field is None:
+            # "@@block is positive" names no field; only a status word means the block's status
+            if value.strip("\"'").lower() not in _STATUS_WORDS:
+                return None
+            field = "status"
+        return f"{match.group('ref')}.{field.lower() if not groups.get('path') else field} {op} {value}"
+    return None
+
+
+# ----------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------
+
+@lru_cache(maxsize=2048)
+def compile_rule(text: Optional[str]) -> Optional[CompiledRule]:
+    """
+    Compile a rule, or return None if it must be decided by the agent.
+
+    Results are cached, so each distinct rule text is compiled once.
+    """
+    if not text or not text.strip():
+        return None
+
+    stripped = text.strip()
+    if stripped.lower().startswith(RULE_PREFIX):
+        expression = stripped[len(RULE_PREFIX):].strip()
+    else:
+        expression = _translate_natural_language(stripped)
+        if expression is None:
+            return None
+
+    try:
+        predicate = _Parser(_tokenize(expression)).parse()
+    except RuleCompileError:
+        return None
+    return CompiledRule(text, expression, predicate)
+
+
+def evaluate_rule(text: Optional[str], workflow_context: Dict[str, Any], iteration: int = 0) -> Optional[bool]:
+    """Evaluate a rule deterministically; None means the agent has to decide"""
+    rule = compile_rule(text)
+    if rule is None:
+        return None
+    try:
+        return rule.evaluate(workflow_context, iteration)
+    except UnresolvedReference:
+        return None
@@ -0,0 +1,187 @@
+"""
+Structured Output Extractor
+Pulls the first schema-valid JSON object out of a streamed model response
+
+Text is fed chunk by chunk into an IncrementalJSONParser; as soon as a complete
+object closes it is validated against a pydantic response model, so callers can
+stop reading the stream without waiting for trailing prose. Objects that fail to
+decode get a bounded set of repairs (code fences, smart quotes, trailing commas,
+Python literals, unclosed brackets) before being rejected.
+"""
+from typing import Any, Callable, Dict, List, Optional, Type
+import json
+import logging
+import re
+
+from pydantic import BaseModel, ValidationError
+
+from backend.agents.json_stream import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+# Fields the caller fills in itself, never taken from model output
+_SERVER_FIELDS = {"decided_by", "timestamp"}
+
+_CODE_FENCE_PATTERN = re.compile(r'```[A-Za-z0-9_-]*')
+_TRAILING_COMMA_PATTERN = re.compile(r',(\s*[}\]])')
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PYTHON_LITERAL_PATTERN = re.compile(r'\b(True|False|None)\b')
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _strip_code_fences(text: str) -> str:
+    return _CODE_FENCE_PATTERN.sub("", text)
+
+
+def _normalize_quotes(text: str) -> str:
+    return text.translate(_SMART_QUOTES)
+
+
+def _remove_trailing_commas(text: str) -> str:
+    return _TRAILING_COMMA_PATTERN.sub(r'\1', text)
+
+
+def _replace_python_literals(text: str) -> str:
+    return _PYTHON_LITERAL_PATTERN.sub(lambda match: _PYTHON_LITERALS[match.group(1)], text)
+
+
+def _close_brackets(text: str) -> str:
+    """Close any strings and containers left open by a truncated response"""
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    closing = ('"' if in_string else "") + "".join(reversed(stack))
+    return _remove_trailing_commas(text.rstrip().rstrip(",") + closing)
+
+
+# Applied cumulatively, cheapest first; each step is followed by one json.loads attempt
+_REPAIRS: List[Callable[[str], str]] = [
+    _strip_code_fences,
+    _normalize_quotes,
+    _remove_trailing_commas,
+    _replace_python_literals,
+    _close_brackets,
+]
+
+_MISSING = object()
+
+
+def repair_json(text: str) -> Any:
+    """
+    Decode text as JSON, applying the bounded repair steps if it does not parse.
+
+    Returns:
+        The decoded value, or None if no repair produced valid JSON
+    """
+    start = min((pos for pos in (text.find("{"), text.find("[")) if pos != -1), default=-1)
+    if start == -1:
+        return None
+    candidate = text[start:]
+    for repair in [None] + _REPAIRS:
+        if repair is not None:
+            candidate = repair(candidate)
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
+
+
+class StructuredOutputExtractor:
+    """
+    Incremental extractor for one response model.
+
+    Usage:
+        extractor = StructuredOutputExtractor(ConditionEvaluationResponse)
+        for chunk in chunks:
+            data = extractor.feed(chunk)
+            if data is not None:
+                break  # Remaining output is not needed
+        else:
+            data = extractor.finish()
+    """
+
+    def __init__(self, response_model: Type[BaseModel], max_candidates: int = 3):
+        self.response_model = response_model
+        self.max_candidates = max_candidates
+        self.result: Optional[Dict[str, Any]] = None
+        self.repaired = False
+        self.candidates = 0
+
+        self._text = ""
+        self._offset = 0  # Start of the text not yet consumed by a rejected candidate
+        self._parser = IncrementalJSONParser()
+
+    @property
+    def text(self) -> str:
+        """All text fed so far"""
+        return self._text
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """Scan the next chunk; returns the validated fields once a valid object has closed"""
+        if self.result is not None or self.candidates >= self.max_candidates:
+            return self.result
+        self._text += chunk
+
+        pending = chunk
+        while pending and self.result is None and self.candidates < self.max_candidates:
+            try:
+                events = self._parser.feed(pending)
+                value = events[-1].value if events else _MISSING
+            except ValueError:
+                value = repair_json(self._parser.raw)
+                self.repaired = value is not None
+
+            if value is _MISSING:
+                return None
+
+            self.candidates += 1
+            self.result = self._validate(value)
+            if self.result is None:
+                self.repaired = False
+                pending = self._restart()
+        return self.result
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """Called at end of stream: repair whatever is left (e.g. a truncated object)"""
+        if self.result is not None or self.candidates >= self.max_candidates:
+            return self.result
+        if self._parser.started:
+            value = repair_json(self._parser.raw)
+            if value is not None:
+                self.candidates += 1
+                self.result = self._validate(value)
+                self.repaired = self.result is not None
+        return self.result
+
+    def _validate(self, value: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(value, dict):
+            return None
+        try:
+            validated = self.response_model.model_validate(value)
+        except ValidationError as e:
+            logger.debug(f"Discarding {self.response_model.__name__} candidate: {e.error_count()} validation errors")
+            return None
+        return validated.model_dump(exclude=_SERVER_FIELDS)
+
+    def _restart(self) -> str:
+        """Start a fresh parser after a rejected candidate; returns the unscanned text"""
+        raw = self._parser.raw
+        end = self._text.find(raw, self._offset)
+        self._offset = end + len(raw) if end != -1 else len(self._text)
+        self._parser = IncrementalJSONParser()
+        return self._text[self._offset:]
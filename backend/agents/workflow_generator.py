@@ -3,19 +3,33 @@ Workflow Generator Agent
 Converts natural language descriptions into workflow block structures
 Uses MCP tools to create blocks on the canvas
 """
-from typing import List, Dict, Any, Optional, AsyncIterator
-from claude_agent_sdk import query, ClaudeAgentOptions
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from backend.config.settings import settings
 from backend.config.key_manager import key_manager
 from backend.config.logging_config import get_agent_logger
 from backend.tools.workflow_canvas_tool import WorkflowCanvasTool, WORKFLOW_CANVAS_TOOL_DESCRIPTOR, WORKFLOW_CANVAS_BATCH_TOOL_DESCRIPTOR
+from backend.agents.json_stream import IncrementalJSONParser
+from backend.agents.client_pool import client_pool
+from backend.agents.llm_scheduler import Priority
 import json
-import os
 import logging
 
 logger = logging.getLogger(__name__)
 agent_logger = get_agent_logger()
 
+WORKFLOW_JSON_MARKER = "WORKFLOW_JSON:"
+
+# WORKFLOW_JSON arrays whose elements are streamed to the canvas as they close
+WORKFLOW_ELEMENT_PATHS = [("blocks",), ("connections",)]
+
+
+def _hold_back_marker_prefix(text: str) -> Tuple[str, str]:
+    """Split off a trailing partial WORKFLOW_JSON marker so it can complete in the next chunk"""
+    for size in range(min(len(text), len(WORKFLOW_JSON_MARKER) - 1), 0, -1):
+        if WORKFLOW_JSON_MARKER.startswith(text[-size:]):
+            return text[:-size], text[-size:]
+    return text, ""
+
 
 class WorkflowGeneratorAgent:
     """Agent that generates workflow blocks from natural language"""
@@ -68,23 +82,20 @@ class WorkflowGeneratorAgent:
         })
 
         try:
-            # Set API key in environment (Claude SDK reads from ANTHROPIC_API_KEY)
-            os.environ['ANTHROPIC_API_KEY'] = api_key
-
             accumulated_text = ""
-            workflow_json_buffer = ""
-            in_workflow_json = False
+            pending_text = ""
+            json_parser: Optional[IncrementalJSONParser] = None
             blocks_created = []
 
             logger.debug("Starting Claude Agent SDK query")
 
-            async for message in query(
-                prompt=full_prompt,
-                options=ClaudeAgentOptions(
-                    system_prompt=system_prompt,
-                    model=model,
-                    include_partial_messages=True
-                )
+            async for message in client_pool.query(
+                full_prompt,
+                model=model,
+                system_prompt=system_prompt,
+                include_partial_messages=True,
+                api_key=api_key,
+                priority=Priority.INTERACTIVE
             ):
                 # Handle text content
                 if hasattr(message, 'content') and message.content:
@@ -93,21 +104,33 @@ class WorkflowGeneratorAgent:
                             text = block.text
                             accumulated_text += text
 
-                            # Check for WORKFLOW_JSON start
-                            if 'WORKFLOW_JSON:' in text:
-                                in_workflow_json = True
-                                # Extract JSON part
-                                workflow_json_buffer = text.split('WORKFLOW_JSON:', 1)[1]
+                            if json_parser is None:
+                                # Check for WORKFLOW_JSON start (the marker may span chunks)
+                                pending_text += text
+                                if WORKFLOW_JSON_MARKER not in pending_text:
+                                    chat_text, pending_text = _hold_back_marker_prefix(pending_text)
+                                    if chat_text:
+                                        # Regular chat message
+                                        yield {
+                                            "type": "chat_message",
+                                            "content": chat_text,
+                                            "done": False
+                                        }
+                                    continue
+
+                                # Parse incrementally so blocks reach the canvas as soon as they close
+                                json_parser = IncrementalJSONParser(element_paths=WORKFLOW_ELEMENT_PATHS)
+                                pre_json, workflow_json_text = pending_text.split(WORKFLOW_JSON_MARKER, 1)
+                                pending_text = ""
                                 # Send text before WORKFLOW_JSON to chat
-                                pre_json = text.split('WORKFLOW_JSON:', 1)[0]
                                 if pre_json.strip():
                                     yield {
                                         "type": "chat_message",
                                         "content": pre_json,
                                         "done": False
                                     }
-                            elif in_workflow_json:
-                                workflow_json_buffer += text
+                            elif not json_parser.done:
+                                workflow_json_text = text
                             else:
                                 # Regular chat message
                                 yield {
@@ -115,12 +138,30 @@ class WorkflowGeneratorAgent:
                                     "content": text,
                                     "done": False
                                 }
+                                continue
 
-                            # Try to parse complete JSON
-                            if in_workflow_json and workflow_json_buffer.count('{') > 0:
-                                try:
-                                    # Try parsing the accumulated JSON
-                                    workflow_def = json.loads(workflow_json_buffer.strip())
+                            try:
+                                events = json_parser.feed(workflow_json_text)
+                            except json.JSONDecodeError as e:
+                                logger.warning(f"Discarding malformed WORKFLOW_JSON: {e}")
+                                json_parser = None
+                                continue
+
+                            for event in events:
+                                if event.kind == "element" and event.path == ("blocks",):
+                                    yield {
+                                        "type": "block_created",
+                                        "block": event.value,
+                                        "done": False
+                                    }
+                                elif event.kind == "element" and event.path == ("connections",):
+                                    yield {
+                                        "type": "connection_created",
+                                        "connection": event.value,
+                                        "done": False
+                                    }
+                                elif event.kind == "complete":
+                                    workflow_def = event.value
 
                                     logger.info(f"✅ WORKFLOW_JSON PARSED - Blocks: {len(workflow_def.get('blocks', []))}, Connections: {len(workflow_def.get('connections', []))}")
 
@@ -155,15 +196,24 @@ class WorkflowGeneratorAgent:
 
                                     logger.info(f"Workflow created with {len(blocks_created)} blocks")
 
-                                    in_workflow_json = False
-                                    workflow_json_buffer = ""
-
-                                except json.JSONDecodeError:
-                                    # Not complete yet, keep accumulating
-                                    pass
+                            # Text after the JSON goes back to the chat
+                            if json_parser.done and json_parser.remainder.strip():
+                                yield {
+                                    "type": "chat_message",
+                                    "content": json_parser.remainder,
+                                    "done": False
+                                }
+                                json_parser.remainder = ""
 
                             logger.debug(f"Streaming text: {text[:100]}...")
 
+            if pending_text:
+                yield {
+                    "type": "chat_message",
+                    "content": pending_text,
+                    "done": False
+                }
+
             # Add to history
             self.conversation_history.append({
                 "role": "assistant",
@@ -314,7 +364,3 @@ CRITICAL: You MUST output WORKFLOW_JSON for EVERY workflow request. Do not just
         logger.info("Resetting conversation history")
         self.conversation_history = []
         self.canvas_tool.clear_blocks()
-
-
-# Global instance
-workflow_generator = WorkflowGeneratorAgent()
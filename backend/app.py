@@ -2,12 +2,13 @@
 FastAPI Server for Healthcare Workflow Composer
 Provides WebSocket support for real-time workflow generation and REST endpoints for condition/loop evaluation
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Dict, List, Any
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Dict, List, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
 import json
 import asyncio
+import hashlib
 from datetime import datetime
 import logging
 
@@ -23,15 +24,36 @@ agent_logger = get_agent_logger()
 from backend.models.workflow_context import (
     WorkflowGenerationRequest,
     ConditionEvaluationRequest,
+    ConditionEvaluationBatchRequest,
     LoopEvaluationRequest,
+    LoopEvaluationBatchRequest,
+    ObjectStatusEvent,
+    StatusEventBatchRequest,
+    ExecutionStatus,
+    WorkflowDefinition,
+    WorkflowResumeRequest,
+    WorkflowRunRequest,
     WorkflowType
 )
 
 # Import agents
-from backend.agents.workflow_generator import workflow_generator
+from backend.agents.generator_sessions import generator_sessions
 from backend.agents.condition_evaluator import condition_evaluator
 from backend.agents.loop_controller import loop_controller
 from backend.agents.practice_insights import practice_insights_agent
+from backend.agents.practice_metrics import PracticeDataError
+from backend.agents.client_pool import client_pool, ClientProfile
+from backend.agents.llm_scheduler import llm_scheduler, Priority
+from backend.agents.admission_control import admission_controller
+from backend.agents.resilience import agent_resilience
+from backend.agents.insights_cache import insights_cache
+from backend.agents.practice_questions import practice_question_router
+from backend.agents.decision_cache import decision_cache
+from backend.agents.context_slicer import slicer_stats
+from backend.agents.model_router import evaluator_router
+from backend.engine.workflow_engine import workflow_engine, WorkflowEngineError, WorkflowPlanError
+from backend.engine.instance_store import instance_store
+from backend.engine.trigger_router import trigger_router
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -73,6 +95,56 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+@app.on_event("startup")
+async def warm_agent_clients():
+    """Pre-spawn SDK clients so the first evaluations skip the CLI cold start"""
+    await client_pool.start([ClientProfile(model=key_manager.get_claude_model())])
+
+
+@app.on_event("startup")
+async def open_instance_store():
+    """Open the persistent workflow instance store before any instance starts"""
+    await instance_store.start()
+
+
+@app.on_event("startup")
+async def restore_trigger_registrations():
+    """Re-index the workflow definitions registered before the last restart"""
+    await trigger_router.restore()
+
+
+@app.on_event("startup")
+async def open_insights_cache():
+    """Reopen persisted practice insights so restarts do not re-query the model"""
+    await insights_cache.open()
+
+
+@app.on_event("startup")
+async def start_workflow_timers():
+    """Recover unfinished workflow instances, then reload persisted wait-block timers and start firing them"""
+    await workflow_engine.start_timers()
+
+
+@app.on_event("shutdown")
+async def close_agent_clients():
+    await client_pool.close()
+
+
+@app.on_event("shutdown")
+async def stop_workflow_timers():
+    await workflow_engine.stop_timers()
+
+
+@app.on_event("shutdown")
+async def close_instance_store():
+    await instance_store.stop()
+
+
+@app.on_event("shutdown")
+async def close_insights_cache():
+    await insights_cache.close()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -91,6 +163,20 @@ async def health_check():
         "status": "healthy",
         "claude_api_configured": key_manager.is_configured(),
         "active_websocket_connections": len(manager.active_connections),
+        "generator_sessions": generator_sessions.get_stats(),
+        "agent_client_pool": client_pool.get_stats(),
+        "llm_scheduler": llm_scheduler.get_stats(),
+        "admission_control": admission_controller.get_stats(),
+        "agent_resilience": agent_resilience.get_stats(),
+        "practice_insights_cache": insights_cache.get_stats(),
+        "practice_questions": practice_question_router.get_stats(),
+        "decision_cache": decision_cache.get_stats(),
+        "evaluator_context": slicer_stats.get_stats(),
+        "evaluator_routing": evaluator_router.get_stats(),
+        "workflow_engine": workflow_engine.get_stats(),
+        "workflow_timers": workflow_engine.timers.get_stats(),
+        "instance_store": instance_store.get_stats(),
+        "trigger_router": trigger_router.get_stats(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -100,8 +186,13 @@ async def workflow_chat_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint for real-time workflow generation chat.
     Frontend sends user messages, backend streams AI responses and generated blocks.
+
+    Each client gets its own generator session. Pass ?session_token=... to keep
+    the conversation across reconnects; otherwise the session ends with the socket.
     """
     client_id = f"client-{id(websocket)}"
+    session_token = websocket.query_params.get("session_token")
+    session_id = session_token or client_id
     await manager.connect(websocket, client_id)
 
     try:
@@ -125,6 +216,15 @@ async def workflow_chat_endpoint(websocket: WebSocket):
                     })
                     continue
 
+                retry_after = admission_controller.check(Priority.INTERACTIVE, "workflow-chat")
+                if retry_after is not None:
+                    await manager.send_message(client_id, {
+                        "type": "busy",
+                        "message": "The AI assistant is at capacity. Please try again shortly.",
+                        "retry_after": retry_after
+                    })
+                    continue
+
                 # Send acknowledgment
                 await manager.send_message(client_id, {
                     "type": "processing_started",
@@ -132,23 +232,27 @@ async def workflow_chat_endpoint(websocket: WebSocket):
                 })
 
                 # Stream workflow generation
+                session = generator_sessions.get(session_id)
                 try:
-                    async for response in workflow_generator.generate_workflow_stream(
-                        user_message=user_message,
-                        workflow_type=workflow_type,
-                        existing_blocks=existing_blocks
-                    ):
-                        await manager.send_message(client_id, response)
+                    async with session.lock:
+                        async for response in session.agent.generate_workflow_stream(
+                            user_message=user_message,
+                            workflow_type=workflow_type,
+                            existing_blocks=existing_blocks
+                        ):
+                            await manager.send_message(client_id, response)
 
                 except Exception as e:
                     await manager.send_message(client_id, {
                         "type": "error",
                         "error": f"Workflow generation error: {str(e)}"
                     })
+                finally:
+                    generator_sessions.trim_history(session)
 
             elif message_type == "reset_conversation":
-                # Reset the conversation history
-                workflow_generator.reset_conversation()
+                # Reset this client's conversation history
+                generator_sessions.reset(session_id)
                 await manager.send_message(client_id, {
                     "type": "conversation_reset",
                     "message": "Conversation history cleared"
@@ -173,6 +277,10 @@ async def workflow_chat_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"[WebSocket] Error with client {client_id}: {str(e)}")
         manager.disconnect(client_id)
+    finally:
+        # Anonymous sessions cannot be resumed; token sessions expire via idle TTL
+        if not session_token:
+            generator_sessions.remove(session_id)
 
 
 @app.post("/api/evaluate-condition")
@@ -201,6 +309,190 @@ async def evaluate_loop_endpoint(request: LoopEvaluationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _batch_concurrency(requested: Optional[int]) -> int:
+    """Resolve a caller's requested concurrency against the configured bounds"""
+    concurrency = requested or settings.batch_evaluation_concurrency
+    return max(1, min(concurrency, settings.batch_evaluation_max_concurrency))
+
+
+async def _stream_batch(
+    items: List[Any],
+    evaluate: Callable[[Any], Awaitable[Any]],
+    concurrency: int
+) -> AsyncIterator[str]:
+    """
+    Evaluate items with bounded concurrency and yield NDJSON lines as they complete.
+    A failing item yields an error line without affecting the rest of the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int, item: Any) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await evaluate(item)
+                return {"index": index, "instance_id": item.instance_id, "result": result.model_dump(mode="json")}
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {e}")
+                return {"index": index, "instance_id": item.instance_id, "error": str(e)}
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            yield json.dumps(await completed) + "\n"
+    finally:
+        # Client went away: stop evaluating the rest of the batch
+        for task in tasks:
+            task.cancel()
+
+
+def _validate_batch_size(items: List[Any]):
+    if not items:
+        raise HTTPException(status_code=400, detail="requests must not be empty")
+    if len(items) > settings.batch_evaluation_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(items)} items (max {settings.batch_evaluation_max_items})"
+        )
+
+
+@app.post("/api/evaluate-conditions")
+async def evaluate_conditions_endpoint(request: ConditionEvaluationBatchRequest):
+    """
+    Evaluate many condition blocks in one request.
+    Results stream back as NDJSON lines ({"index", "instance_id", "result"|"error"}) in completion order.
+    """
+    _validate_batch_size(request.requests)
+    return StreamingResponse(
+        _stream_batch(request.requests, condition_evaluator.evaluate_condition, _batch_concurrency(request.max_concurrency)),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.post("/api/evaluate-loops")
+async def evaluate_loops_endpoint(request: LoopEvaluationBatchRequest):
+    """
+    Evaluate many loop decisions in one request.
+    Results stream back as NDJSON lines ({"index", "instance_id", "result"|"error"}) in completion order.
+    """
+    _validate_batch_size(request.requests)
+    return StreamingResponse(
+        _stream_batch(request.requests, loop_controller.evaluate_loop, _batch_concurrency(request.max_concurrency)),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.post("/api/workflow-instances")
+async def start_workflow_instance(request: WorkflowRunRequest):
+    """
+    Start executing a workflow definition.
+    Returns the new instance immediately, or once it completes/parks when wait=true.
+    """
+    try:
+        instance = await workflow_engine.start(
+            request.definition,
+            request.triggered_by,
+            patient_id=request.patient_id,
+            context_data=request.context_data
+        )
+    except WorkflowPlanError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.wait:
+        await workflow_engine.wait(instance.instance_id)
+    return instance.model_dump(mode="json")
+
+
+@app.get("/api/workflow-instances")
+async def list_workflow_instances(
+    workflow_id: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    status: Optional[ExecutionStatus] = None,
+    limit: int = 50
+):
+    """Persisted instances of a workflow and/or patient, most recently updated first (without history)"""
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    return {"instances": await instance_store.find(workflow_id=workflow_id, patient_id=patient_id, status=status, limit=limit)}
+
+
+@app.get("/api/workflow-instances/{instance_id}")
+async def get_workflow_instance(instance_id: str):
+    """Current state and execution history of a workflow instance"""
+    instance = await workflow_engine.load_instance(instance_id)
+    if instance is None:
+        raise HTTPException(status_code=404, detail=f"Unknown instance: {instance_id}")
+    return instance.model_dump(mode="json")
+
+
+@app.post("/api/workflow-instances/{instance_id}/resume")
+async def resume_workflow_instance(instance_id: str, request: WorkflowResumeRequest):
+    """Resume a waiting, approval or escalated block with its output (e.g. {"approved": true})"""
+    try:
+        instance = await workflow_engine.resume(instance_id, request.block_id, request.output)
+    except WorkflowEngineError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return instance.model_dump(mode="json")
+
+
+@app.post("/api/workflow-instances/{instance_id}/cancel")
+async def cancel_workflow_instance(instance_id: str):
+    """Stop a running workflow instance"""
+    instance = await workflow_engine.cancel(instance_id)
+    if instance is None:
+        raise HTTPException(status_code=404, detail=f"Unknown instance: {instance_id}")
+    return instance.model_dump(mode="json")
+
+
+@app.put("/api/workflow-definitions/{workflow_id}")
+async def register_workflow_definition(workflow_id: str, definition: WorkflowDefinition):
+    """
+    Activate (or update) a workflow so status events start it.
+    Inactive definitions (is_active=false) are removed from the trigger index.
+    Registrations are persisted and survive a restart.
+    """
+    if definition.workflow_id != workflow_id:
+        raise HTTPException(status_code=400, detail="workflow_id does not match the URL")
+    try:
+        workflow_engine.get_plan(definition)
+    except WorkflowPlanError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    triggers = trigger_router.register(definition)
+    if triggers:
+        await instance_store.register_definition(definition)
+    else:
+        await instance_store.unregister_definition(workflow_id)
+    return {"workflow_id": workflow_id, "is_active": definition.is_active, "triggers": triggers}
+
+
+@app.delete("/api/workflow-definitions/{workflow_id}")
+async def unregister_workflow_definition(workflow_id: str):
+    """Stop starting a workflow from status events"""
+    if not trigger_router.unregister(workflow_id):
+        raise HTTPException(status_code=404, detail=f"Unknown workflow: {workflow_id}")
+    await instance_store.unregister_definition(workflow_id)
+    return {"workflow_id": workflow_id, "removed": True}
+
+
+@app.post("/api/events")
+async def ingest_status_event(event: ObjectStatusEvent):
+    """
+    Ingest one healthcare object status change.
+    Starts every active workflow whose trigger matches and returns their instance ids.
+    """
+    instances = await trigger_router.dispatch(event)
+    return {"matched": len(instances), "instance_ids": [instance.instance_id for instance in instances]}
+
+
+@app.post("/api/events/batch")
+async def ingest_status_events(request: StatusEventBatchRequest):
+    """Ingest many status changes in one request (dispatched in order)"""
+    _validate_batch_size(request.events)
+    results = []
+    for event in request.events:
+        instances = await trigger_router.dispatch(event)
+        results.append({"object_id": event.object_id, "instance_ids": [instance.instance_id for instance in instances]})
+    return {"events": len(results), "matched": sum(len(result["instance_ids"]) for result in results), "results": results}
+
+
 @app.post("/api/parse-block-references")
 async def parse_block_references(text: str):
     """
@@ -218,68 +510,99 @@ async def parse_block_references(text: str):
     }
 
 
+def _precomputed_json(value: Any) -> Tuple[bytes, str]:
+    """Serialized JSON body and a strong ETag over its bytes"""
+    body = json.dumps(value, separators=(",", ":")).encode()
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison: a W/ prefix on the client's tag is ignored)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def _conditional_response(request: Request, etag: str, body: Optional[bytes] = None, content: Any = None) -> Response:
+    """304 when the client already holds etag, else the body (bytes or JSON-serializable content)"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
+
+BLOCK_TYPES = {
+    "patient": {
+        "triggers": [
+            "trigger-patient-profile",
+            "trigger-order",
+            "trigger-report",
+            "trigger-encounter-note",
+            "trigger-document",
+            "trigger-calendar-event",
+            "trigger-task",
+            "trigger-internal-note"
+        ],
+        "actions": [
+            "action-send-message",
+            "action-send-email",
+            "action-create-task",
+            "action-update-patient",
+            "action-generate-report"
+        ],
+        "logic": [
+            "wait",
+            "condition",
+            "loop",
+            "approval",
+            "ai-touch"
+        ]
+    },
+    "practice": {
+        "triggers": [
+            "trigger-scheduled",
+            "trigger-threshold"
+        ],
+        "actions": [
+            "action-send-message",
+            "action-send-email",
+            "action-create-task",
+            "action-generate-report"
+        ],
+        "logic": [
+            "wait",
+            "condition",
+            "loop",
+            "approval",
+            "ai-touch"
+        ]
+    }
+}
+
+# Serialized once: the block catalogue only changes with a deploy
+_BLOCK_TYPES_BODIES = {workflow_type: _precomputed_json(types) for workflow_type, types in BLOCK_TYPES.items()}
+
+
 @app.get("/api/block-types")
-async def get_block_types(workflow_type: str = "patient"):
+async def get_block_types(request: Request, workflow_type: str = "patient"):
     """
     Get available block types for a specific workflow type.
     Helps frontend understand what blocks can be created.
+    Served from a precomputed body with an ETag; If-None-Match gets a 304.
     """
-    if workflow_type not in ["patient", "practice"]:
+    if workflow_type not in BLOCK_TYPES:
         raise HTTPException(status_code=400, detail="workflow_type must be 'patient' or 'practice'")
 
-    block_types = {
-        "patient": {
-            "triggers": [
-                "trigger-patient-profile",
-                "trigger-order",
-                "trigger-report",
-                "trigger-encounter-note",
-                "trigger-document",
-                "trigger-calendar-event",
-                "trigger-task",
-                "trigger-internal-note"
-            ],
-            "actions": [
-                "action-send-message",
-                "action-send-email",
-                "action-create-task",
-                "action-update-patient",
-                "action-generate-report"
-            ],
-            "logic": [
-                "wait",
-                "condition",
-                "loop",
-                "approval",
-                "ai-touch"
-            ]
-        },
-        "practice": {
-            "triggers": [
-                "trigger-scheduled",
-                "trigger-threshold"
-            ],
-            "actions": [
-                "action-send-message",
-                "action-send-email",
-                "action-create-task",
-                "action-generate-report"
-            ],
-            "logic": [
-                "wait",
-                "condition",
-                "loop",
-                "approval",
-                "ai-touch"
-            ]
-        }
-    }
-
-    return block_types.get(workflow_type, {})
+    body, etag = _BLOCK_TYPES_BODIES[workflow_type]
+    return _conditional_response(request, etag, body=body)
 
 
 @app.post("/api/practice-insights")
-async def generate_practice_insights(request: Dict[str, Any]):
+async def generate_practice_insights(request: Request):
     """
     Generate AI-powered insights from practice operational data.
 
@@ -288,41 +611,114 @@ async def generate_practice_insights(request: Dict[str, Any]):
         "practice_data": {
             "current_period": {...},
             "previous_period": {...},
-            "period_comparison": {...},
-            "top_services": [...],
-            "peak_hours": [...],
-            "provider_performance": [...]
+            "appointments": [...],   # Optional raw records; totals, period_comparison,
+            "visits": [...],         # top_services, peak_hours and provider_performance
+            "revenue": [...]         # are then computed server-side (see practice_metrics)
         }
     }
 
     Returns:
     {
+        "summary": "Narrative summary written by the model",
         "insights": [
             {
-                "type": "positive|negative|neutral|warning",
-                "title": "Insight title",
-                "description": "Detailed description",
-                "recommendation": "Optional recommendation"
+                "type": "positive|negative|warning",
+                "title": "Revenue",
+                "value": "+8.9%",
+                "change": "+$7.3K",
+                "trend": "up|down|stable"
             }
         ]
     }
-    """
-    try:
-        practice_data = request.get("practice_data", {})
 
-        if not practice_data:
-            raise HTTPException(status_code=400, detail="practice_data is required")
+    While the model backend is over capacity the deterministic fallback is
+    returned immediately, marked with "degraded": true.
+
+    Cached results carry a strong ETag digested from the response body, so a
+    summary regenerated after the cache TTL gets a new tag; a poll with a
+    matching If-None-Match gets an empty 304. A body seen before
+    is mapped to its cache key by digest, skipping parsing and metrics.
+    Uncached fallbacks are sent with Cache-Control: no-store and no ETag.
+    """
+    raw = await request.body()
+    body_digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
 
-        result = await practice_insights_agent.generate_insights(practice_data)
+    # Unchanged poll: straight from the cache without parsing or recomputing metrics
+    data_hash = insights_cache.key_for_request(body_digest)
+    if data_hash is not None:
+        cached = await insights_cache.get(data_hash)
+        if cached is not None:
+            body, etag = _precomputed_json(cached)
+            return _conditional_response(request, etag, body=body)
 
-        # Return the full result (summary + insights)
-        return result
+    try:
+        practice_data = json.loads(raw).get("practice_data", {}) if raw else {}
+    except (ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object")
+    if not practice_data:
+        raise HTTPException(status_code=400, detail="practice_data is required")
 
+    try:
+        # Over capacity: cached or deterministic insights instead of queuing for the model
+        admitted = admission_controller.check(Priority.INSIGHTS, "practice-insights") is None
+        result, data_hash = await practice_insights_agent.generate_cacheable_insights(practice_data, use_llm=admitted)
+
+        if data_hash is None:
+            return JSONResponse(content=result, headers={"Cache-Control": "no-store"})
+        insights_cache.remember_request(body_digest, data_hash)
+        body, etag = _precomputed_json(result)
+        return _conditional_response(request, etag, body=body)
+
+    except PracticeDataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate practice insights: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _server_sent_events(events, first_event: Optional[Dict[str, Any]] = None):
+    """Format {"event", "data"} dicts (first_event, then events) as text/event-stream frames"""
+    if first_event is not None:
+        yield f"event: {first_event['event']}\ndata: {json.dumps(first_event['data'])}\n\n"
+    try:
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    except Exception as e:
+        logger.error(f"Practice insights stream failed: {e}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+
+@app.post("/api/practice-insights/stream")
+async def stream_practice_insights(request: Dict[str, Any]):
+    """
+    Streaming variant of /api/practice-insights as Server-Sent Events.
+
+    Same request body. Events, in order:
+        insights       {"insights": [...]}             locally computed tiles, sent immediately
+        summary_delta  {"text": "..."}                 summary text as the model writes it
+        summary        {"summary", "cached", "degraded"}  the final summary
+        done           {}
+    Cached results replay immediately without summary_delta events.
+    Unreadable practice data is rejected with a 400 before the stream starts.
+    """
+    practice_data = request.get("practice_data", {})
+    if not practice_data:
+        raise HTTPException(status_code=400, detail="practice_data is required")
+
+    admitted = admission_controller.check(Priority.INSIGHTS, "practice-insights") is None
+    events = practice_insights_agent.stream_insights(practice_data, use_llm=admitted)
+    try:
+        first_event = await events.__anext__()  # Metrics are computed before the first event
+    except PracticeDataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        _server_sent_events(events, first_event),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/api/practice-ask")
 async def ask_practice_question(request: Dict[str, Any]):
     """
@@ -345,17 +741,36 @@ async def ask_practice_question(request: Dict[str, Any]):
         "timestamp": "ISO timestamp"
     }
     """
-    try:
-        question = request.get("question", "")
-        practice_data = request.get("practice_data", {})
+    question = request.get("question", "")
+    practice_data = request.get("practice_data", {})
 
-        if not question:
-            raise HTTPException(status_code=400, detail="question is required")
+    if not question:
+        raise HTTPException(status_code=400, detail="question is required")
 
-        if not practice_data:
-            raise HTTPException(status_code=400, detail="practice_data is required")
+    if not practice_data:
+        raise HTTPException(status_code=400, detail="practice_data is required")
 
-        answer = await practice_insights_agent.answer_question(question, practice_data)
+    try:
+        # Metric lookups are answered from the data without touching the model backend
+        answer = practice_insights_agent.answer_locally(question, practice_data)
+    except PracticeDataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to answer practice question: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if answer is None:
+        retry_after = admission_controller.check(Priority.INSIGHTS, "practice-ask")
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=503,
+                detail="The AI assistant is at capacity. Please try again shortly.",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+    try:
+        if answer is None:
+            answer = await practice_insights_agent.answer_question(question, practice_data, try_local=False)
 
         return {
             "answer": answer,
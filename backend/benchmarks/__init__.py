@@ -0,0 +1 @@
+"""Micro-benchmarks for the workflow runtime (run with python -m backend.benchmarks.<name>)"""
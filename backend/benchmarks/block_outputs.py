@@ -0,0 +1,87 @@
+"""
+Block Output Benchmark
+Measures @@ reference resolution on long execution histories: the latest-output
+index on WorkflowInstance against a reverse scan of execution_history
+
+Usage:
+    python -m backend.benchmarks.block_outputs --history 10000 --refs 20
+"""
+import argparse
+import random
+import time
+
+from backend.models.workflow_context import BlockExecution, ExecutionStatus, WorkflowInstance, WorkflowType
+
+
+def make_instance(history: int, blocks: int, rng: random.Random) -> WorkflowInstance:
+    instance = WorkflowInstance(
+        instance_id="benchmark",
+        workflow_id="benchmark",
+        workflow_type=WorkflowType.PATIENT,
+        status=ExecutionStatus.RUNNING,
+        triggered_by={}
+    )
+    for index in range(history):
+        instance.add_execution(BlockExecution(
+            block_id=f"block-{rng.randrange(blocks)}",
+            block_type="action-send-message",
+            status=ExecutionStatus.COMPLETED,
+            output_data={"iteration": index}
+        ))
+    return instance
+
+
+def scan_block_output(instance: WorkflowInstance, block_id: str):
+    """Baseline: the reverse scan get_block_output used to do"""
+    for execution in reversed(instance.execution_history):
+        if execution.block_id == block_id:
+            return execution.output_data
+    return None
+
+
+def timed(label: str, lookups: int, function):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / lookups * 1e6:10.2f} us/lookup")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=10000, help="Executions in the instance's history")
+    parser.add_argument("--blocks", type=int, default=200, help="Distinct block ids in the history")
+    parser.add_argument("--refs", type=int, default=20, help="Block ids referenced per resolution")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    instance = make_instance(args.history, args.blocks, rng)
+    print(f"Built {args.history} executions over {args.blocks} blocks in {time.perf_counter() - started:.3f}s")
+
+    # Blocks that never ran make the scan walk the whole history
+    references = [f"block-{rng.randrange(args.blocks)}" for _ in range(args.refs - 2)] + ["missing-1", "missing-2"]
+    lookups = args.rounds * len(references)
+
+    timed("Reverse scan", lookups, lambda: [
+        {block_id: output for block_id in references if (output := scan_block_output(instance, block_id))}
+        for _ in range(args.rounds)
+    ])
+    timed("Indexed get_block_output", lookups, lambda: [
+        {block_id: output for block_id in references if (output := instance.get_block_output(block_id))}
+        for _ in range(args.rounds)
+    ])
+    reference_set = set(references)
+    timed("resolve_block_outputs (set)", lookups, lambda: [
+        instance.resolve_block_outputs(reference_set) for _ in range(args.rounds)
+    ])
+
+    assert instance.resolve_block_outputs(reference_set) == {
+        block_id: output for block_id in reference_set if (output := scan_block_output(instance, block_id))
+    }
+    assert "_latest_executions" not in instance.model_dump()
+
+
+if __name__ == "__main__":
+    main()
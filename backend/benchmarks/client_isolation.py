@@ -0,0 +1,146 @@
+"""
+Client Isolation Stress Test
+Runs concurrent queries under many API keys through the agent client pool
+against a fake ClaudeSDKClient and checks that every lease ran on a client
+spawned with its own key, that no client served two leases at once and that
+every client dropped by the pool was disconnected
+
+Usage:
+    python -m backend.benchmarks.client_isolation --keys 20 --queries 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from backend.agents import client_pool as client_pool_module
+from backend.agents.client_pool import AgentClientPool
+from backend.agents.llm_scheduler import llm_scheduler
+
+SERVER_KEY = "sk-ant-server-key"
+
+# Stands in for the SDK's final message of a response
+_RESULT = client_pool_module.ResultMessage.__new__(client_pool_module.ResultMessage)
+
+
+class FakeSDKClient:
+    """ClaudeSDKClient double that answers every prompt with the key in its options.env"""
+
+    live = set()
+    spawned = 0
+
+    def __init__(self, options):
+        self.env_key = (getattr(options, "env", None) or {}).get("ANTHROPIC_API_KEY")
+        self._transport = self  # PooledClient.is_healthy() checks _transport.is_ready()
+        self._prompt = None
+        self._latency = 0.0
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def connect(self):
+        await asyncio.sleep(0)
+        FakeSDKClient.spawned += 1
+        FakeSDKClient.live.add(self)
+
+    async def disconnect(self):
+        FakeSDKClient.live.discard(self)
+
+    async def query(self, prompt: str, session_id: str = "default"):
+        if self._prompt is not None:
+            raise AssertionError(f"client leased twice at once: {self._prompt!r} then {prompt!r}")
+        self._prompt = prompt
+        self._latency = random.uniform(0, 0.005)
+
+    async def receive_response(self):
+        prompt = self._prompt
+        await asyncio.sleep(self._latency)
+        yield {"env_key": self.env_key, "prompt": prompt}
+        await asyncio.sleep(self._latency)
+        self._prompt = None
+        yield _RESULT
+
+    receive_messages = receive_response
+
+    async def interrupt(self):
+        await asyncio.sleep(0)
+
+
+async def run_query(pool: AgentClientPool, api_key, prompt: str, stop_early: bool):
+    expected = api_key or SERVER_KEY
+    seen = None
+    async for message in pool.query(prompt, model="claude-fake", api_key=api_key):
+        if isinstance(message, dict):
+            seen = message
+            if stop_early:
+                break  # Like an evaluator whose decision object already closed
+    if seen is None or seen["prompt"] != prompt:
+        raise AssertionError(f"{prompt!r} got response {seen!r}")
+    if seen["env_key"] != expected:
+        raise AssertionError(f"{prompt!r} under key ...{expected[-4:]} ran on a client spawned with ...{str(seen['env_key'])[-4:]}")
+
+
+async def run(args) -> AgentClientPool:
+    client_pool_module.ClaudeSDKClient = FakeSDKClient
+    llm_scheduler.enabled = False  # Admission is not under test; let the whole load reach the pool
+    environ_key = os.environ.get("ANTHROPIC_API_KEY")
+
+    pool = AgentClientPool(
+        max_size=args.max_size,
+        max_key_pools=args.max_key_pools,
+        key_idle_ttl=args.key_idle_ttl,
+        lease_timeout=60.0
+    )
+    pool._api_key = SERVER_KEY
+    keys = [None] + [f"sk-ant-user-{index:03d}-key" for index in range(args.keys)]
+    rng = random.Random(args.seed)
+
+    queries = [
+        run_query(pool, rng.choice(keys), f"query-{index}", rng.random() < args.early_stop)
+        for index in range(args.queries)
+    ]
+    await asyncio.gather(*queries)
+
+    await asyncio.sleep(0.1)  # Let pending releases finish
+    pool._expire_idle_keys()
+    await asyncio.sleep(0)
+
+    if os.environ.get("ANTHROPIC_API_KEY") != environ_key:
+        raise AssertionError("os.environ['ANTHROPIC_API_KEY'] was modified")
+    idle = sum(len(profile_pool.idle) for profile_pool in pool._pools.values())
+    if len(FakeSDKClient.live) != idle:
+        raise AssertionError(f"{len(FakeSDKClient.live) - idle} clients left connected outside the pool")
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=20, help="Distinct BYOK keys (plus the server key)")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries started concurrently")
+    parser.add_argument("--max-size", type=int, default=8, help="Clients per key and profile")
+    parser.add_argument("--max-key-pools", type=int, default=8, help="Below --keys to exercise sub-pool eviction")
+    parser.add_argument("--key-idle-ttl", type=float, default=0.05)
+    parser.add_argument("--early-stop", type=float, default=0.3, help="Fraction of callers that stop reading early")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    started = time.perf_counter()
+    try:
+        pool = asyncio.run(run(args))
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    stats = pool.get_stats()
+    print(f"{args.queries} queries over {args.keys + 1} keys in {elapsed:.2f}s ({args.queries / elapsed:,.0f}/s)")
+    print(f"clients spawned: {FakeSDKClient.spawned}, still connected: {len(FakeSDKClient.live)}, "
+          f"sub-pools: {len(stats['profiles'])}, idle expirations: {stats['idle_expirations']}")
+    print("OK: every lease ran on a client spawned with its own key")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Prompt Encoding Benchmark
+Compares prompt size (characters and estimated tokens) and encoding latency
+of each encoding in prompt_encoding.ENCODINGS across the agent prompt builders
+
+Usage:
+    python -m backend.benchmarks.prompt_encoding --records 2000 --rounds 500
+"""
+import argparse
+import random
+import time
+
+from backend.agents.block_references import BLOCK_OUTPUTS_KEY
+from backend.agents.condition_evaluator import build_condition_prompt
+from backend.agents.loop_controller import build_loop_prompt
+from backend.agents.practice_insights import build_question_prompt, build_summary_prompt
+from backend.agents.practice_metrics import compute_practice_metrics
+from backend.agents.prompt_encoding import ENCODINGS, estimate_tokens
+from backend.models.workflow_context import LoopEvaluationRequest
+
+_SERVICES = ["Annual Checkup", "Lab Tests", "Follow-up Visit", "Vaccination", "Telehealth Consult"]
+_PROVIDERS = ["Dr. Wilson", "Dr. Chen", "Dr. Patel", "Dr. Garcia"]
+
+# The dashboard's demo payload (practice-data-fake.js)
+DASHBOARD_DATA = {
+    "current_period": {
+        "total_patients": 248, "new_patients": 42, "appointments_scheduled": 156, "appointments_completed": 142,
+        "appointments_cancelled": 14, "total_revenue": 89420, "patient_engagement": 85, "average_wait_time": 12,
+        "provider_utilization": 78, "no_show_rate": 5.2
+    },
+    "previous_period": {
+        "total_patients": 234, "new_patients": 38, "appointments_scheduled": 148, "appointments_completed": 135,
+        "appointments_cancelled": 13, "total_revenue": 82150, "patient_engagement": 81, "average_wait_time": 15,
+        "provider_utilization": 75, "no_show_rate": 6.1
+    },
+    "top_services": [
+        {"name": "Annual Checkup", "count": 45, "revenue": 22500},
+        {"name": "Lab Tests", "count": 62, "revenue": 18600},
+        {"name": "Follow-up Visit", "count": 38, "revenue": 11400}
+    ],
+    "peak_hours": ["9:00 AM - 11:00 AM", "2:00 PM - 4:00 PM"],
+    "provider_performance": [
+        {"name": "Dr. Wilson", "appointments": 78, "satisfaction": 4.8},
+        {"name": "Dr. Chen", "appointments": 64, "satisfaction": 4.9}
+    ]
+}
+
+
+def make_records(count: int, rng: random.Random):
+    """Raw appointment, visit and revenue records over two 30-day periods"""
+    appointments, visits, revenue = [], [], []
+    for index in range(count):
+        day = rng.randrange(60)
+        start = f"2025-{9 + day // 30:02d}-{day % 30 + 1:02d}T{rng.choice([8, 9, 10, 11, 13, 14, 15, 16]):02d}:{rng.choice(['00', '30'])}"
+        status = rng.choice(["completed"] * 8 + ["cancelled", "no_show"])
+        provider, service = rng.choice(_PROVIDERS), rng.choice(_SERVICES)
+        appointments.append({
+            "start": start, "status": status, "patient_id": f"patient-{rng.randrange(count // 3 + 1)}",
+            "provider": provider, "service": service, "new_patient": rng.random() < 0.1
+        })
+        if status == "completed":
+            visits.append({
+                "checked_in": start, "provider": provider, "wait_minutes": rng.randint(2, 30),
+                "satisfaction": rng.choice([4.0, 4.5, 5.0, None])
+            })
+            revenue.append({"date": start[:10], "amount": rng.choice([95.0, 150.0, 300.0]), "service": service})
+    return {
+        "appointments": appointments,
+        "visits": visits,
+        "revenue": revenue,
+        "current_period": {"patient_engagement": 85, "provider_utilization": 78},
+        "previous_period": {"patient_engagement": 81, "provider_utilization": 75}
+    }
+
+
+def make_context(blocks: int, rng: random.Random):
+    """A sliced evaluator context: patient fields plus referenced block outputs"""
+    outputs = {
+        f"block-{index}": {
+            "status": rng.choice(["completed", "pending", "payment_complete"]),
+            "message": rng.choice(["Reminder sent", "Patient confirmed", None]),
+            "items": [{"code": f"CPT-{rng.randrange(99000)}", "units": rng.randint(1, 3), "note": ""} for _ in range(3)],
+            "attempts": rng.randint(0, 4)
+        }
+        for index in range(blocks)
+    }
+    return {
+        "patient": {"patient_id": "patient-17", "age": 54, "conditions": ["hypertension", "type 2 diabetes"], "email": None},
+        BLOCK_OUTPUTS_KEY: outputs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=2000, help="Raw appointment records for the record-based metrics")
+    parser.add_argument("--blocks", type=int, default=6, help="Block outputs in the evaluator context")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    dashboard_metrics = compute_practice_metrics(DASHBOARD_DATA)
+    record_metrics = compute_practice_metrics(make_records(args.records, rng))
+    context = make_context(args.blocks, rng)
+    loop_request = LoopEvaluationRequest(
+        continue_rule="@@block-0.status is pending",
+        break_rule="@@block-0.status is payment_complete",
+        workflow_context=context,
+        iteration_count=2,
+        instance_id="benchmark"
+    )
+
+    builders = {
+        "insights summary (dashboard)": lambda encode: build_summary_prompt(dashboard_metrics, encode),
+        "insights summary (records)": lambda encode: build_summary_prompt(record_metrics, encode),
+        "practice question": lambda encode: build_question_prompt("Why did wait times go up?", record_metrics, encode),
+        "condition evaluation": lambda encode: build_condition_prompt("@@block-0.status is payment_complete", context, encode),
+        "loop evaluation": lambda encode: build_loop_prompt(loop_request, context, encode),
+    }
+
+    print(f"{'prompt':<30} {'encoding':<14} {'chars':>7} {'~tokens':>8} {'vs indent':>10} {'build us':>9}")
+    for name, build in builders.items():
+        baseline = None
+        for encoding, encode in ENCODINGS.items():
+            prompt = build(encode)
+            tokens = estimate_tokens(prompt)
+            baseline = baseline or tokens
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                build(encode)
+            elapsed = (time.perf_counter() - started) / args.rounds
+            print(
+                f"{name:<30} {encoding:<14} {len(prompt):>7} {tokens:>8} "
+                f"{(tokens - baseline) / baseline:>+10.1%} {elapsed * 1e6:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ Supports three key sources:
 2. Company keys (stored in api_keys.json, for production)
 3. User-provided keys (passed at runtime by end users - BYOK)
 """
+import hashlib
 import json
 import os
 from typing import Optional, Dict, Any
@@ -154,6 +155,17 @@ class APIKeyManager:
 
         return True
 
+    def get_key_fingerprint(self, api_key: Optional[str]) -> str:
+        """
+        Stable, non-reversible identifier for an API key
+
+        Used to key per-key resources (clients, rate limits) without keeping
+        the raw key around as a dictionary key or in logs.
+        """
+        if not api_key:
+            return "none"
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
     def get_usage_limits(self) -> Dict[str, Any]:
         """Get configured usage limits"""
         config = self._load_keys_config()
@@ -33,6 +33,82 @@ class Settings(BaseSettings):
     max_conversation_history: int = 50  # Maximum messages to keep in memory
     stream_timeout: int = 120  # seconds
 
+    # Workflow Generator Sessions (one per WebSocket client)
+    generator_max_sessions: int = 500
+    generator_session_idle_ttl: int = 1800  # seconds
+    generator_sessions_max_memory_mb: int = 64
+
+    # Agent Client Pool (warm Claude SDK sessions)
+    agent_pool_enabled: bool = True
+    agent_pool_warm_size: int = 2  # Clients pre-spawned per model
+    agent_pool_max_size: int = 8  # Max concurrent clients per model
+    agent_pool_max_uses: int = 50  # Recycle a client after this many requests
+    agent_pool_lease_timeout: float = 30.0  # seconds
+    agent_pool_max_keys: int = 64  # Distinct API key/profile sub-pools kept alive
+    agent_pool_key_idle_ttl: float = 300.0  # seconds before an idle BYOK client is disconnected
+
+    # LLM Scheduler (rate limits from api_keys.json usage_limits, applied per API key)
+    llm_scheduler_enabled: bool = True
+    llm_scheduler_max_concurrency: int = 16  # Agent calls in flight across all keys
+    llm_scheduler_burst: int = 10  # Requests a key may send back to back before its per-minute rate applies
+    llm_scheduler_max_wait: float = 60.0  # seconds a request may queue before it is rejected
+
+    # Admission Control (/api/practice-insights, /api/practice-ask, /ws/workflow-chat)
+    admission_control_enabled: bool = True
+    admission_max_pending: int = 48  # LLM calls in flight or queued before new requests are shed
+    admission_max_queue_wait: float = 20.0  # seconds of estimated queue wait before new requests are shed
+
+    # Agent call resilience (deadline per call is stream_timeout)
+    circuit_breaker_failure_threshold: int = 5  # Consecutive failed or slow calls before a model's circuit opens
+    circuit_breaker_slow_call_seconds: float = 30.0  # A first message slower than this counts as a failure
+    circuit_breaker_open_seconds: float = 30.0  # Calls fail fast this long before a probe is let through
+    hedge_condition_evaluations: bool = True
+    hedge_percentile: float = 0.95  # Start a duplicate evaluation once the first is slower than this latency percentile
+    hedge_min_samples: int = 20  # Evaluations observed per tier before hedging starts
+    hedge_min_delay: float = 0.5  # seconds
+
+    # Practice Insights Cache (/api/practice-insights)
+    practice_insights_cache_db_path: str = "./data/practice_insights_cache.db"
+    practice_insights_cache_max_entries: int = 1000
+    practice_insights_cache_max_mb: int = 16  # In-memory portion
+    practice_insights_cache_ttl: int = 604800  # 1 week in seconds
+
+    # Batch Evaluation (/api/evaluate-conditions, /api/evaluate-loops)
+    batch_evaluation_concurrency: int = 8  # Default in-flight evaluations per batch
+    batch_evaluation_max_concurrency: int = 32  # Upper bound a caller may request
+    batch_evaluation_max_items: int = 1000
+
+    # Decision Cache (condition/loop evaluations)
+    decision_cache_max_entries: int = 10000
+    decision_cache_max_mb: int = 16
+    decision_cache_ttl: int = 300  # seconds
+
+    # Evaluator model routing (fast model first, escalate to the configured model)
+    evaluator_routing_enabled: bool = True
+    evaluator_fast_model: str = "claude-haiku-4-5"
+    evaluator_escalation_confidence: float = 0.75  # Escalate below this confidence
+
+    # Evaluator prompt context
+    evaluator_context_token_budget: int = 2000  # Approximate tokens of workflow context per prompt
+
+    # Workflow Engine
+    workflow_engine_plan_cache_size: int = 1024  # Compiled workflow definitions kept in memory
+    workflow_engine_max_finished_instances: int = 10000  # Completed/failed instances kept for lookup
+    workflow_engine_retain_block_outputs: bool = False  # Audit retention: keep every block output in memory
+
+    # Durable Timer Wheel (wait blocks)
+    timer_wheel_db_path: str = "./data/workflow_timers.db"
+    timer_wheel_tick: float = 1.0  # seconds
+    timer_wheel_horizon: int = 3600  # seconds of upcoming timers held in memory
+    timer_wheel_batch_size: int = 500  # Timers fired per callback batch
+    timer_wheel_max_loaded: int = 100000  # Upper bound on in-memory timers
+
+    # Workflow Instance Store
+    instance_store_db_path: str = "./data/workflow_instances.db"
+    instance_store_flush_interval: float = 0.05  # seconds between group commits
+    instance_store_max_batch: int = 500  # Dirty instances that trigger an early commit
+    instance_store_snapshot_interval: float = 5.0  # seconds between context_data snapshots per instance
+
     # Healthcare Configuration
     enable_hipaa_logging: bool = True
     audit_log_path: str = "./logs/audit.log"
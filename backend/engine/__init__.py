@@ -0,0 +1,3 @@
+"""Workflow execution runtime"""
+from backend.engine.workflow_engine import workflow_engine
+from backend.engine.trigger_router import trigger_router
@@ -0,0 +1,544 @@
+"""
+Workflow Instance Store
+SQLite-backed persistence for WorkflowInstances
+
+Instance headers (status, trigger, current block) live in one row per
+instance, indexed by workflow_id and patient_id. execution_history is an
+append-only table keyed by (instance_id, execution_order): only executions
+are serialized when the instance is saved, so compacting an output in memory
+afterwards never reaches the table, and only new executions are inserted. context_data is written as a JSON
+blob at most once per ``snapshot_interval`` seconds per instance, and always
+when the instance stops running.
+
+Until an instance finishes, its header also carries the engine's scheduling
+state (unresolved edges, parked blocks, loop iterations), and every workflow
+definition an instance ran is kept by (workflow_id, version). Together they
+let a new process rebuild the runs of instances that were still waiting,
+escalated or running (see load_active). The definitions registered with the
+trigger router are recorded there as well, so a new process can index them
+again (see load_registered).
+
+The engine only marks instances dirty; a background task group-commits every
+dirty instance in a single transaction each ``flush_interval`` seconds (or as
+soon as ``max_batch`` instances are pending). Reads go through their own
+connection, which WAL mode lets run alongside a commit, so lookups do not
+queue behind writes.
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from backend.config.settings import settings
+from backend.models.workflow_context import BlockExecution, ExecutionStatus, WorkflowDefinition, WorkflowInstance
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workflow_instances (
+    instance_id TEXT PRIMARY KEY,
+    workflow_id TEXT NOT NULL,
+    workflow_type TEXT NOT NULL,
+    patient_id TEXT,
+    status TEXT NOT NULL,
+    triggered_by TEXT NOT NULL,
+    current_block_id TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    history_length INTEGER NOT NULL DEFAULT 0,
+    context_data BLOB,
+    context_snapshot_at TEXT,
+    run_state TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_workflow_instances_workflow ON workflow_instances (workflow_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_workflow_instances_patient ON workflow_instances (patient_id, updated_at);
+CREATE TABLE IF NOT EXISTS workflow_execution_history (
+    instance_id TEXT NOT NULL,
+    execution_order INTEGER NOT NULL,
+    block_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    execution TEXT NOT NULL,
+    PRIMARY KEY (instance_id, execution_order)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workflow_definitions (
+    workflow_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    PRIMARY KEY (workflow_id, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS registered_workflows (
+    workflow_id TEXT PRIMARY KEY,
+    version TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Columns added after the first release, created on open for older databases
+_ADDED_COLUMNS = {"run_state": "TEXT"}
+
+_HEADER_COLUMNS = (
+    "instance_id, workflow_id, workflow_type, patient_id, status, triggered_by, "
+    "current_block_id, created_at, updated_at, history_length"
+)
+
+# Instances in these states have stopped running; their context is snapshotted immediately
+_SETTLED_STATUSES = {ExecutionStatus.COMPLETED, ExecutionStatus.FAILED, ExecutionStatus.WAITING, ExecutionStatus.ESCALATED}
+_TERMINAL_STATUSES = {ExecutionStatus.COMPLETED, ExecutionStatus.FAILED}
+
+# Engine scheduling state of a running instance, or None once it has finished
+RunState = Callable[[], Optional[Dict[str, Any]]]
+
+
+class _InstanceWrite(NamedTuple):
+    """Serialized changes of one instance, taken on the event loop and written by the flush thread"""
+    header: Tuple[Any, ...]
+    history: List[Tuple[str, int, str, str, str]]
+    context: Optional[Tuple[bytes, str]]  # (blob, snapshot time) when due
+    run_state: Optional[str]
+
+
+class RecoveredRun(NamedTuple):
+    """A non-terminal instance with what the engine needs to continue it"""
+    instance: WorkflowInstance
+    run_state: Dict[str, Any]
+    definition: WorkflowDefinition
+
+
+class InstanceStore:
+    """
+    Persistent WorkflowInstance storage.
+
+    Usage:
+        await instance_store.start()
+        instance_store.save(instance, run_state)  # after every change; cheap, written on the next flush
+        instance = await instance_store.load(instance_id)
+        runs = await instance_store.load_active()  # on startup
+        definitions = await instance_store.load_registered()  # on startup
+    """
+
+    def __init__(self, db_path: str, flush_interval: float, max_batch: int, snapshot_interval: float):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.snapshot_interval = snapshot_interval
+
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._dirty: Dict[str, WorkflowInstance] = {}
+        self._pending_history: Dict[str, List[Tuple[str, int, str, str, str]]] = {}  # instance_id -> serialized, unwritten rows
+        self._serialized_history: Dict[str, int] = {}  # instance_id -> executions already serialized
+        self._snapshot_at: Dict[str, float] = {}  # instance_id -> monotonic time of the last context snapshot
+        self._run_states: Dict[str, RunState] = {}
+        self._pending_definitions: Dict[Tuple[str, str], str] = {}  # (workflow_id, version) -> JSON
+        self._saved_definitions: Set[Tuple[str, str]] = set()
+        self._registration_lock = asyncio.Lock()  # Registrations reach the database in call order
+        self._flush_now = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.saves = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.snapshots = 0
+        self.flush_errors = 0
+        self.loads = 0
+        self.recovered = 0
+        self.flush_time = 0.0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        if self._task is not None:
+            return
+        await asyncio.to_thread(self._open)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Instance store opened at {self.db_path}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writer is not None:
+            await self.flush()
+            await asyncio.to_thread(self._close)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def save_definition(self, definition: WorkflowDefinition):
+        """Keep a definition an instance runs, so the instance can be recovered; written once per version"""
+        key = (definition.workflow_id, definition.updated_at.isoformat())
+        if key not in self._saved_definitions:
+            self._saved_definitions.add(key)
+            self._pending_definitions[key] = definition.model_dump_json()
+
+    async def register_definition(self, definition: WorkflowDefinition):
+        """Record definition as the one its workflow is triggered by; written immediately"""
+        if self._writer is None:
+            return
+        key = (definition.workflow_id, definition.updated_at.isoformat())
+        async with self._registration_lock:
+            await asyncio.to_thread(self._write_registration, key, definition.model_dump_json())
+        self._saved_definitions.add(key)
+
+    async def unregister_definition(self, workflow_id: str):
+        """Forget the workflow's registration (the definitions its instances ran are kept)"""
+        if self._writer is None:
+            return
+        async with self._registration_lock:
+            await asyncio.to_thread(self._delete_registration, workflow_id)
+
+    def save(self, instance: WorkflowInstance, run_state: Optional[RunState] = None):
+        """
+        Queue the instance's current state for the next group commit; new executions are serialized now.
+
+        Args:
+            run_state: Called at flush time for the engine's scheduling state
+        """
+        instance_id = instance.instance_id
+        self._dirty[instance_id] = instance
+        if run_state is not None:
+            self._run_states[instance_id] = run_state
+        history = instance.execution_history
+        serialized = self._serialized_history.get(instance_id, 0)
+        if serialized < len(history):
+            self._pending_history.setdefault(instance_id, []).extend(
+                (instance_id, execution.execution_order, execution.block_id, execution.status.value, execution.model_dump_json())
+                for execution in history[serialized:]
+            )
+            self._serialized_history[instance_id] = len(history)
+        self.saves += 1
+        if len(self._dirty) >= self.max_batch:
+            self._flush_now.set()
+
+    async def flush(self):
+        """Write every queued instance in one transaction"""
+        if not self._dirty or self._writer is None:
+            return
+        dirty, self._dirty = self._dirty, {}
+        pending, self._pending_history = self._pending_history, {}
+        definitions, self._pending_definitions = self._pending_definitions, {}
+        writes = [self._serialize(instance, pending.get(instance_id, [])) for instance_id, instance in dirty.items()]
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, writes, definitions)
+        except Exception:
+            self.flush_errors += 1
+            self._pending_definitions = {**definitions, **self._pending_definitions}
+            # Retry on the next flush, ahead of anything saved in the meantime
+            for instance_id, instance in dirty.items():
+                self._dirty.setdefault(instance_id, instance)
+                self._snapshot_at.pop(instance_id, None)
+            for instance_id, rows in pending.items():
+                self._pending_history[instance_id] = rows + self._pending_history.get(instance_id, [])
+            raise
+
+        self.flushes += 1
+        self.flush_time += time.perf_counter() - started
+        for instance_id, instance in dirty.items():
+            if instance.status in _TERMINAL_STATUSES and instance_id not in self._dirty:
+                # Finished: nothing will be appended again
+                self._serialized_history.pop(instance_id, None)
+                self._snapshot_at.pop(instance_id, None)
+                self._run_states.pop(instance_id, None)
+
+    def _serialize(self, instance: WorkflowInstance, rows: List[Tuple[str, int, str, str, str]]) -> _InstanceWrite:
+        instance_id = instance.instance_id
+        header = (
+            instance_id,
+            instance.workflow_id,
+            instance.workflow_type.value,
+            instance.patient_id,
+            instance.status.value,
+            json.dumps(instance.triggered_by, default=str),
+            instance.current_block_id,
+            instance.created_at.isoformat(),
+            instance.updated_at.isoformat(),
+            self._serialized_history.get(instance_id, len(instance.execution_history)),
+        )
+
+        context = None
+        now = time.monotonic()
+        last_snapshot = self._snapshot_at.get(instance_id)
+        if last_snapshot is None or now - last_snapshot >= self.snapshot_interval or instance.status in _SETTLED_STATUSES:
+            self._snapshot_at[instance_id] = now
+            context = (json.dumps(instance.context_data, default=str).encode(), datetime.now().isoformat())
+            self.snapshots += 1
+
+        run_state = None
+        state = self._run_states.get(instance_id)
+        if state is not None and instance.status not in _TERMINAL_STATUSES:
+            snapshot = state()
+            run_state = json.dumps(snapshot, separators=(",", ":")) if snapshot is not None else None
+        return _InstanceWrite(header, rows, context, run_state)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Instance store flush failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    async def load(self, instance_id: str, include_history: bool = True) -> Optional[WorkflowInstance]:
+        """Instance as of the last flush (or its queued state if it has not been flushed yet)"""
+        pending = self._dirty.get(instance_id)
+        if pending is not None:
+            return pending
+        if self._reader is None:
+            return None
+        self.loads += 1
+        return await asyncio.to_thread(self._load, instance_id, include_history)
+
+    async def load_active(self) -> List[RecoveredRun]:
+        """
+        Every instance that had not finished when it was last flushed, with its
+        scheduling state and definition (instances saved without them are skipped)
+        """
+        if self._reader is None:
+            return []
+        runs = await asyncio.to_thread(self._load_active)
+        for run in runs:
+            instance_id = run.instance.instance_id
+            # Its history is on disk already; only executions added from now on are new
+            self._serialized_history[instance_id] = len(run.instance.execution_history)
+            self._snapshot_at[instance_id] = time.monotonic()
+        self.recovered += len(runs)
+        return runs
+
+    async def load_registered(self) -> List[WorkflowDefinition]:
+        """Definitions registered for triggering when the last process stopped"""
+        if self._reader is None:
+            return []
+        return await asyncio.to_thread(self._load_registered)
+
+    async def find(
+        self,
+        workflow_id: Optional[str] = None,
+        patient_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Most recently updated instance headers (no history or context) matching the filters"""
+        if self._reader is None:
+            return []
+        return await asyncio.to_thread(self._find, workflow_id, patient_id, status, limit)
+
+    # ------------------------------------------------------------------
+    # SQLite (runs in a worker thread)
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        columns = {row[1] for row in self._writer.execute("PRAGMA table_info(workflow_instances)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in columns:
+                self._writer.execute(f"ALTER TABLE workflow_instances ADD COLUMN {column} {column_type}")
+        self._writer.commit()
+        # A private in-memory database is per connection, so reads share the writer there
+        self._reader = self._writer if self.db_path == ":memory:" else self._connect()
+        if self._reader is self._writer:
+            self._read_lock = self._write_lock
+
+    def _close(self):
+        if self._reader is not None and self._reader is not self._writer:
+            self._reader.close()
+        self._writer.close()
+        self._reader = self._writer = None
+
+    def _write(self, writes: List[_InstanceWrite], definitions: Dict[Tuple[str, str], str]):
+        headers = [(*write.header, write.run_state) for write in writes]
+        history = [row for write in writes for row in write.history]
+        contexts = [(*write.context, write.header[0]) for write in writes if write.context is not None]
+        with self._write_lock, self._writer:
+            if definitions:
+                self._writer.executemany(
+                    "INSERT OR IGNORE INTO workflow_definitions (workflow_id, version, definition) VALUES (?, ?, ?)",
+                    [(workflow_id, version, definition) for (workflow_id, version), definition in definitions.items()]
+                )
+            self._writer.executemany(
+                f"INSERT INTO workflow_instances ({_HEADER_COLUMNS}, run_state) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(instance_id) DO UPDATE SET status = excluded.status, current_block_id = excluded.current_block_id, "
+                "updated_at = excluded.updated_at, history_length = excluded.history_length, run_state = excluded.run_state",
+                headers
+            )
+            if history:
+                # OR IGNORE keeps the table append-only when a failed flush is retried
+                self._writer.executemany(
+                    "INSERT OR IGNORE INTO workflow_execution_history (instance_id, execution_order, block_id, status, execution) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    history
+                )
+            if contexts:
+                self._writer.executemany(
+                    "UPDATE workflow_instances SET context_data = ?, context_snapshot_at = ? WHERE instance_id = ?",
+                    contexts
+                )
+        self.rows_written += len(headers) + len(history) + len(definitions)
+
+    def _write_registration(self, key: Tuple[str, str], definition: str):
+        with self._write_lock, self._writer:
+            self._writer.execute(
+                "INSERT OR IGNORE INTO workflow_definitions (workflow_id, version, definition) VALUES (?, ?, ?)",
+                (*key, definition)
+            )
+            self._writer.execute("INSERT OR REPLACE INTO registered_workflows (workflow_id, version) VALUES (?, ?)", key)
+        self.rows_written += 2
+
+    def _delete_registration(self, workflow_id: str):
+        with self._write_lock, self._writer:
+            self._writer.execute("DELETE FROM registered_workflows WHERE workflow_id = ?", (workflow_id,))
+
+    def _load_registered(self) -> List[WorkflowDefinition]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT d.definition FROM registered_workflows AS r "
+                "JOIN workflow_definitions AS d ON d.workflow_id = r.workflow_id AND d.version = r.version"
+            ).fetchall()
+        return [WorkflowDefinition.model_validate_json(definition) for (definition,) in rows]
+
+    def _load(self, instance_id: str, include_history: bool) -> Optional[WorkflowInstance]:
+        with self._read_lock:
+            row = self._reader.execute(
+                f"SELECT {_HEADER_COLUMNS}, context_data FROM workflow_instances WHERE instance_id = ?",
+                (instance_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            executions = self._reader.execute(
+                "SELECT execution FROM workflow_execution_history WHERE instance_id = ? ORDER BY execution_order",
+                (instance_id,)
+            ).fetchall() if include_history else []
+        return self._instance(row, executions)
+
+    def _load_active(self) -> List[RecoveredRun]:
+        terminal = [status.value for status in _TERMINAL_STATUSES]
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT {_HEADER_COLUMNS}, context_data, run_state, ("
+                "SELECT definition FROM workflow_definitions AS d "
+                "WHERE d.workflow_id = workflow_instances.workflow_id AND d.version = json_extract(run_state, '$.definition_version')"
+                f") FROM workflow_instances WHERE run_state IS NOT NULL AND status NOT IN ({', '.join('?' for _ in terminal)})",
+                terminal
+            ).fetchall()
+            runs = []
+            for row in rows:
+                if row[12] is None:
+                    logger.error(f"Cannot recover workflow instance {row[0]}: its workflow definition was not stored")
+                    continue
+                executions = self._reader.execute(
+                    "SELECT execution FROM workflow_execution_history WHERE instance_id = ? ORDER BY execution_order",
+                    (row[0],)
+                ).fetchall()
+                runs.append(RecoveredRun(
+                    self._instance(row, executions),
+                    json.loads(row[11]),
+                    WorkflowDefinition.model_validate_json(row[12])
+                ))
+        return runs
+
+    def _instance(self, row: Tuple[Any, ...], executions: List[Tuple[str]]) -> WorkflowInstance:
+        """WorkflowInstance from a header row selected with context_data, plus its serialized executions"""
+        header = self._header(row)
+        header.pop("history_length")
+        instance = WorkflowInstance(**header, context_data=json.loads(row[10]) if row[10] else {})
+        instance.execution_history = [BlockExecution.model_validate_json(execution) for (execution,) in executions]
+        return instance
+
+    def _find(
+        self,
+        workflow_id: Optional[str],
+        patient_id: Optional[str],
+        status: Optional[ExecutionStatus],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for column, value in (("workflow_id", workflow_id), ("patient_id", patient_id), ("status", status.value if status else None)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT {_HEADER_COLUMNS} FROM workflow_instances {where} ORDER BY updated_at DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [self._header(row) for row in rows]
+
+    @staticmethod
+    def _header(row: Tuple[Any, ...]) -> Dict[str, Any]:
+        return {
+            "instance_id": row[0],
+            "workflow_id": row[1],
+            "workflow_type": row[2],
+            "patient_id": row[3],
+            "status": row[4],
+            "triggered_by": json.loads(row[5]),
+            "current_block_id": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+            "history_length": row[9],
+        }
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending_instances": len(self._dirty),
+            "saves": self.saves,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "context_snapshots": self.snapshots,
+            "flush_errors": self.flush_errors,
+            "loads": self.loads,
+            "recovered": self.recovered,
+            "avg_flush_ms": round(self.flush_time / self.flushes * 1000, 3) if self.flushes else 0.0
+        }
+
+
+# Global instance
+instance_store = InstanceStore(
+    db_path=settings.instance_store_db_path,
+    flush_interval=settings.instance_store_flush_interval,
+    max_batch=settings.instance_store_max_batch,
+    snapshot_interval=settings.instance_store_snapshot_interval
+)
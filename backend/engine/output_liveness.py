@@ -0,0 +1,112 @@
+"""
+Output Liveness
+Static analysis of which blocks can still read a block's output
+
+A block consumes another block's output when any text in its settings holds an
+@@block-id reference (condition paths, loop instructions, ai-touch prompts,
+message templates) or, for ai-touch blocks, when the producer is within its
+"contextSteps" ("previous-N" / "previous-all") predecessors. Only consumers
+downstream of the producer count.
+
+Each consumer maps to a release point: the consumer itself, or the outermost
+loop that encloses the consumer but not the producer, since the consumer can
+run again on every pass of such a loop. Once every release point of a
+producer has run (or been skipped) after the producer's latest execution, no
+@@ reference can reach that output any more.
+"""
+from collections import deque
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set
+import re
+
+from backend.agents.block_references import parse_block_references
+from backend.models.workflow_context import BlockType
+
+_CONTEXT_STEPS_PATTERN = re.compile(r"previous-(\d+|all)")
+
+
+def _strings(value: Any) -> Iterator[str]:
+    """Every string nested in a block's settings"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+
+
+class OutputLiveness:
+    """
+    Release points per producer block, computed once per ExecutionPlan.
+
+    Attributes:
+        consumers: producer -> downstream blocks that read its output
+        release_points: producer -> blocks whose completion (or loop exit) ends the output's life
+        released_by: release point -> producers it may release
+    """
+
+    def __init__(self, plan):
+        self.consumers: Dict[str, Set[str]] = {block_id: set() for block_id in plan.blocks}
+        for block_id, config in plan.settings.items():
+            for producer in parse_block_references(*_strings(config)):
+                if producer in plan.blocks and producer != block_id:
+                    self.consumers[producer].add(block_id)
+            if plan.block_type(block_id) == BlockType.AI_TOUCH.value:
+                for producer in self._context_steps(plan, block_id, config.get("contextSteps")):
+                    self.consumers[producer].add(block_id)
+
+        self.release_points: Dict[str, FrozenSet[str]] = {}
+        self.released_by: Dict[str, List[str]] = {}
+        for producer, consumers in self.consumers.items():
+            downstream = self._downstream(plan, producer)
+            points = frozenset(
+                self._release_point(plan, producer, consumer)
+                for consumer in consumers if consumer in downstream
+            )
+            self.release_points[producer] = points
+            for point in points:
+                self.released_by.setdefault(point, []).append(producer)
+
+    @staticmethod
+    def _context_steps(plan, block_id: str, steps: Optional[str]) -> Set[str]:
+        """Predecessors within an ai-touch block's contextSteps"""
+        match = _CONTEXT_STEPS_PATTERN.fullmatch(steps or "")
+        if match is None:
+            return set()
+        depth = None if match.group(1) == "all" else int(match.group(1))
+        found: Set[str] = set()
+        frontier = deque([(block_id, 0)])
+        while frontier:
+            current, distance = frontier.popleft()
+            if depth is not None and distance >= depth:
+                continue
+            for source in plan.predecessors[current]:
+                if source not in found and source != block_id:
+                    found.add(source)
+                    frontier.append((source, distance + 1))
+        return found
+
+    @staticmethod
+    def _downstream(plan, producer: str) -> Set[str]:
+        """Blocks reachable from producer, through back edges too"""
+        seen = {producer}
+        stack = [producer]
+        while stack:
+            for target in plan.successors[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+    @staticmethod
+    def _release_point(plan, producer: str, consumer: str) -> str:
+        enclosing = [
+            loop_id for loop_id, body in plan.loop_bodies.items()
+            if consumer in body and producer not in body and producer != loop_id
+        ]
+        if not enclosing:
+            return consumer
+        # Loop bodies nest, so the outermost enclosing loop has the largest body
+        return max(enclosing, key=lambda loop_id: len(plan.loop_bodies[loop_id]))
+
@@ -0,0 +1,370 @@
+"""
+Durable Timer Wheel
+SQLite-backed hierarchical timing wheel for wait blocks
+
+Every pending wait is a row in a local SQLite table, so due times survive
+restarts. Only timers due within the next ``horizon`` seconds are held in the
+in-memory wheel (capped at ``max_loaded``); later ones stay on disk and are
+paged in as the horizon advances, which keeps memory bounded with millions of
+parked instances. Schedule, cancel and reschedule are O(1) on the wheel; their
+SQLite writes are coalesced and flushed once per tick in a single transaction.
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workflow_timers (
+    timer_id TEXT PRIMARY KEY,
+    instance_id TEXT NOT NULL,
+    block_id TEXT NOT NULL,
+    due_at REAL NOT NULL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_workflow_timers_due ON workflow_timers (due_at, timer_id);
+"""
+
+
+class TimerEntry(NamedTuple):
+    """A pending wait"""
+    timer_id: str
+    instance_id: str
+    block_id: str
+    due_at: float  # Unix timestamp
+    payload: Optional[Dict[str, Any]]
+
+
+# Returns the timer_ids it could not deliver; those stay on disk for a later process
+TimerCallback = Callable[[List[TimerEntry]], Awaitable[Optional[Iterable[str]]]]
+
+
+def make_timer_id(instance_id: str, block_id: str) -> str:
+    return f"{instance_id}:{block_id}"
+
+
+class HierarchicalTimingWheel:
+    """
+    In-memory hierarchical timing wheel.
+
+    Level L has ``slots`` buckets, each ``slots ** L`` ticks wide. A timer is
+    placed on the lowest level whose span covers its delay and cascades down
+    a level each time the wheel reaches its bucket, so add/remove are O(1) and
+    advancing costs O(ticks + expired timers).
+    """
+
+    def __init__(self, tick: float, start: float, slots: int = 64, levels: int = 4):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.current_tick = int(start // tick)
+        self._buckets: List[List[Dict[str, TimerEntry]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._overdue: Dict[str, TimerEntry] = {}
+        self._positions: Dict[str, Tuple[int, int]] = {}  # timer_id -> (level, slot); level -1 is overdue
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, timer_id: str) -> bool:
+        return timer_id in self._positions
+
+    def add(self, entry: TimerEntry):
+        self.remove(entry.timer_id)
+        due_tick = math.ceil(entry.due_at / self.tick)
+        delta = due_tick - self.current_tick
+        if delta <= 0:
+            self._overdue[entry.timer_id] = entry
+            self._positions[entry.timer_id] = (-1, 0)
+            return
+
+        level = 0
+        while level < self.levels - 1 and delta >= self.slots ** (level + 1):
+            level += 1
+        # Beyond the top level's span: park in the furthest top-level bucket and re-cascade later
+        due_tick = min(due_tick, self.current_tick + self.slots ** self.levels - 1)
+        slot = (due_tick // self.slots ** level) % self.slots
+        self._buckets[level][slot][entry.timer_id] = entry
+        self._positions[entry.timer_id] = (level, slot)
+
+    def remove(self, timer_id: str) -> Optional[TimerEntry]:
+        position = self._positions.pop(timer_id, None)
+        if position is None:
+            return None
+        level, slot = position
+        if level == -1:
+            return self._overdue.pop(timer_id)
+        return self._buckets[level][slot].pop(timer_id)
+
+    def advance(self, now: float) -> List[TimerEntry]:
+        """Move the wheel to now and return every timer that became due"""
+        expired = list(self._overdue.values())
+        for entry in expired:
+            del self._positions[entry.timer_id]
+        self._overdue.clear()
+
+        target_tick = int(now // self.tick)
+        while self.current_tick < target_tick:
+            self.current_tick += 1
+            # Cascade higher levels whose bucket starts at this tick, top-down
+            for level in range(self.levels - 1, 0, -1):
+                width = self.slots ** level
+                if self.current_tick % width == 0:
+                    bucket = self._buckets[level][(self.current_tick // width) % self.slots]
+                    entries = list(bucket.values())
+                    bucket.clear()
+                    for entry in entries:
+                        del self._positions[entry.timer_id]
+                        self.add(entry)
+
+            bucket = self._buckets[0][self.current_tick % self.slots]
+            for entry in bucket.values():
+                del self._positions[entry.timer_id]
+            expired.extend(bucket.values())
+            bucket.clear()
+
+        # Cascaded timers that were already due
+        expired.extend(self._overdue.values())
+        for timer_id in self._overdue:
+            del self._positions[timer_id]
+        self._overdue.clear()
+        return expired
+
+
+class DurableTimerWheel:
+    """
+    Persistent timers for wait blocks.
+
+    Usage:
+        await timer_wheel.start(on_due)  # on_due(List[TimerEntry]) is awaited per batch
+        timer_wheel.schedule(instance_id, block_id, due_at=time.time() + 3600)
+        timer_wheel.cancel(instance_id, block_id)
+
+    Delivery is at-least-once: a timer is deleted from SQLite only after its
+    batch callback returns, so a crash mid-batch re-fires it on restart. Timers
+    the callback reports as undelivered are dropped from the wheel but kept in
+    SQLite, so the next process loads them again.
+    """
+
+    def __init__(self, db_path: str, tick: float, horizon: float, batch_size: int, max_loaded: int):
+        self.db_path = db_path
+        self.tick = tick
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.max_loaded = max_loaded
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._wheel = HierarchicalTimingWheel(tick, time.time())
+        # Everything due at or before this (due_at, timer_id) watermark is loaded in the wheel
+        self._loaded_until: Tuple[float, str] = (0.0, "")
+        self._pending_writes: Dict[str, Optional[TimerEntry]] = {}  # timer_id -> upsert entry, or None to delete
+        self._callback: Optional[TimerCallback] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.cancelled = 0
+        self.fired = 0
+        self.undelivered = 0
+        self.flushes = 0
+        self.callback_errors = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self, callback: TimerCallback):
+        """Open the database, load the first horizon of timers and start ticking"""
+        if self._task is not None:
+            return
+        self._callback = callback
+        self._wheel = HierarchicalTimingWheel(self.tick, time.time())
+        await asyncio.to_thread(self._open)
+        await self._refill()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Timer wheel started ({await asyncio.to_thread(self._count_pending)} pending waits)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._flush()
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def schedule(self, instance_id: str, block_id: str, due_at: float, payload: Optional[Dict[str, Any]] = None) -> str:
+        """Schedule (or reschedule) the wait of block_id in instance_id; due_at is a Unix timestamp"""
+        timer_id = make_timer_id(instance_id, block_id)
+        entry = TimerEntry(timer_id, instance_id, block_id, due_at, payload)
+        self._pending_writes[timer_id] = entry
+        if (due_at, timer_id) <= self._loaded_until:
+            self._wheel.add(entry)
+        else:
+            self._wheel.remove(timer_id)  # Rescheduled past the horizon: paged in again later
+        self.scheduled += 1
+        return timer_id
+
+    def reschedule(self, instance_id: str, block_id: str, due_at: float, payload: Optional[Dict[str, Any]] = None) -> str:
+        return self.schedule(instance_id, block_id, due_at, payload)
+
+    def cancel(self, instance_id: str, block_id: str) -> bool:
+        timer_id = make_timer_id(instance_id, block_id)
+        loaded = self._wheel.remove(timer_id) is not None
+        self._pending_writes[timer_id] = None
+        self.cancelled += 1
+        return loaded
+
+    # ------------------------------------------------------------------
+    # Tick loop
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self._flush()
+                now = time.time()
+                if self._loaded_until[0] < now + self.horizon / 2:
+                    await self._refill()
+                due = self._wheel.advance(now)
+                for start in range(0, len(due), self.batch_size):
+                    await self._fire(due[start:start + self.batch_size])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Timer wheel tick failed: {e}")
+
+    async def _fire(self, batch: List[TimerEntry]):
+        undelivered = set()
+        try:
+            undelivered = set(await self._callback(batch) or ())
+        except Exception as e:
+            self.callback_errors += 1
+            logger.error(f"Timer callback failed for {len(batch)} timers: {e}")
+        self.fired += len(batch) - len(undelivered)
+        self.undelivered += len(undelivered)
+        for entry in batch:
+            if entry.timer_id in undelivered:
+                continue
+            # Keep a reschedule made by the callback itself
+            self._pending_writes.setdefault(entry.timer_id, None)
+
+    async def _refill(self):
+        """Page the next horizon of timers from SQLite into the wheel"""
+        await self._flush()
+        capacity = self.max_loaded - len(self._wheel)
+        if capacity <= 0:
+            return
+        until = time.time() + self.horizon
+        rows = await asyncio.to_thread(self._load_rows, self._loaded_until, until, capacity)
+        for entry in rows:
+            if self._pending_writes.get(entry.timer_id, entry) is not None:
+                self._wheel.add(entry)
+        if len(rows) == capacity:
+            # Wheel is full: only what was loaded is covered
+            self._loaded_until = (rows[-1].due_at, rows[-1].timer_id)
+        else:
+            self._loaded_until = (until, "\uffff")
+
+    async def _flush(self):
+        if not self._pending_writes or self._conn is None:
+            return
+        writes, self._pending_writes = self._pending_writes, {}
+        try:
+            await asyncio.to_thread(self._write, writes)
+            self.flushes += 1
+        except Exception:
+            # Keep the writes for the next tick, newer ones win
+            self._pending_writes = {**writes, **self._pending_writes}
+            raise
+
+    # ------------------------------------------------------------------
+    # SQLite (runs in a worker thread)
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _write(self, writes: Dict[str, Optional[TimerEntry]]):
+        upserts = [
+            (entry.timer_id, entry.instance_id, entry.block_id, entry.due_at, json.dumps(entry.payload) if entry.payload is not None else None)
+            for entry in writes.values() if entry is not None
+        ]
+        deletes = [(timer_id,) for timer_id, entry in writes.items() if entry is None]
+        with self._db_lock, self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT INTO workflow_timers (timer_id, instance_id, block_id, due_at, payload) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(timer_id) DO UPDATE SET due_at = excluded.due_at, payload = excluded.payload",
+                    upserts
+                )
+            if deletes:
+                self._conn.executemany("DELETE FROM workflow_timers WHERE timer_id = ?", deletes)
+
+    def _load_rows(self, after: Tuple[float, str], until: float, limit: int) -> List[TimerEntry]:
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT timer_id, instance_id, block_id, due_at, payload FROM workflow_timers "
+                "WHERE (due_at, timer_id) > (?, ?) AND due_at <= ? ORDER BY due_at, timer_id LIMIT ?",
+                (after[0], after[1], until, limit)
+            ).fetchall()
+        return [
+            TimerEntry(timer_id, instance_id, block_id, due_at, json.loads(payload) if payload else None)
+            for timer_id, instance_id, block_id, due_at, payload in rows
+        ]
+
+    def _count_pending(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM workflow_timers").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "loaded": len(self._wheel),
+            "max_loaded": self.max_loaded,
+            "loaded_until": self._loaded_until[0],
+            "pending_writes": len(self._pending_writes),
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "fired": self.fired,
+            "undelivered": self.undelivered,
+            "flushes": self.flushes,
+            "callback_errors": self.callback_errors
+        }
+
+
+# Global instance
+timer_wheel = DurableTimerWheel(
+    db_path=settings.timer_wheel_db_path,
+    tick=settings.timer_wheel_tick,
+    horizon=settings.timer_wheel_horizon,
+    batch_size=settings.timer_wheel_batch_size,
+    max_loaded=settings.timer_wheel_max_loaded
+)
@@ -0,0 +1,276 @@
+"""
+Trigger Router
+Starts the workflows whose trigger blocks match a healthcare object status change
+
+Active WorkflowDefinitions are indexed by (object_type, status) when they are
+registered, so dispatching an event is one dict lookup (plus the object type's
+any-status bucket) followed by the filter predicates of that small candidate
+set, independent of how many workflows are registered.
+
+Registrations made through the API are persisted in the instance store and
+restored on startup (see restore).
+"""
+from collections import defaultdict
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+import logging
+import time
+
+from backend.engine.workflow_engine import WorkflowEngine, WorkflowPlanError, block_settings, workflow_engine
+from backend.models.healthcare_objects import (
+    CalendarEventStatus,
+    DocumentFormStatus,
+    EncounterNoteStatus,
+    InternalNoteStatus,
+    OrderStatus,
+    PatientProfileStatus,
+    ReportStatus,
+    TaskStatus,
+)
+from backend.models.workflow_context import ObjectStatusEvent, WorkflowDefinition, WorkflowInstance
+
+logger = logging.getLogger(__name__)
+
+ANY_STATUS = "*"
+
+# Status enum per HealthcareObject.object_type
+OBJECT_STATUSES: Dict[str, Type[Enum]] = {
+    "patient_profile": PatientProfileStatus,
+    "order": OrderStatus,
+    "report": ReportStatus,
+    "encounter_note": EncounterNoteStatus,
+    "document_form": DocumentFormStatus,
+    "calendar_event": CalendarEventStatus,
+    "task": TaskStatus,
+    "internal_note": InternalNoteStatus,
+}
+
+# Trigger block type (BlockType values and composer block types) -> object_type
+TRIGGER_OBJECT_TYPES = {
+    "trigger-patient-profile": "patient_profile",
+    "trigger-profile-events": "patient_profile",
+    "trigger-patient-events": "patient_profile",
+    "trigger-new-patient": "patient_profile",
+    "trigger-order": "order",
+    "trigger-order-events": "order",
+    "trigger-report": "report",
+    "trigger-report-events": "report",
+    "trigger-encounter-note": "encounter_note",
+    "trigger-document": "document_form",
+    "trigger-document-events": "document_form",
+    "trigger-calendar-event": "calendar_event",
+    "trigger-appointment-events": "calendar_event",
+    "trigger-task": "task",
+    "trigger-task-events": "task",
+    "trigger-internal-note": "internal_note",
+}
+
+_KNOWN_STATUSES = {
+    object_type: frozenset(member.value for member in statuses)
+    for object_type, statuses in OBJECT_STATUSES.items()
+}
+
+# Statuses implied by the block type when the block lists none
+_DEFAULT_STATUSES = {
+    "trigger-new-patient": [PatientProfileStatus.CREATED.value],
+}
+
+Filters = Tuple[Tuple[str, Tuple[Any, ...]], ...]
+
+
+class TriggerSubscription(NamedTuple):
+    """One trigger block of an active workflow"""
+    definition: WorkflowDefinition
+    block_id: str
+    filters: Filters  # (metadata key, accepted values) pairs, all must match
+
+
+@lru_cache(maxsize=4096)
+def normalize_status(object_type: str, status: str) -> str:
+    """
+    Map a composer event name onto the object's status value.
+
+    "order-created" -> "order_created", "appointment-accepted" -> "accepted",
+    "report-available" -> "report_available". Unknown names are only lowercased.
+    """
+    value = status.strip().lower().replace("-", "_").replace(" ", "_")
+    known = _KNOWN_STATUSES.get(object_type)
+    if known is None or value in known:
+        return value
+    _, _, suffix = value.partition("_")
+    return suffix if suffix in known else value
+
+
+def _compile_filters(conditions: Any) -> Filters:
+    if not isinstance(conditions, dict):
+        return ()
+    return tuple(
+        (key, tuple(value) if isinstance(value, (list, tuple, set)) else (value,))
+        for key, value in sorted(conditions.items())
+    )
+
+
+def _matches(filters: Filters, attributes: Dict[str, Any]) -> bool:
+    return all(attributes.get(key) in accepted for key, accepted in filters)
+
+
+class TriggerRouter:
+    """
+    Index of active workflow triggers.
+
+    Usage:
+        await trigger_router.restore()  # on startup, after the instance store opens
+        trigger_router.register(definition)
+        instances = await trigger_router.dispatch(event)
+    """
+
+    def __init__(self, engine: WorkflowEngine):
+        self.engine = engine
+        self._index: Dict[Tuple[str, str], List[TriggerSubscription]] = defaultdict(list)
+        self._keys_by_workflow: Dict[str, List[Tuple[str, str]]] = {}
+        self._definitions: Dict[str, WorkflowDefinition] = {}
+
+        self.events = 0
+        self.candidates_checked = 0
+        self.matches = 0
+        self.start_errors = 0
+        self.restored = 0
+        self.dispatch_time = 0.0
+
+    # ------------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------------
+
+    def register(self, definition: WorkflowDefinition) -> int:
+        """
+        Index (or re-index) a definition's trigger blocks.
+
+        Returns:
+            Number of trigger subscriptions created (0 for inactive workflows)
+        """
+        self.unregister(definition.workflow_id)
+        if not definition.is_active:
+            return 0
+
+        keys: List[Tuple[str, str]] = []
+        for block in definition.blocks:
+            block_type = block.get("type", "")
+            object_type = TRIGGER_OBJECT_TYPES.get(block_type)
+            if object_type is None:
+                continue
+            config = block_settings(block)
+            statuses = config.get("statuses") or config.get("triggerEvents") or _DEFAULT_STATUSES.get(block_type)
+            if isinstance(statuses, str):
+                statuses = [statuses]
+            subscription = TriggerSubscription(definition, block.get("id"), _compile_filters(config.get("conditions")))
+            for status in dict.fromkeys(normalize_status(object_type, status) for status in statuses or [ANY_STATUS]):
+                key = (object_type, status)
+                self._index[key].append(subscription)
+                keys.append(key)
+
+        if keys:
+            self._keys_by_workflow[definition.workflow_id] = keys
+            self._definitions[definition.workflow_id] = definition
+        return len(keys)
+
+    def unregister(self, workflow_id: str) -> bool:
+        keys = self._keys_by_workflow.pop(workflow_id, None)
+        self._definitions.pop(workflow_id, None)
+        if keys is None:
+            return False
+        for key in set(keys):
+            remaining = [subscription for subscription in self._index[key] if subscription.definition.workflow_id != workflow_id]
+            if remaining:
+                self._index[key] = remaining
+            else:
+                del self._index[key]
+        return True
+
+    def get_definition(self, workflow_id: str) -> Optional[WorkflowDefinition]:
+        return self._definitions.get(workflow_id)
+
+    async def restore(self) -> int:
+        """Register the definitions that were registered when the last process stopped"""
+        if self.engine.store is None:
+            return 0
+        restored = 0
+        for definition in await self.engine.store.load_registered():
+            if definition.workflow_id in self._definitions:
+                continue
+            try:
+                self.engine.get_plan(definition)
+            except WorkflowPlanError as e:
+                logger.error(f"Cannot restore trigger registration of workflow {definition.workflow_id}: {e}")
+                continue
+            restored += int(self.register(definition) > 0)
+        self.restored += restored
+        if restored:
+            logger.info(f"Restored trigger registrations of {restored} workflows")
+        return restored
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def match(self, object_type: str, status: str, attributes: Dict[str, Any]) -> List[TriggerSubscription]:
+        """Subscriptions triggered by object_type entering status; attributes feed the filter predicates"""
+        status = normalize_status(object_type, status)
+        candidates = self._index.get((object_type, status), []) + self._index.get((object_type, ANY_STATUS), [])
+        self.candidates_checked += len(candidates)
+        return [subscription for subscription in candidates if _matches(subscription.filters, attributes)]
+
+    async def dispatch(self, event: ObjectStatusEvent) -> List[WorkflowInstance]:
+        """Start one instance per matching trigger"""
+        started = time.perf_counter()
+        self.events += 1
+        status_event = event.event
+        attributes = {
+            "object_id": event.object_id,
+            "object_type": event.object_type,
+            "patient_id": event.patient_id,
+            "status": status_event.status,
+            **(status_event.metadata or {}),
+        }
+        subscriptions = self.match(event.object_type, status_event.status, attributes)
+        self.matches += len(subscriptions)
+
+        instances = []
+        for subscription in subscriptions:
+            triggered_by = {
+                "object_type": event.object_type,
+                "object_id": event.object_id,
+                "status": status_event.status,
+                "timestamp": status_event.timestamp.isoformat(),
+                "metadata": status_event.metadata or {},
+                "trigger_block_id": subscription.block_id,
+            }
+            try:
+                instances.append(await self.engine.start(subscription.definition, triggered_by, patient_id=event.patient_id))
+            except Exception as e:
+                self.start_errors += 1
+                logger.error(f"Failed to start workflow {subscription.definition.workflow_id} for {event.object_type} {event.object_id}: {e}")
+
+        self.dispatch_time += time.perf_counter() - started
+        return instances
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workflows": len(self._definitions),
+            "index_keys": len(self._index),
+            "subscriptions": sum(len(subscriptions) for subscriptions in self._index.values()),
+            "events": self.events,
+            "avg_candidates": round(self.candidates_checked / self.events, 2) if self.events else 0.0,
+            "matches": self.matches,
+            "start_errors": self.start_errors,
+            "restored": self.restored,
+            "avg_dispatch_ms": round(self.dispatch_time / self.events * 1000, 3) if self.events else 0.0
+        }
+
+
+# Global instance
+trigger_router = TriggerRouter(workflow_engine)
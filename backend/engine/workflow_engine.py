@@ -0,0 +1,876 @@
+"""
+Workflow Engine
+Asyncio runtime that executes WorkflowDefinitions as WorkflowInstances
+
+Each definition is compiled once into an ExecutionPlan (adjacency lists,
+incoming-edge counts, loop bodies). An instance runs as a handful of asyncio
+tasks: every block whose incoming edges are resolved runs concurrently with the
+other ready branches, branches that are not taken are propagated as skipped so
+joins never deadlock, and the condition/loop agents are only called at decision
+blocks. Wait and approval blocks park their branch until resume() is called.
+Every state change is queued on the optional InstanceStore, which persists it
+on its next group commit, together with the run's scheduling state, so
+start_timers() can first rebuild every instance an earlier process left
+waiting, escalated or running. Block outputs that no later block can reference
+(see OutputLiveness) are compacted in memory unless compact_outputs is off.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+import uuid
+
+from backend.config.settings import settings
+from backend.agents.block_references import parse_block_references
+from backend.agents.condition_evaluator import condition_evaluator
+from backend.agents.loop_controller import loop_controller
+from backend.engine.instance_store import InstanceStore, RecoveredRun, instance_store
+from backend.engine.output_liveness import OutputLiveness
+from backend.engine.timer_wheel import DurableTimerWheel, TimerEntry, timer_wheel
+from backend.models.workflow_context import (
+    BlockExecution,
+    BlockType,
+    ConditionEvaluationRequest,
+    ExecutionStatus,
+    LoopEvaluationRequest,
+    WorkflowDefinition,
+    WorkflowInstance,
+)
+
+logger = logging.getLogger(__name__)
+
+Edge = Tuple[str, str]
+BlockHandler = Callable[[WorkflowInstance, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+TRIGGER_PREFIX = "trigger-"
+
+# Seconds per wait-block unit
+WAIT_UNITS = {
+    "seconds": 1,
+    "minutes": 60,
+    "hours": 3600,
+    "days": 86400,
+}
+
+# Park reasons
+PARK_WAIT = "wait"
+PARK_APPROVAL = "approval"
+PARK_ESCALATED = "escalated"
+
+
+class WorkflowPlanError(ValueError):
+    """Raised when a workflow definition cannot be compiled into an execution plan"""
+
+
+class WorkflowEngineError(RuntimeError):
+    """Raised for invalid operations on a running instance"""
+
+
+def block_settings(block: Dict[str, Any]) -> Dict[str, Any]:
+    """Block configuration; composer templates keep settings in "data", generated blocks in "config" """
+    return {**(block.get("config") or {}), **(block.get("data") or {})}
+
+
+class ExecutionPlan:
+    """
+    Adjacency-indexed form of a WorkflowDefinition, compiled once and shared by all its instances.
+
+    Edges come from the definition's connections plus condition paths'
+    nextBlockId. An edge into a loop block from one of the loop's own body
+    blocks is a back edge; every other cycle is rejected.
+    """
+
+    def __init__(self, definition: WorkflowDefinition):
+        self.workflow_id = definition.workflow_id
+        self.version = definition.updated_at.isoformat()
+        self.blocks: Dict[str, Dict[str, Any]] = {}
+        for block in definition.blocks:
+            block_id = block.get("id")
+            if not block_id:
+                raise WorkflowPlanError("Every block needs an id")
+            if block_id in self.blocks:
+                raise WorkflowPlanError(f"Duplicate block id: {block_id}")
+            self.blocks[block_id] = block
+
+        self.settings: Dict[str, Dict[str, Any]] = {block_id: block_settings(block) for block_id, block in self.blocks.items()}
+        self.successors: Dict[str, List[str]] = {block_id: [] for block_id in self.blocks}
+        for source, target in self._collect_edges(definition):
+            if target not in self.successors[source]:
+                self.successors[source].append(target)
+
+        self.predecessors: Dict[str, List[str]] = {block_id: [] for block_id in self.blocks}
+        for source, targets in self.successors.items():
+            for target in targets:
+                self.predecessors[target].append(source)
+
+        # Back edge: an edge into a loop block from a block the loop dominates
+        dominators = self._dominators()
+        self.back_edges: Set[Edge] = {
+            (source, target)
+            for source, targets in self.successors.items() for target in targets
+            if self.block_type(target) == BlockType.LOOP.value and target in dominators[source]
+        }
+        self.loop_bodies: Dict[str, Set[str]] = {
+            block_id: set() for block_id in self.blocks if self.block_type(block_id) == BlockType.LOOP.value
+        }
+        for source, loop_id in self.back_edges:
+            self.loop_bodies[loop_id] |= self._natural_loop(loop_id, source)
+
+        self.forward_in: Dict[str, int] = {block_id: 0 for block_id in self.blocks}
+        self.back_in: Dict[str, int] = {loop_id: 0 for loop_id in self.loop_bodies}
+        for source, targets in self.successors.items():
+            for target in targets:
+                if (source, target) in self.back_edges:
+                    self.back_in[target] += 1
+                else:
+                    self.forward_in[target] += 1
+
+        self.entry_blocks = [block_id for block_id, count in self.forward_in.items() if count == 0]
+        self._check_acyclic()
+        self.liveness = OutputLiveness(self)
+
+    def block_type(self, block_id: str) -> str:
+        return self.blocks[block_id].get("type", "")
+
+    def condition_paths(self, block_id: str) -> List[Tuple[str, Optional[str]]]:
+        """(prompt, nextBlockId) pairs; nextBlockId None means every successor"""
+        block_config = self.settings[block_id]
+        paths = [
+            (path.get("prompt", ""), path.get("nextBlockId"))
+            for path in block_config.get("paths") or [] if path.get("prompt")
+        ]
+        if not paths and block_config.get("prompt"):
+            paths = [(block_config["prompt"], None)]
+        return paths
+
+    def loop_targets(self, loop_id: str) -> Tuple[List[str], List[str]]:
+        """(body entry blocks, exit blocks) of a loop"""
+        body = self.loop_bodies[loop_id]
+        successors = self.successors[loop_id]
+        return [target for target in successors if target in body], [target for target in successors if target not in body]
+
+    def _collect_edges(self, definition: WorkflowDefinition) -> List[Edge]:
+        edges: List[Edge] = []
+        for connection in definition.connections:
+            edges.append((connection.get("from"), connection.get("to")))
+        for block_id in self.blocks:
+            if self.block_type(block_id) == BlockType.CONDITION.value:
+                edges.extend((block_id, target) for _, target in self.condition_paths(block_id) if target)
+
+        for source, target in edges:
+            if source not in self.blocks or target not in self.blocks:
+                raise WorkflowPlanError(f"Connection references unknown block: {source} -> {target}")
+        return edges
+
+    def _dominators(self) -> Dict[str, Set[str]]:
+        """Dominator sets, rooted at the blocks without predecessors (iterative data-flow)"""
+        all_blocks = set(self.blocks)
+        roots = {block_id for block_id, sources in self.predecessors.items() if not sources}
+        # A workflow may start on a cycle (e.g. a loop as first block): root each unreached part at its first block
+        reached = self._reachable(roots)
+        for block_id in self.blocks:
+            if block_id not in reached:
+                roots.add(block_id)
+                reached |= self._reachable({block_id})
+
+        dominators = {block_id: {block_id} if block_id in roots else set(all_blocks) for block_id in self.blocks}
+        changed = True
+        while changed:
+            changed = False
+            for block_id in self.blocks:
+                if block_id in roots:
+                    continue
+                dominated = set.intersection(*(dominators[source] for source in self.predecessors[block_id])) | {block_id}
+                if dominated != dominators[block_id]:
+                    dominators[block_id] = dominated
+                    changed = True
+        return dominators
+
+    def _reachable(self, starts: Set[str]) -> Set[str]:
+        seen = set(starts)
+        stack = list(starts)
+        while stack:
+            for target in self.successors[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+    def _natural_loop(self, loop_id: str, tail: str) -> Set[str]:
+        """Blocks that reach the back edge's tail without passing through the loop block"""
+        if tail == loop_id:
+            return set()
+        body = {tail}
+        stack = [tail]
+        while stack:
+            for source in self.predecessors[stack.pop()]:
+                if source != loop_id and source not in body:
+                    body.add(source)
+                    stack.append(source)
+        return body
+
+    def _check_acyclic(self):
+        """Kahn's algorithm over forward edges; a leftover block sits on a cycle without a loop block"""
+        remaining = dict(self.forward_in)
+        ready = list(self.entry_blocks)
+        visited = 0
+        while ready:
+            block_id = ready.pop()
+            visited += 1
+            for target in self.successors[block_id]:
+                if (block_id, target) in self.back_edges:
+                    continue
+                remaining[target] -= 1
+                if remaining[target] == 0:
+                    ready.append(target)
+        if visited != len(self.blocks):
+            stuck = sorted(block_id for block_id, count in remaining.items() if count > 0)
+            raise WorkflowPlanError(f"Cycle without a loop block through: {', '.join(stuck)}")
+
+
+class _InstanceRun:
+    """Scheduling state of one running instance"""
+
+    def __init__(self, instance: WorkflowInstance, plan: ExecutionPlan):
+        self.instance = instance
+        self.plan = plan
+        self.remaining = dict(plan.forward_in)  # Unresolved incoming forward edges per block
+        self.back_remaining = dict(plan.back_in)  # Unresolved back edges per loop
+        self.activated: Set[str] = set()  # Blocks with at least one active incoming edge
+        self.iterations: Dict[str, int] = {}
+        self.parked: Dict[str, str] = {}  # block_id -> park reason
+        self.live_outputs: Dict[str, Set[str]] = {}  # producer -> release points still to run
+        self.running: Set[str] = set()  # Blocks scheduled and not yet finished
+        self.tasks: Set[asyncio.Task] = set()
+        self.idle = asyncio.Event()  # Set whenever no block is running (finished or parked)
+        self.done = asyncio.Event()
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Scheduling state persisted with the instance (None once finished)"""
+        if self.done.is_set():
+            return None
+        return {
+            "definition_version": self.plan.version,
+            "remaining": self.remaining,
+            "back_remaining": self.back_remaining,
+            "activated": sorted(self.activated),
+            "iterations": self.iterations,
+            "parked": self.parked,
+            "live_outputs": {producer: sorted(points) for producer, points in self.live_outputs.items()},
+            "running": sorted(self.running),
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        """Inverse of snapshot(); blocks that were running must be scheduled again by the caller"""
+        self.remaining.update(state["remaining"])
+        self.back_remaining.update(state["back_remaining"])
+        self.activated = set(state["activated"])
+        self.iterations = dict(state["iterations"])
+        self.parked = dict(state["parked"])
+        self.live_outputs = {producer: set(points) for producer, points in state["live_outputs"].items()}
+
+
+class WorkflowEngine:
+    """Runs workflow instances; one engine per process"""
+
+    def __init__(
+        self,
+        timers: DurableTimerWheel,
+        plan_cache_size: int,
+        max_finished_instances: int,
+        store: Optional[InstanceStore] = None,
+        compact_outputs: bool = True
+    ):
+        self.timers = timers
+        self.store = store
+        self.compact_outputs = compact_outputs
+        self.plan_cache_size = plan_cache_size
+        self.max_finished_instances = max_finished_instances
+        self._plans: "OrderedDict[Tuple[str, str], ExecutionPlan]" = OrderedDict()
+        self._runs: Dict[str, _InstanceRun] = {}
+        self._finished: "OrderedDict[str, WorkflowInstance]" = OrderedDict()
+        self._handlers: Dict[str, BlockHandler] = {}
+        self.plan_compiles = 0
+        self.plan_cache_hits = 0
+        self.blocks_executed = 0
+        self.instances_started = 0
+        self.instances_recovered = 0
+        self.instances_completed = 0
+        self.instances_failed = 0
+        self.outputs_compacted = 0
+
+    def register_handler(self, block_type: str, handler: BlockHandler):
+        """Install the coroutine that executes action blocks of block_type and returns their output"""
+        self._handlers[block_type] = handler
+
+    async def start_timers(self):
+        """Recover unfinished instances from the store, then start firing persisted wait-block timers (call once per process)"""
+        await self.recover()
+        await self.timers.start(self._on_timers_due)
+
+    async def recover(self) -> int:
+        """
+        Rebuild the runs of instances an earlier process left unfinished.
+
+        Parked blocks wait for resume() again (wait timers are re-armed from
+        their recorded start). Blocks that were running when the process
+        stopped are run again, so block handlers see at-least-once delivery.
+        """
+        if self.store is None:
+            return 0
+        recovered = 0
+        for stored in await self.store.load_active():
+            instance_id = stored.instance.instance_id
+            if instance_id in self._runs:
+                continue
+            try:
+                run = self._restore_run(stored)
+            except (WorkflowPlanError, KeyError) as e:
+                logger.error(f"Cannot recover workflow instance {instance_id}: {e}")
+                continue
+            self._runs[instance_id] = run
+            recovered += 1
+            for block_id, reason in run.parked.items():
+                if reason == PARK_WAIT:
+                    self._arm_wait(run, block_id)
+            for block_id in stored.run_state["running"]:
+                self._schedule(run, block_id)
+            self._check_finished(run)
+        self.instances_recovered += recovered
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished workflow instances")
+        return recovered
+
+    def _restore_run(self, stored: RecoveredRun) -> _InstanceRun:
+        plan = self.get_plan(stored.definition)
+        run = _InstanceRun(stored.instance, plan)
+        run.restore(stored.run_state)
+        unknown = (set(run.parked) | set(stored.run_state["running"])) - set(plan.blocks)
+        if unknown:
+            raise KeyError(f"blocks {sorted(unknown)} are not in workflow {plan.workflow_id}")
+        return run
+
+    async def stop_timers(self):
+        await self.timers.stop()
+
+    # ------------------------------------------------------------------
+    # Plans
+    # ------------------------------------------------------------------
+
+    def get_plan(self, definition: WorkflowDefinition) -> ExecutionPlan:
+        """Compiled plan for definition, cached per (workflow_id, updated_at)"""
+        key = (definition.workflow_id, definition.updated_at.isoformat())
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            self.plan_cache_hits += 1
+            return plan
+
+        plan = ExecutionPlan(definition)
+        self.plan_compiles += 1
+        self._plans[key] = plan
+        while len(self._plans) > self.plan_cache_size:
+            self._plans.popitem(last=False)
+        return plan
+
+    # ------------------------------------------------------------------
+    # Instance lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(
+        self,
+        definition: WorkflowDefinition,
+        triggered_by: Dict[str, Any],
+        patient_id: Optional[str] = None,
+        context_data: Optional[Dict[str, Any]] = None
+    ) -> WorkflowInstance:
+        """Create an instance and start its entry blocks; returns without waiting for completion"""
+        plan = self.get_plan(definition)
+        instance = WorkflowInstance(
+            instance_id=uuid.uuid4().hex,
+            workflow_id=definition.workflow_id,
+            workflow_type=definition.workflow_type,
+            patient_id=patient_id,
+            status=ExecutionStatus.RUNNING,
+            triggered_by=triggered_by,
+            context_data=dict(context_data or {})
+        )
+        run = _InstanceRun(instance, plan)
+        self._runs[instance.instance_id] = run
+        self.instances_started += 1
+        if self.store is not None:
+            self.store.save_definition(definition)
+        self._save(run)
+
+        for block_id in plan.entry_blocks:
+            run.activated.add(block_id)
+            self._schedule(run, block_id)
+        self._check_finished(run)
+        return instance
+
+    async def run(self, definition: WorkflowDefinition, triggered_by: Dict[str, Any], **kwargs) -> WorkflowInstance:
+        """Start an instance and wait until it completes, fails or parks every branch"""
+        instance = await self.start(definition, triggered_by, **kwargs)
+        await self.wait(instance.instance_id)
+        return instance
+
+    async def wait(self, instance_id: str):
+        """Wait until the instance has no running blocks left"""
+        run = self._runs.get(instance_id)
+        if run is not None:
+            await run.idle.wait()
+
+    def get_instance(self, instance_id: str) -> Optional[WorkflowInstance]:
+        run = self._runs.get(instance_id)
+        if run is not None:
+            return run.instance
+        return self._finished.get(instance_id)
+
+    async def load_instance(self, instance_id: str, include_history: bool = True) -> Optional[WorkflowInstance]:
+        """In-memory instance, falling back to the store for instances evicted or from earlier processes"""
+        instance = self.get_instance(instance_id)
+        if instance is None and self.store is not None:
+            instance = await self.store.load(instance_id, include_history=include_history)
+        return instance
+
+    async def resume(self, instance_id: str, block_id: str, output: Optional[Dict[str, Any]] = None) -> WorkflowInstance:
+        """
+        Resume a parked block.
+
+        Args:
+            output: Recorded as the block's output. Approvals read "approved"
+                (default true); escalated conditions read "nextBlockId" or
+                "decision"; escalated loops read "action".
+        """
+        run = self._runs.get(instance_id)
+        if run is None or block_id not in run.parked:
+            raise WorkflowEngineError(f"Block {block_id} of instance {instance_id} is not waiting")
+
+        reason = run.parked.pop(block_id)
+        if reason == PARK_WAIT:
+            self.timers.cancel(instance_id, block_id)
+
+        output = dict(output or {})
+        run.instance.status = ExecutionStatus.RUNNING
+        started_at = datetime.now()
+        block_type = run.plan.block_type(block_id)
+
+        if block_type == BlockType.CONDITION.value:
+            self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output, ai_reasoning=output.get("reasoning"))
+            self._route_condition(run, block_id, self._chosen_targets(run.plan, block_id, output))
+        elif block_type == BlockType.LOOP.value:
+            self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output, ai_reasoning=output.get("reasoning"))
+            self._route_loop(run, block_id, output.get("action", "break"))
+        else:
+            self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output)
+            approved = reason != PARK_APPROVAL or output.get("approved", True)
+            self._resolve_successors(run, block_id, active=bool(approved))
+
+        self._check_finished(run)
+        return run.instance
+
+    async def cancel(self, instance_id: str) -> Optional[WorkflowInstance]:
+        """Stop a running instance; its status becomes failed with a cancellation message"""
+        run = self._runs.get(instance_id)
+        if run is None:
+            return self._finished.get(instance_id)
+        self._fail(run, None, "Cancelled")
+        return run.instance
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _schedule(self, run: _InstanceRun, block_id: str):
+        task = asyncio.create_task(self._execute(run, block_id))
+        run.running.add(block_id)
+        run.idle.clear()
+        run.tasks.add(task)
+        task.add_done_callback(lambda finished: self._on_task_done(run, finished))
+
+    def _on_task_done(self, run: _InstanceRun, task: asyncio.Task):
+        run.tasks.discard(task)
+        self._check_finished(run)
+
+    def _resolve_edge(self, run: _InstanceRun, source: str, target: str, active: bool):
+        """Mark one edge taken (active) or skipped; runs or skips target once all its inputs are resolved"""
+        if (source, target) in run.plan.back_edges:
+            run.back_remaining[target] -= 1
+            if active:
+                run.activated.add(target)
+            if run.back_remaining[target] == 0:
+                if target in run.activated:
+                    self._schedule(run, target)
+                else:
+                    # No branch of the body returned to the loop: the loop is over
+                    self._release_outputs(run, target)
+                    _, exits = run.plan.loop_targets(target)
+                    for exit_id in exits:
+                        self._resolve_edge(run, target, exit_id, active=False)
+            return
+
+        run.remaining[target] -= 1
+        if active:
+            run.activated.add(target)
+        if run.remaining[target] == 0:
+            if target in run.activated:
+                self._schedule(run, target)
+            else:
+                self._skip(run, target)
+
+    def _skip(self, run: _InstanceRun, block_id: str):
+        """Propagate a dead branch so downstream joins do not wait for it"""
+        self._release_outputs(run, block_id)
+        if block_id in run.plan.loop_bodies:
+            targets = run.plan.loop_targets(block_id)[1]
+        else:
+            targets = run.plan.successors[block_id]
+        for target in targets:
+            self._resolve_edge(run, block_id, target, active=False)
+
+    def _resolve_successors(self, run: _InstanceRun, block_id: str, active: bool):
+        for target in run.plan.successors[block_id]:
+            self._resolve_edge(run, block_id, target, active)
+
+    def _park(self, run: _InstanceRun, block_id: str, reason: str):
+        run.parked[block_id] = reason
+
+    def _save(self, run: _InstanceRun):
+        if self.store is not None:
+            self.store.save(run.instance, run.snapshot)
+
+    def _check_finished(self, run: _InstanceRun):
+        if run.tasks or run.done.is_set():
+            return
+        run.idle.set()
+        instance = run.instance
+        if run.parked:
+            instance.status = ExecutionStatus.ESCALATED if PARK_ESCALATED in run.parked.values() else ExecutionStatus.WAITING
+            instance.updated_at = datetime.now()
+            self._save(run)
+            return
+        instance.status = ExecutionStatus.COMPLETED
+        instance.current_block_id = None
+        instance.updated_at = datetime.now()
+        self.instances_completed += 1
+        self._finish(run)
+
+    def _finish(self, run: _InstanceRun):
+        run.idle.set()
+        run.done.set()
+        self._save(run)
+        instance_id = run.instance.instance_id
+        self._runs.pop(instance_id, None)
+        self._finished[instance_id] = run.instance
+        while len(self._finished) > self.max_finished_instances:
+            self._finished.popitem(last=False)
+
+    def _fail(self, run: _InstanceRun, block_id: Optional[str], message: str):
+        for parked_id, reason in run.parked.items():
+            if reason == PARK_WAIT:
+                self.timers.cancel(run.instance.instance_id, parked_id)
+        run.parked.clear()
+        current = asyncio.current_task()
+        for task in run.tasks:
+            if task is not current:
+                task.cancel()
+        run.instance.status = ExecutionStatus.FAILED
+        run.instance.current_block_id = block_id
+        run.instance.updated_at = datetime.now()
+        self.instances_failed += 1
+        logger.warning(f"Workflow instance {run.instance.instance_id} failed at {block_id}: {message}")
+        self._finish(run)
+
+    # ------------------------------------------------------------------
+    # Block execution
+    # ------------------------------------------------------------------
+
+    async def _execute(self, run: _InstanceRun, block_id: str):
+        try:
+            await self._execute_block(run, block_id)
+        finally:
+            # In the same step as the block's last record, so a snapshot never shows it both done and running
+            run.running.discard(block_id)
+
+    async def _execute_block(self, run: _InstanceRun, block_id: str):
+        if run.done.is_set():
+            return
+        plan = run.plan
+        block_type = plan.block_type(block_id)
+        run.instance.current_block_id = block_id
+        started_at = datetime.now()
+        self.blocks_executed += 1
+
+        try:
+            if block_type == BlockType.CONDITION.value:
+                await self._execute_condition(run, block_id, started_at)
+            elif block_type == BlockType.LOOP.value:
+                await self._execute_loop(run, block_id, started_at)
+            elif block_type == BlockType.WAIT.value:
+                self._execute_wait(run, block_id, started_at)
+            elif block_type == BlockType.APPROVAL.value:
+                self._record(run, block_id, ExecutionStatus.WAITING, started_at)
+                self._park(run, block_id, PARK_APPROVAL)
+            else:
+                output = await self._execute_action(run, block_id)
+                self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output)
+                self._resolve_successors(run, block_id, active=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Block {block_id} ({block_type}) failed: {e}")
+            self._record(run, block_id, ExecutionStatus.FAILED, started_at, error_message=str(e))
+            self._fail(run, block_id, str(e))
+
+    async def _execute_action(self, run: _InstanceRun, block_id: str) -> Optional[Dict[str, Any]]:
+        block = run.plan.blocks[block_id]
+        block_type = run.plan.block_type(block_id)
+        handler = self._handlers.get(block_type)
+        if handler is not None:
+            return await handler(run.instance, block)
+        if block_type.startswith(TRIGGER_PREFIX):
+            return dict(run.instance.triggered_by)
+        # No integration registered: record the configured action so @@ references still resolve
+        return {"block_type": block_type, "config": run.plan.settings[block_id]}
+
+    def _execute_wait(self, run: _InstanceRun, block_id: str, started_at: datetime):
+        block_config = run.plan.settings[block_id]
+        self._record(run, block_id, ExecutionStatus.WAITING, started_at, input_data=block_config)
+        self._park(run, block_id, PARK_WAIT)
+        self._arm_wait(run, block_id, time.time())
+
+    def _arm_wait(self, run: _InstanceRun, block_id: str, started: Optional[float] = None):
+        """(Re)schedule a time wait's timer; started defaults to the recorded start of the wait"""
+        block_config = run.plan.settings[block_id]
+        if block_config.get("type", "time") != "time":
+            return  # Input/event waits are resumed externally
+        if started is None:
+            execution = run.instance.get_latest_execution(block_id)
+            started = execution.started_at.timestamp() if execution is not None and execution.started_at else time.time()
+        delay = float(block_config.get("duration") or 0) * WAIT_UNITS.get(block_config.get("unit", "minutes"), 60)
+        self.timers.schedule(run.instance.instance_id, block_id, started + delay, {"waited_seconds": delay})
+
+    async def _on_timers_due(self, entries: List[TimerEntry]) -> List[str]:
+        """Resume the wait blocks whose timers fired; returns the timers of instances this process has not loaded"""
+        undelivered = []
+        for entry in entries:
+            if entry.instance_id not in self._runs and entry.instance_id not in self._finished:
+                # Not recovered by this process: keep the timer so the wait is not lost
+                logger.warning(f"Keeping timer {entry.timer_id}: instance is not loaded")
+                undelivered.append(entry.timer_id)
+                continue
+            try:
+                await self.resume(entry.instance_id, entry.block_id, entry.payload)
+            except WorkflowEngineError:
+                logger.warning(f"Dropping timer for {entry.timer_id}: instance is not waiting on it")
+        return undelivered
+
+    async def _execute_condition(self, run: _InstanceRun, block_id: str, started_at: datetime):
+        paths = run.plan.condition_paths(block_id)
+        if not paths:
+            self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output={"decision": "true"})
+            self._resolve_successors(run, block_id, active=True)
+            return
+
+        instance = run.instance
+        results = await asyncio.gather(*[
+            condition_evaluator.evaluate_condition(
+                ConditionEvaluationRequest(
+                    condition_description=prompt,
+                    workflow_context=instance.context_data,
+                    referenced_block_ids=parse_block_references(prompt),
+                    instance_id=instance.instance_id
+                ),
+                instance=instance
+            )
+            for prompt, _ in paths
+        ])
+
+        chosen = next(((target, result) for (_, target), result in zip(paths, results) if result.decision == "true"), None)
+        if chosen is None and any(result.decision == "escalate" for result in results):
+            reasoning = "; ".join(result.reasoning for result in results if result.decision == "escalate")
+            self._record(run, block_id, ExecutionStatus.ESCALATED, started_at, ai_reasoning=reasoning)
+            self._park(run, block_id, PARK_ESCALATED)
+            return
+
+        target, result = chosen if chosen is not None else (None, results[-1])
+        output = {"decision": result.decision, "next_block_id": target, "confidence": result.confidence}
+        self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output, ai_reasoning=result.reasoning)
+        self._route_condition(run, block_id, self._chosen_targets(run.plan, block_id, output))
+
+    def _chosen_targets(self, plan: ExecutionPlan, block_id: str, output: Dict[str, Any]) -> Set[str]:
+        """Successors to activate for a condition decision"""
+        successors = plan.successors[block_id]
+        target = output.get("next_block_id") or output.get("nextBlockId")
+        if target:
+            return {target}
+        path_targets = {path_target for _, path_target in plan.condition_paths(block_id) if path_target}
+        if output.get("decision") == "true":
+            # Single-prompt condition: every successor
+            return set(successors) - path_targets if path_targets else set(successors)
+        # No path matched: take the connections that no path claims (the "else" branch)
+        return set(successors) - path_targets if path_targets else set()
+
+    def _route_condition(self, run: _InstanceRun, block_id: str, chosen: Set[str]):
+        for target in run.plan.successors[block_id]:
+            self._resolve_edge(run, block_id, target, active=target in chosen)
+
+    async def _execute_loop(self, run: _InstanceRun, block_id: str, started_at: datetime):
+        block_config = run.plan.settings[block_id]
+        iteration = run.iterations.get(block_id, 0)
+        max_iterations = int(block_config.get("count") or 0)
+
+        if max_iterations and iteration >= max_iterations:
+            output = {"action": "break", "iteration": iteration, "reasoning": "Max iterations reached"}
+            self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output, ai_reasoning=output["reasoning"])
+            self._route_loop(run, block_id, "break")
+            return
+
+        continue_rule = block_config.get("continueInstructions", "")
+        break_rule = block_config.get("exitInstructions", "")
+        escalation_rule = block_config.get("escalationInstructions")
+        instance = run.instance
+        result = await loop_controller.evaluate_loop(
+            LoopEvaluationRequest(
+                continue_rule=continue_rule,
+                break_rule=break_rule,
+                escalation_rule=escalation_rule,
+                workflow_context=instance.context_data,
+                referenced_block_ids=parse_block_references(continue_rule, break_rule, escalation_rule or ""),
+                iteration_count=iteration,
+                instance_id=instance.instance_id
+            ),
+            instance=instance
+        )
+
+        output = {"action": result.action, "iteration": iteration, "confidence": result.confidence}
+        if result.action == "escalate":
+            self._record(run, block_id, ExecutionStatus.ESCALATED, started_at, output=output, ai_reasoning=result.reasoning)
+            self._park(run, block_id, PARK_ESCALATED)
+            return
+        self._record(run, block_id, ExecutionStatus.COMPLETED, started_at, output=output, ai_reasoning=result.reasoning)
+        self._route_loop(run, block_id, result.action)
+
+    def _route_loop(self, run: _InstanceRun, block_id: str, action: str):
+        body_entries, exits = run.plan.loop_targets(block_id)
+        if action == "continue" and body_entries:
+            run.iterations[block_id] = run.iterations.get(block_id, 0) + 1
+            # Fresh edge counts for the next pass through the body
+            for body_id in run.plan.loop_bodies[block_id]:
+                run.remaining[body_id] = run.plan.forward_in[body_id]
+                run.activated.discard(body_id)
+                if body_id in run.plan.loop_bodies:
+                    # Nested loops start over on every pass of the enclosing loop
+                    run.iterations.pop(body_id, None)
+                    run.back_remaining[body_id] = run.plan.back_in[body_id]
+            run.back_remaining[block_id] = run.plan.back_in[block_id]
+            run.activated.discard(block_id)
+            for target in body_entries:
+                self._resolve_edge(run, block_id, target, active=True)
+            return
+        self._release_outputs(run, block_id)
+        for target in exits:
+            self._resolve_edge(run, block_id, target, active=True)
+
+    def _record(
+        self,
+        run: _InstanceRun,
+        block_id: str,
+        status: ExecutionStatus,
+        started_at: datetime,
+        output: Optional[Dict[str, Any]] = None,
+        input_data: Optional[Dict[str, Any]] = None,
+        ai_reasoning: Optional[str] = None,
+        error_message: Optional[str] = None
+    ):
+        execution = BlockExecution(
+            block_id=block_id,
+            block_type=run.plan.block_type(block_id),
+            status=status,
+            input_data=input_data,
+            output_data=output,
+            ai_reasoning=ai_reasoning,
+            started_at=started_at,
+            completed_at=datetime.now() if status in (ExecutionStatus.COMPLETED, ExecutionStatus.FAILED) else None,
+            error_message=error_message
+        )
+        previous = run.instance.get_latest_execution(block_id)
+        run.instance.add_execution(execution)
+        self._save(run)  # Serializes the full execution before it can be compacted
+        if not self.compact_outputs:
+            return
+
+        # Only the latest execution of a block is reachable through @@
+        if previous is not None:
+            self._compact(previous)
+        if output is not None:
+            release_points = run.plan.liveness.release_points[block_id]
+            if release_points:
+                run.live_outputs[block_id] = set(release_points)
+            else:
+                run.live_outputs.pop(block_id, None)
+                self._compact(execution)
+        if status == ExecutionStatus.COMPLETED and execution.block_type != BlockType.LOOP.value:
+            # Loops release at exit instead: their instructions are re-read on every pass
+            self._release_outputs(run, block_id)
+
+    def _release_outputs(self, run: _InstanceRun, block_id: str):
+        """block_id finished for good (or was skipped, or is a loop that exited): drop outputs only it kept alive"""
+        if not self.compact_outputs:
+            return
+        points = [block_id]
+        if block_id in run.plan.loop_bodies:
+            # The body will not run again unless an enclosing loop re-enters it, re-producing its outputs
+            points.extend(run.plan.loop_bodies[block_id])
+        released_by = run.plan.liveness.released_by
+        for point in points:
+            for producer in released_by.get(point, ()):
+                pending = run.live_outputs.get(producer)
+                if pending is None or point not in pending:
+                    continue
+                pending.discard(point)
+                if not pending:
+                    del run.live_outputs[producer]
+                    self._compact(run.instance.get_latest_execution(producer))
+
+    def _compact(self, execution: Optional[BlockExecution]):
+        if execution is None or execution.output_data is None:
+            return
+        execution.output_data = None
+        execution.output_compacted = True
+        self.outputs_compacted += 1
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for run in self._runs.values():
+            statuses[run.instance.status.value] = statuses.get(run.instance.status.value, 0) + 1
+        return {
+            "active_instances": len(self._runs),
+            "active_by_status": statuses,
+            "running_blocks": sum(len(run.tasks) for run in self._runs.values()),
+            "instances_started": self.instances_started,
+            "instances_recovered": self.instances_recovered,
+            "instances_completed": self.instances_completed,
+            "instances_failed": self.instances_failed,
+            "blocks_executed": self.blocks_executed,
+            "outputs_compacted": self.outputs_compacted,
+            "cached_plans": len(self._plans),
+            "plan_compiles": self.plan_compiles,
+            "plan_cache_hits": self.plan_cache_hits
+        }
+
+
+# Global instance
+workflow_engine = WorkflowEngine(
+    timers=timer_wheel,
+    plan_cache_size=settings.workflow_engine_plan_cache_size,
+    max_finished_instances=settings.workflow_engine_max_finished_instances,
+    store=instance_store,
+    compact_outputs=not settings.workflow_engine_retain_block_outputs
+)
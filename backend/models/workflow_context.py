@@ -3,10 +3,12 @@ Workflow context and state management
 Represents the runtime state of a workflow instance
 """
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Iterable
+from pydantic import BaseModel, Field, PrivateAttr
 from enum import Enum
 
+from backend.models.healthcare_objects import StatusEvent
+
 
 class WorkflowType(str, Enum):
     PATIENT = "patient"
@@ -62,6 +64,7 @@ class BlockExecution(BaseModel):
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
     execution_order: int = 0
+    output_compacted: bool = False  # output_data was dropped once no later block could reference it
 
 
 class WorkflowInstance(BaseModel):
@@ -78,28 +81,56 @@ class WorkflowInstance(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
+    # Latest execution per block_id (not serialized); covers execution_history up to _indexed_count
+    _latest_executions: Dict[str, BlockExecution] = PrivateAttr(default_factory=dict)
+    _indexed_history: Optional[List[BlockExecution]] = PrivateAttr(default=None)
+    _indexed_count: int = PrivateAttr(default=0)
+
     def add_execution(self, execution: BlockExecution):
         """Add a block execution to history"""
         execution.execution_order = len(self.execution_history)
         self.execution_history.append(execution)
+        self._index_executions()
         self.updated_at = datetime.now()
 
+    def _index_executions(self) -> Dict[str, BlockExecution]:
+        """Bring the latest-execution index up to date with execution_history"""
+        history = self.execution_history
+        if self._indexed_history is not history or self._indexed_count > len(history):
+            # History was replaced or truncated: rebuild
+            self._latest_executions = {}
+            self._indexed_history = history
+            self._indexed_count = 0
+        latest = self._latest_executions
+        for position in range(self._indexed_count, len(history)):
+            execution = history[position]
+            latest[execution.block_id] = execution
+        self._indexed_count = len(history)
+        return latest
+
+    def get_latest_execution(self, block_id: str) -> Optional[BlockExecution]:
+        """Most recent execution of a block"""
+        return self._index_executions().get(block_id)
+
     def get_block_output(self, block_id: str) -> Optional[Dict[str, Any]]:
         """Get the output data from a previously executed block"""
-        for execution in reversed(self.execution_history):
-            if execution.block_id == block_id:
-                return execution.output_data
-        return None
+        execution = self._index_executions().get(block_id)
+        return execution.output_data if execution is not None else None
 
-    def get_referenced_blocks(self, block_ids: List[str]) -> Dict[str, Any]:
-        """Get outputs from multiple referenced blocks (for @@ syntax)"""
+    def resolve_block_outputs(self, block_ids: Iterable[str]) -> Dict[str, Any]:
+        """Outputs of every block in block_ids that has produced a non-empty one"""
+        latest = self._index_executions()
         results = {}
         for block_id in block_ids:
-            output = self.get_block_output(block_id)
-            if output:
-                results[block_id] = output
+            execution = latest.get(block_id)
+            if execution is not None and execution.output_data:
+                results[block_id] = execution.output_data
         return results
 
+    def get_referenced_blocks(self, block_ids: List[str]) -> Dict[str, Any]:
+        """Get outputs from multiple referenced blocks (for @@ syntax)"""
+        return self.resolve_block_outputs(block_ids)
+
 
 class WorkflowDefinition(BaseModel):
     """Represents a saved workflow definition"""
@@ -108,6 +139,7 @@ class WorkflowDefinition(BaseModel):
     description: Optional[str] = None
     workflow_type: WorkflowType
     blocks: List[Dict[str, Any]]  # The workflow blocks from the composer
+    connections: List[Dict[str, Any]] = Field(default_factory=list)  # {"from": block_id, "to": block_id}
     created_by: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
@@ -127,9 +159,16 @@ class ConditionEvaluationResponse(BaseModel):
     decision: str  # "true", "false", or "escalate"
     reasoning: str
     confidence: Optional[float] = None
+    decided_by: Optional[str] = None  # "rule" (deterministic fast-path), "cache" or "agent"
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class ConditionEvaluationBatchRequest(BaseModel):
+    """Request to evaluate many condition blocks in one round-trip"""
+    requests: List[ConditionEvaluationRequest]
+    max_concurrency: Optional[int] = None  # Defaults to settings.batch_evaluation_concurrency
+
+
 class LoopEvaluationRequest(BaseModel):
     """Request to evaluate a loop decision"""
     continue_rule: str
@@ -146,9 +185,44 @@ class LoopEvaluationResponse(BaseModel):
     action: str  # "continue", "break", or "escalate"
     reasoning: str
     confidence: Optional[float] = None
+    decided_by: Optional[str] = None  # "rule" (deterministic fast-path), "cache" or "agent"
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class LoopEvaluationBatchRequest(BaseModel):
+    """Request to evaluate many loop decisions in one round-trip"""
+    requests: List[LoopEvaluationRequest]
+    max_concurrency: Optional[int] = None  # Defaults to settings.batch_evaluation_concurrency
+
+
+class WorkflowRunRequest(BaseModel):
+    """Request to start a workflow instance"""
+    definition: WorkflowDefinition
+    triggered_by: Dict[str, Any] = Field(default_factory=dict)
+    patient_id: Optional[str] = None
+    context_data: Dict[str, Any] = Field(default_factory=dict)
+    wait: bool = False  # Respond only once the instance completes or parks
+
+
+class WorkflowResumeRequest(BaseModel):
+    """Request to resume a waiting, approval or escalated block"""
+    block_id: str
+    output: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ObjectStatusEvent(BaseModel):
+    """A status change of a healthcare object, routed to the workflows it triggers"""
+    object_type: str  # HealthcareObject.object_type, e.g. "order"
+    object_id: str
+    patient_id: Optional[str] = None
+    event: StatusEvent
+
+
+class StatusEventBatchRequest(BaseModel):
+    """Status events ingested in one request"""
+    events: List[ObjectStatusEvent]
+
+
 class WorkflowGenerationRequest(BaseModel):
     """Request to generate a workflow from natural language"""
     description: str
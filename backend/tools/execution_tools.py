@@ -6,6 +6,8 @@ from typing import Dict, Any, List, Optional
 from claude_agent_sdk import tool, create_sdk_mcp_server
 import re
 
+from backend.engine.workflow_engine import workflow_engine
+
 
 @tool
 async def parse_block_references(
@@ -153,35 +155,33 @@ async def get_workflow_execution_context(
     Returns:
         Complete workflow instance context
     """
-    # Mock data - replace with database query
+    instance = await workflow_engine.load_instance(instance_id, include_history=include_history)
+    if instance is None:
+        return {
+            "success": False,
+            "error": f"Workflow instance {instance_id} not found"
+        }
+
     return {
         "success": True,
-        "instance_id": instance_id,
-        "status": "running",
-        "patient_id": "patient-001",
-        "triggered_by": {
-            "event": "report_available",
-            "object_id": "report-001"
-        },
+        "instance_id": instance.instance_id,
+        "workflow_id": instance.workflow_id,
+        "status": instance.status.value,
+        "patient_id": instance.patient_id,
+        "current_block_id": instance.current_block_id,
+        "triggered_by": instance.triggered_by,
         "execution_history": [
             {
-                "block_id": "block-trigger-1",
-                "type": "trigger-report",
-                "status": "completed",
-                "output": {"report_id": "report-001", "report_type": "Lab Results"}
-            },
-            {
-                "block_id": "block-condition-1",
-                "type": "condition",
-                "status": "running",
-                "input": {"report_id": "report-001"}
+                "block_id": execution.block_id,
+                "type": execution.block_type,
+                "status": execution.status.value,
+                "input": execution.input_data,
+                "output": execution.output_data,
+                "ai_reasoning": execution.ai_reasoning
             }
+            for execution in instance.execution_history
         ] if include_history else [],
-        "context_data": {
-            "patient_name": "John Smith",
-            "report_type": "Lab Results",
-            "has_abnormal_results": False
-        }
+        "context_data": instance.context_data
     }
 
 